@@ -1,13 +1,30 @@
 """API route handlers"""
 import asyncio
-from fastapi import APIRouter, Query
-from fastapi.responses import StreamingResponse
-from config.settings import CACHE, POPULAR_STOCKS
+import time
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
+from config.settings import (
+    POPULAR_STOCKS, TRACKED_SYMBOLS, QUOTE_REFRESH_MAX_INTERVAL, QUOTE_REFRESH_PER_CYCLE,
+    FULL_REFRESH_MAX_INTERVAL, FULL_REFRESH_PER_CYCLE, MARKET_SESSION_REFRESH,
+)
 from services.alpaca_service import fetch_stock_data, search_stocks
-from services.grok_service import stream_grok_analysis
-from services.news_service import fetch_news_for_symbol
+from services.batch_refresh_service import refresh_quotes_batch
+from services.grok_stream_service import stream_stats, subscribe_grok_stream
+from services.interest_service import interest_scores, record_interest
+from services.market_calendar_service import current_session, market_status, seconds_in_session, session_name
+from services.news_service import get_cached_news
+from services.quote_component_service import component_stats
+from services.search_service import is_listed
 from services.sector_service import get_sector_info
 from services.sector_analysis_service import analyze_sector_position
+from services.snapshot_service import (
+    get_snapshot, get_delta, get_versioned_snapshot, get_encoded_snapshot, gzip_body,
+)
+from services.stream_service import subscribe_symbols, unsubscribe_symbols
+from services import push_service
+from utils.cache import cache_stats
+from utils.singleflight import flight_stats
+from utils.upstream_budget import INTERACTIVE, budget_stats, set_priority
 
 router = APIRouter()
 
@@ -18,6 +35,36 @@ async def root():
     return {"message": "Stock Data API - Search any symbol"}
 
 
+@router.get("/api/cache/stats")
+async def cache_stats_endpoint():
+    """Hit/miss/eviction counters and sizes per cache namespace, plus single-flight coalescing per group"""
+    return {"namespaces": cache_stats(), "single_flight": flight_stats()}
+
+
+@router.get("/api/upstream/stats")
+async def upstream_stats_endpoint():
+    """Request budget per upstream provider: usage, queue depth and wait times"""
+    return budget_stats()
+
+
+@router.get("/api/grok/streams")
+async def grok_streams_endpoint():
+    """Running upstream Grok streams with their subscriber and buffered event counts"""
+    return stream_stats()
+
+
+@router.get("/api/components/stats")
+async def component_stats_endpoint():
+    """Quote snapshot components: trigger, recomputes vs. reuses and value changes"""
+    return component_stats()
+
+
+@router.get("/api/market/session")
+async def market_session_endpoint():
+    """Current market session (premarket/regular/afterhours/closed) and when it changes next"""
+    return market_status()
+
+
 @router.get("/api/search/{query}")
 async def search_stocks_endpoint(query: str):
     """Search for stocks by symbol or company name with smart ranking"""
@@ -25,19 +72,49 @@ async def search_stocks_endpoint(query: str):
     return {"results": results}
 
 
+@router.post("/api/search/click/{symbol}")
+async def search_click_endpoint(symbol: str):
+    """Record that a search result was opened (raises the symbol's refresh priority)"""
+    symbol = symbol.upper()
+    if not is_listed(symbol):
+        return {"ok": False}
+    record_interest(symbol, 'search_click')
+    return {"ok": True}
+
+
 @router.get("/api/quotes/{symbol}")
-async def get_quote(symbol: str):
-    """Get quote for any stock symbol with EMAs (cached for speed)"""
+async def get_quote(
+    request: Request,
+    symbol: str,
+    since: int = Query(None, description="Snapshot version the client has; returns only the changed fields"),
+):
+    """Get quote for any stock symbol with EMAs (cached for speed)
+    
+    Cached snapshots are returned as pre-serialized JSON with an ETag, and a
+    matching If-None-Match gets an empty 304. With `since`, returns a delta
+    envelope (same shape as the /ws/quotes messages), or a full snapshot
+    envelope if that version is no longer kept.
+    """
     symbol = symbol.upper()
+    if is_listed(symbol):  # arbitrary symbols must not become refresh work
+        record_interest(symbol)
     
     # Return cached data immediately if available (even if slightly stale)
-    if symbol in CACHE:
-        # For popular stocks, always return cache instantly
-        return CACHE[symbol]
+    if since is not None:
+        delta = get_delta(symbol, since)
+        if delta is not None:
+            return {"type": "delta", "symbol": symbol, **delta}
+        seq, data = get_versioned_snapshot(symbol)
+        if data is not None:
+            return {"type": "snapshot", "symbol": symbol, "seq": seq, "data": data}
+    else:
+        encoded = get_encoded_snapshot(symbol)
+        if encoded is not None:
+            # For popular stocks, always return cache instantly
+            return _encoded_response(request, encoded)
     
     # For new symbols, fetch in background but return quickly
-    # Trigger background fetch
-    asyncio.create_task(asyncio.to_thread(fetch_stock_data, symbol))
+    start_background_fetch(symbol)
     
     # Return placeholder immediately
     return {
@@ -61,6 +138,109 @@ async def get_quote(symbol: str):
     }
 
 
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip (explicitly or via '*', with q > 0)"""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding.strip().lower()] = q
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def _encoded_response(request: Request, encoded: dict) -> Response:
+    """Response for a pre-serialized snapshot: 304 if unchanged, gzip if accepted"""
+    headers = {"ETag": encoded['etag'], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if encoded['etag'] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(gzip_body(encoded), media_type="application/json", headers=headers)
+    return Response(encoded['body'], media_type="application/json", headers=headers)
+
+
+_BACKGROUND_FETCHES = {}  # symbol -> task (keeps a reference so the task isn't garbage collected)
+
+
+def start_background_fetch(symbol: str):
+    """Start fetching a symbol that has no snapshot yet and stream it from now on
+    
+    Repeated polls while the first fetch is still running don't start another
+    one (fetch_stock_data is also single-flight across all callers). Only listed
+    symbols are streamed, and the subscription is dropped again if the fetch
+    produced no snapshot.
+    """
+    if symbol in _BACKGROUND_FETCHES:
+        return
+    if is_listed(symbol):
+        subscribe_symbols([symbol])
+    
+    def finished(_):
+        _BACKGROUND_FETCHES.pop(symbol, None)
+        if get_snapshot(symbol) is None and symbol not in TRACKED_SYMBOLS:
+            unsubscribe_symbols([symbol])
+    
+    task = asyncio.create_task(asyncio.to_thread(fetch_stock_data, symbol))
+    _BACKGROUND_FETCHES[symbol] = task
+    task.add_done_callback(finished)
+
+
+@router.websocket("/ws/quotes")
+async def quotes_websocket(websocket: WebSocket):
+    """Push quote updates for subscribed symbols whenever their snapshot changes
+    
+    Client messages:
+    - {"type": "subscribe", "symbols": ["AAPL"]}
+    - {"type": "unsubscribe", "symbols": ["AAPL"]}
+    - {"type": "resync", "symbols": ["AAPL"]}  (resend full snapshots)
+    - {"type": "ping"}
+    
+    Server messages:
+    - {"type": "snapshot", "symbol": "AAPL", "seq": 7, "data": {...snapshot...}}
+    - {"type": "delta", "symbol": "AAPL", "seq": 8, "base": 7, "changes": {...}, "removed": [[...path]]}
+    
+    A delta applies only to the snapshot at version `base`; on a mismatch the
+    client should send resync. Symbols missing from the asset index are not
+    subscribed.
+    """
+    await websocket.accept()
+    # Fetches started for this client (first subscribe) are interactive
+    set_priority(INTERACTIVE)
+    try:
+        while True:
+            msg = await websocket.receive_json()
+            symbols = [s.upper() for s in msg.get('symbols', []) if isinstance(s, str)]
+            
+            if msg.get('type') == 'subscribe':
+                # Unlisted symbols would become standing refresh and stream work
+                missing = await push_service.subscribe(websocket, [s for s in symbols if is_listed(s)])
+                for symbol in missing:
+                    start_background_fetch(symbol)
+            elif msg.get('type') == 'unsubscribe':
+                push_service.unsubscribe(websocket, symbols)
+            elif msg.get('type') == 'resync':
+                for symbol in symbols:
+                    await push_service.send_current(websocket, symbol)
+            elif msg.get('type') == 'ping':
+                await websocket.send_json({'type': 'pong'})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"⚠️  Quote socket error: {e}")
+    finally:
+        push_service.remove_client(websocket)
+
+
 async def prefetch_popular_stocks():
     """Pre-fetch popular stocks on startup for instant switching"""
     print("🔄 Pre-fetching popular stocks...")
@@ -76,13 +256,13 @@ async def prefetch_popular_stocks():
 
 
 @router.get("/api/grok/stream/{symbol}")
-async def stream_grok_endpoint(symbol: str):
+async def stream_grok_endpoint(symbol: str, request: Request):
     """Stream Grok AI analysis in real-time with sector context"""
     symbol = symbol.upper()
     
     try:
-        # Fetch news for the symbol
-        news_data = await asyncio.to_thread(fetch_news_for_symbol, symbol)
+        # News for the symbol (cached; an unchanged news set reuses the cached analysis)
+        news_data = await asyncio.to_thread(get_cached_news, symbol)
         top_news = news_data.get('top_news', [])
         regular_news = news_data.get('regular_news', [])
         
@@ -91,9 +271,9 @@ async def stream_grok_endpoint(symbol: str):
         sector = sector_info.get('sector', 'Unknown')
         sector_weight = sector_info.get('weightage', 0.0)
         
-        # Stream the Grok analysis
+        # Join the shared Grok stream for this news set (started by the first client)
         return StreamingResponse(
-            stream_grok_analysis(symbol, regular_news, top_news, sector, sector_weight),
+            subscribe_grok_stream(symbol, regular_news, top_news, sector, sector_weight, request.is_disconnected),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -137,14 +317,94 @@ async def sector_analysis_endpoint(
         return {"error": str(e), "symbol": symbol}
 
 
-async def background_refresh_popular():
-    """Refresh popular stocks every 5 seconds"""
-    popular = ["TSLA", "AAPL", "GOOGL", "MSFT", "AMZN", "NVDA"]
+async def _full_refresh(symbol: str, in_flight: dict, last_full: dict):
+    """Run the full fetch pipeline for one watched symbol in the background"""
+    try:
+        await asyncio.to_thread(fetch_stock_data, symbol)
+        last_full[symbol] = time.monotonic()
+    except Exception as e:
+        print(f"Refresh error {symbol}: {e}")
+    finally:
+        in_flight.pop(symbol, None)
+
+
+def _interval(demand: float, fastest: float, slowest: float) -> float:
+    """Refresh interval for a symbol: `fastest` at demand >= 1, slower in proportion below it"""
+    return min(slowest, max(fastest, fastest / demand))
+
+
+def _due(last: float, session_started: float, now: float, demand: float, fastest: float, slowest: float) -> bool:
+    """Whether a symbol refreshed at `last` needs a refresh now
+    
+    Always once after the market session changed; then every `_interval()`, or
+    never again in the session when `fastest` is None (nothing trades).
+    """
+    if last < session_started:
+        return True
+    return fastest is not None and now - last >= _interval(demand, fastest, slowest)
+
+
+async def background_refresh():
+    """Refresh the symbols clients are watching, as often as their interest and the market session warrant
+    
+    Each cycle, symbols due for a quote refresh (batched snapshot requests, at
+    most QUOTE_REFRESH_PER_CYCLE symbols) and for a full pipeline run (at most
+    FULL_REFRESH_PER_CYCLE) are taken in order of interest. Symbols nobody
+    watches any more are dropped and unsubscribed from the stream.
+    
+    Cadence follows the market session (MARKET_SESSION_REFRESH): slower in the
+    extended sessions, and while the market is closed each symbol is refreshed
+    once after the close and then left alone until the next session.
+    """
+    # Symbols pre-fetched on startup already had their full refresh
+    last_full = {s: time.monotonic() for s in POPULAR_STOCKS if get_snapshot(s) is not None}
+    last_quote = {}
+    in_flight = {}  # symbol -> task (keeps a reference so the task isn't garbage collected)
     while True:
-        await asyncio.sleep(5)
-        for symbol in popular:
+        await asyncio.sleep(MARKET_SESSION_REFRESH[session_name()]['cycle'])
+        demand = interest_scores()
+        
+        # Forget symbols that went cold (re-fetched on the next request)
+        cold_symbols = [s for s in last_quote if s not in demand]
+        for symbol in cold_symbols:
+            last_quote.pop(symbol, None)
+            last_full.pop(symbol, None)
+        unsubscribe_symbols([s for s in cold_symbols if s not in TRACKED_SYMBOLS])
+        if not demand:
+            continue
+        
+        ranked = sorted(demand, key=demand.get, reverse=True)
+        now = time.monotonic()
+        market = current_session()
+        cadence = MARKET_SESSION_REFRESH[market['session']]
+        session_started = now - seconds_in_session(market)
+        
+        # Prices, quotes and day range in a few multi-symbol requests
+        quote_due = [
+            s for s in ranked
+            if _due(last_quote.get(s, float('-inf')), session_started, now, demand[s],
+                    cadence['quote'], QUOTE_REFRESH_MAX_INTERVAL)
+        ][:QUOTE_REFRESH_PER_CYCLE]
+        missing = []
+        if quote_due:
             try:
-                await asyncio.to_thread(fetch_stock_data, symbol)
+                missing = await asyncio.to_thread(refresh_quotes_batch, quote_due)
+                for symbol in quote_due:
+                    last_quote[symbol] = now
             except Exception as e:
-                print(f"Refresh error {symbol}: {e}")
-
+                print(f"Batch refresh error: {e}")
+        
+        # EMAs, premarket levels, news etc. change slowly - full pipeline on a longer cadence
+        due = missing + [
+            s for s in ranked
+            if s not in missing and _due(last_full.get(s, float('-inf')), session_started, now, demand[s],
+                                         cadence['full'], FULL_REFRESH_MAX_INTERVAL)
+        ]
+        started = 0
+        for symbol in due:
+            if started >= FULL_REFRESH_PER_CYCLE:
+                break
+            if symbol in in_flight:
+                continue
+            in_flight[symbol] = asyncio.create_task(_full_refresh(symbol, in_flight, last_full))
+            started += 1
@@ -10,6 +10,10 @@ API_KEY = os.getenv("ALPACA_API_KEY", "")
 SECRET_KEY = os.getenv("ALPACA_SECRET_KEY", "")
 POLYGON_API_KEY = os.getenv("POLYGON_API_KEY", "")  # Free tier: 5 requests/minute
 
+# Non-Alpaca upstreams (point both at utils/stub_upstream_server.py for local testing)
+GROK_API_BASE = os.getenv("GROK_API_BASE", "https://api.x.ai/v1")
+POLYGON_API_BASE = os.getenv("POLYGON_API_BASE", "https://api.polygon.io")
+
 # Alpaca API Clients
 rest_api = REST(
     key_id=API_KEY,
@@ -25,12 +29,142 @@ data_api = REST(
     api_version='v2'
 )
 
-# Cache configuration
-CACHE = {}
-NEWS_CACHE = {}
-NEWS_CACHE_DURATION = 600  # 10 minutes in seconds
+# Cache configuration (see utils/cache.py; 'persist' namespaces survive restarts via SQLite)
+NEWS_CACHE_DURATION = 600  # seconds a symbol's news is served without a ticker request if the feed is down
+CACHE_NAMESPACES = {
+    # Quote snapshots: kept until evicted (tracked symbols are refreshed continuously)
+    'quotes': {'ttl': None, 'max_entries': 500},
+    # Today's minute bars per symbol/timeframe (intraday_bar_service)
+    'intraday_bars': {'ttl': None, 'max_entries': 200},
+    # P/E and peers: 24 hours to save FMP API calls (250/day limit)
+    'sector': {'ttl': 86400, 'stale_ttl': 86400, 'max_entries': 1000, 'persist': True},
+    # Grok analyses keyed by news fingerprint: valid as long as the news set is unchanged
+    # (news covers 7 days, so an older fingerprint cannot come back)
+    'grok': {'ttl': 7 * 86400, 'max_entries': 500, 'persist': True},
+    # Per-ticker Yahoo Finance fundamentals shared by all sector analyses
+    'fundamentals': {'ttl': 6 * 3600, 'stale_ttl': 86400, 'max_entries': 2000, 'persist': True},
+    # Tickers Yahoo returned nothing (or an error) for: not downloaded again for an hour
+    'missing_fundamentals': {'ttl': 3600, 'max_entries': 2000},
+    # Sector and estimated weightage per symbol (sector_service): the weightage uses live quotes,
+    # so it is estimated once a day rather than on every pipeline run and Grok stream
+    'sector_info': {'ttl': 86400, 'max_entries': 1000},
+    # Symbols Alpaca doesn't know (asset_metadata_service): not looked up again for a day
+    'unknown_assets': {'ttl': 86400, 'max_entries': 5000},
+}
+FUNDAMENTALS_MAX_WORKERS = 8  # concurrent Yahoo Finance downloads for peer sets
+
+# Upstream request budgets (utils/upstream_budget.py): requests per minute and burst per provider
+UPSTREAM_BUDGETS = {
+    'alpaca': {'per_minute': 190, 'burst': 20},  # 200/min account limit
+    'polygon': {'per_minute': 5, 'burst': 5},  # free tier
+    'xai': {'per_minute': 60, 'burst': 10},
+    'yahoo': {'per_minute': 120, 'burst': 10},  # unofficial; throttles scrapers
+}
+
+# Shared outbound HTTP client for Grok/Polygon (utils/http_client.py)
+HTTP_TIMEOUT = 30  # seconds per read/write/pool wait
+HTTP_CONNECT_TIMEOUT = 5  # seconds to establish a connection
+HTTP_MAX_CONNECTIONS = 100  # pooled connections across all hosts
+HTTP_MAX_KEEPALIVE = 20  # idle connections kept open for reuse
+HTTP_DEFAULT_HOST_LIMIT = 10  # concurrent requests per host
+HTTP_HOST_LIMITS = {  # per-host overrides
+    'api.x.ai': 32,  # long-lived analysis streams
+    'api.polygon.io': 4,  # free tier is 5 requests/minute
+}
+
+# News ingestion (services/news_service.py; Polygon free tier is 5 requests/minute)
+NEWS_POLL_INTERVAL = 60  # seconds between polls of the all-tickers news feed
+NEWS_POLL_OVERLAP = 300  # seconds each poll re-reads before the cursor (late-indexed articles)
+NEWS_POLL_MAX_PAGES = 3  # feed pages (1000 articles each) per poll; the rest on the next poll
+NEWS_RETENTION_DAYS = 7  # articles kept in the store and backfilled for a new symbol
+NEWS_VIEW_LIMIT = 50  # newest articles per symbol view
+NEWS_POLL_INTERVAL_CLOSED = 600  # seconds between feed polls while the market is closed
+
+# Grok analysis streams (services/grok_stream_service.py)
+GROK_DISCONNECT_POLL = 0.5  # seconds between client disconnect checks on /api/grok/stream
+
+# Shared intraday bar store
+INTRADAY_MIN_REFRESH = 2  # seconds between incremental pulls for the same symbol
+INTRADAY_MAX_DAYS_BACK = 1  # completed days are served by the on-disk history store
+
+# Real-time market data stream (set ALPACA_STREAM_URL to a fake server for local testing)
+ALPACA_STREAM_URL = os.getenv("ALPACA_STREAM_URL", "wss://stream.data.alpaca.markets/v2/iex")
+STREAM_RECONNECT_MAX_DELAY = 30  # seconds, cap for exponential reconnect backoff
+STREAM_QUOTE_MAX_AGE = 5  # seconds a streamed quote is trusted before falling back to REST
+
+# Server push (/ws/quotes)
+PUSH_INTERVAL = 0.25  # seconds; snapshot changes are coalesced and flushed at this rate
+PUSH_SEND_TIMEOUT = 2  # seconds before a slow push client is dropped
+SNAPSHOT_HISTORY = 20  # recent snapshot versions kept per symbol for deltas
+FULL_SNAPSHOT_EVERY = 20  # pushed deltas between full resync snapshots
+
+# Local data (persistent stores)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+BAR_HISTORY_DIR = os.path.join(DATA_DIR, "bars")  # memory-mapped OHLCV history per symbol/timeframe
+ASSET_METADATA_PATH = os.path.join(DATA_DIR, "assets.json")  # bulk asset list (names, exchanges, flags)
+CACHE_DB_PATH = os.path.join(DATA_DIR, "cache.sqlite3")  # persistent cache namespaces (see CACHE_NAMESPACES)
+CACHE_EXPIRY_INTERVAL = 600  # seconds between deletes of expired persistent cache rows
+ASSET_METADATA_REFRESH_INTERVAL = 86400  # seconds; asset metadata (and the search index) refresh daily
 
 # Popular stocks for pre-fetching
 POPULAR_STOCKS = ["TSLA", "AAPL", "GOOGL", "MSFT", "AMZN", "NVDA", "META", "NFLX", "AMD", "COIN"]
 REFRESH_INTERVAL = 5  # seconds
 
+# Demand-driven background refresh (api/routes.py background_refresh, services/interest_service.py)
+TRACKED_SYMBOLS = list(POPULAR_STOCKS)  # always subscribed to the real-time stream
+SNAPSHOT_BATCH_SIZE = 100  # symbols per multi-symbol snapshot request
+INTEREST_HALF_LIFE = 300  # seconds for a symbol's interest score to halve
+INTEREST_WEIGHTS = {
+    'quote': 1.0,  # per quote request (polling clients keep adding)
+    'search_click': 3.0,  # per search result opened
+    'subscriber': 2.0,  # per live /ws/quotes subscriber (held while subscribed, not decayed)
+}
+INTEREST_MIN = 0.1  # symbols below this interest are not refreshed
+QUOTE_REFRESH_MAX_INTERVAL = 60  # seconds; quote refresh slows from REFRESH_INTERVAL to this as interest falls
+QUOTE_REFRESH_PER_CYCLE = 200  # max symbols in one cycle's batched quote refresh
+FULL_REFRESH_INTERVAL = 60  # seconds between full fetch_stock_data runs for a symbol at interest >= 1
+FULL_REFRESH_MAX_INTERVAL = 900  # seconds, slowest full refresh for a barely watched symbol
+FULL_REFRESH_PER_CYCLE = 4  # max full refreshes started per refresh cycle
+
+# Market sessions (services/market_calendar_service.py)
+MARKET_CALENDAR_DAYS = 30  # days of Alpaca's trading calendar loaded ahead
+MARKET_CALENDAR_REFRESH = 86400  # seconds between calendar reloads
+MARKET_CLOCK_REFRESH = 300  # seconds between Alpaca clock checks (unscheduled closures)
+MARKET_SESSION_REFRESH = {  # background refresh per session: seconds per cycle, fastest quote/full refresh
+    'premarket': {'cycle': 15, 'quote': 15, 'full': 300},
+    'regular': {'cycle': REFRESH_INTERVAL, 'quote': REFRESH_INTERVAL, 'full': FULL_REFRESH_INTERVAL},
+    'afterhours': {'cycle': 15, 'quote': 15, 'full': 300},
+    'closed': {'cycle': 60, 'quote': None, 'full': None},  # None = only once after the session starts
+}
+
+# Concurrent fetch pipeline (fetch_stock_data)
+FETCH_MAX_WORKERS = 16  # shared pool for all per-symbol upstream stages
+FETCH_STAGE_TIMEOUTS = {  # seconds to wait for a stage before using a partial result
+    'company': 5,
+    'price': 5,
+    'day_range': 8,
+    'week52': 8,
+    'emas_daily': 15,
+    'emas_hourly': 15,
+    'emas_10min': 15,
+    'premarket': 8,
+    'crossovers': 8,
+    'grok': 10,
+    'sector': 10,
+}
+
+# Quote snapshot components and what makes each one stale (services/quote_component_service.py)
+SNAPSHOT_COMPONENTS = {
+    'price': 'tick',  # every fetch (the stream and batch refresh update it in between)
+    'day_range': 'minute',  # a minute bar closed
+    'week52': 'day',  # completed days before today; today's range is folded in on assembly
+    'emas_daily': 'day',
+    'emas_hourly': 'hour',
+    'emas_10min': '10min',
+    'premarket': 'minute',  # then fixed for the day once the premarket is over
+    'crossovers': 'minute',  # and whenever the price or an EMA it was computed from changed
+    'company': 'day',
+    'sector': 'day',
+    'grok': 'news',  # the symbol's stored news changed
+}
+
@@ -1,9 +1,19 @@
 """Main FastAPI application - Simplified and modular"""
 import asyncio
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from api.routes import router, prefetch_popular_stocks, background_refresh_popular
+from api.routes import router, prefetch_popular_stocks, background_refresh
+from config.settings import rest_api, data_api, API_KEY, POLYGON_API_KEY, TRACKED_SYMBOLS
+from services.push_service import run_push_hub
+from services.asset_metadata_service import run_metadata_refresh
+from services.market_calendar_service import run_market_calendar
+from services.news_service import run_news_ingestion
+from services.search_service import get_index
+from services.stream_service import run_stream
+from utils import http_client
+from utils.persistent_cache import run_cache_expiry
+from utils.upstream_budget import INTERACTIVE, limit_rest_client, set_priority
 
 # Initialize FastAPI app
 app = FastAPI(title="Stock Data API", version="2.0")
@@ -20,19 +30,65 @@ app.add_middleware(
 # Include API routes
 app.include_router(router)
 
+# Alpaca REST calls share the 'alpaca' request budget
+limit_rest_client(rest_api)
+limit_rest_client(data_api)
+
+
+@app.middleware("http")
+async def interactive_priority(request: Request, call_next):
+    """Upstream calls made for an HTTP request go ahead of background refreshes"""
+    set_priority(INTERACTIVE)
+    return await call_next(request)
+
 
 @app.on_event("startup")
 async def startup():
     """Startup tasks: Pre-fetch popular stocks and start background refresh"""
+    # Shared pooled client for Grok/Polygon calls (used from worker threads too)
+    http_client.start()
+    
+    # Trading calendar and clock (market sessions drive the refresh cadence)
+    app.state.market_calendar_task = asyncio.create_task(run_market_calendar())
+    
+    # Build the search index before any prefetch (interest in unlisted symbols is ignored)
+    try:
+        await asyncio.to_thread(get_index)
+    except Exception as e:
+        print(f"⚠️  Search index build error: {e}")
+    
+    # Keep asset metadata (and the search index) up to date
+    app.state.asset_metadata_task = asyncio.create_task(run_metadata_refresh())
+    
     # Pre-fetch all popular stocks for instant switching
     await prefetch_popular_stocks()
     
+    # Poll the all-tickers news feed into the shared article store
+    if POLYGON_API_KEY:
+        app.state.news_task = asyncio.create_task(run_news_ingestion())
+    
+    # Start the /ws/quotes push hub
+    app.state.push_task = asyncio.create_task(run_push_hub())
+    
+    # Start real-time stream ingestion for tracked symbols
+    if API_KEY:
+        app.state.stream_task = asyncio.create_task(run_stream(TRACKED_SYMBOLS))
+    
+    # Clean up expired persistent cache entries
+    app.state.cache_expiry_task = asyncio.create_task(run_cache_expiry())
+    
     # Start background refresh
-    asyncio.create_task(background_refresh_popular())
+    app.state.refresh_task = asyncio.create_task(background_refresh())
     
     print("🚀 Stock Data API ready!")
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    """Close pooled upstream connections"""
+    await http_client.close()
+
+
 if __name__ == "__main__":
     print("🚀 Starting Stock Data API server...")
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning")
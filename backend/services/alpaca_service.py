@@ -1,56 +1,81 @@
 """Alpaca API service for fetching stock data"""
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
 from alpaca_trade_api.rest import TimeFrame
-from config.settings import rest_api, data_api, CACHE
-from services.ema_service import get_all_emas
+from config.settings import rest_api, FETCH_MAX_WORKERS, FETCH_STAGE_TIMEOUTS
+from services.asset_metadata_service import get_asset_metadata
+from services.bar_history_service import get_history
+from services.ema_service import get_daily_emas, get_hourly_emas, get_10min_emas, get_provisional_emas
+from services.intraday_bar_service import get_intraday_bars
 from services.news_service import get_cached_news
 from services.crossover_service import detect_premarket_crossovers
 from services.premarket_service import get_premarket_levels
+from services.quote_component_service import STALE, component_versions, lookup_component, store_component
 from services.grok_service import get_cached_grok_analysis
+from services.market_calendar_service import premarket_final_day
 from services.sector_analysis_service import analyze_sector_position
+from services.search_service import search_assets
+from services.sector_service import get_sector_info
+from services.snapshot_service import add_evict_listener, save_snapshot
+from services.stream_service import get_live_quote
+from utils.cache import get_cache
+from utils.singleflight import single_flight
+from utils.upstream_budget import run_in_context
+
+# Shared bounded pool for the per-symbol fetch pipeline
+_FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+
+_SECTOR_CACHE = get_cache('sector')
+
+_PREMARKET_FINAL = {}  # symbol -> (trading day, PMH/PML) once that day's premarket is over
+add_evict_listener(lambda symbol: _PREMARKET_FINAL.pop(symbol, None))
+
+_EMPTY_COMPANY = {'companyName': None, 'exchange': None, 'sector': None, 'industry': None, 'logoUrl': None}
+_EMPTY_PRICE = {'price': 0, 'bid': 0, 'ask': 0, 'bidSize': 0, 'askSize': 0, 'timestamp': ''}
 
 
 def get_company_info(symbol: str) -> dict:
-    """Fetch company information from Alpaca Assets API"""
-    company_data = {
-        'companyName': None,
-        'exchange': None,
-        'sector': None,
-        'industry': None,
-        'logoUrl': None
-    }
+    """Company information from the asset metadata store (no API call once loaded)"""
+    company_data = dict(_EMPTY_COMPANY)
     
-    try:
-        asset = rest_api.get_asset(symbol)
-        
-        company_data['companyName'] = asset.name if hasattr(asset, 'name') else None
-        company_data['exchange'] = asset.exchange if hasattr(asset, 'exchange') else None
-        
-        # Asset class can give us some industry info
-        if hasattr(asset, 'asset_class'):
-            company_data['industry'] = asset.asset_class.replace('_', ' ').title() if asset.asset_class else None
-        
-        # Try to get logo from Alpaca Logo API (paid feature)
-        if hasattr(asset, 'logo_url') and asset.logo_url:
-            company_data['logoUrl'] = asset.logo_url
-        elif company_data['companyName']:
-            # Fallback: Auto-generate Clearbit logo URL from company name
-            first_word = company_data['companyName'].replace(',', '').replace('.', '').split()[0].lower()
-            
-            if first_word and len(first_word) > 2:
-                company_data['logoUrl'] = f"https://logo.clearbit.com/{first_word}.com"
-                print(f"   Logo generated: {first_word}.com")
+    asset = get_asset_metadata(symbol)
+    if not asset:
+        return company_data
+    
+    company_data['companyName'] = asset.get('name')
+    company_data['exchange'] = asset.get('exchange')
+    
+    # Asset class can give us some industry info
+    if asset.get('asset_class'):
+        company_data['industry'] = asset['asset_class'].replace('_', ' ').title()
+    
+    # Try to get logo from Alpaca Logo API (paid feature)
+    if asset.get('logo_url'):
+        company_data['logoUrl'] = asset['logo_url']
+    elif company_data['companyName']:
+        # Fallback: Auto-generate Clearbit logo URL from company name
+        first_word = company_data['companyName'].replace(',', '').replace('.', '').split()[0].lower()
         
-        print(f"   Company: {company_data['companyName']} | {company_data['exchange']}")
-                
-    except Exception as e:
-        print(f"   ⚠️  Asset info fetch error: {e}")
+        if first_word and len(first_word) > 2:
+            company_data['logoUrl'] = f"https://logo.clearbit.com/{first_word}.com"
     
     return company_data
 
 
 def get_current_price(symbol: str) -> dict:
-    """Get current price and quote data"""
+    """Get current price and quote data (from the live stream when it is fresh)"""
+    live = get_live_quote(symbol)
+    if live:
+        return {
+            'price': live['price'],
+            'bid': live.get('bid', 0),
+            'ask': live.get('ask', 0),
+            'bidSize': live.get('bidSize', 0),
+            'askSize': live.get('askSize', 0),
+            'timestamp': live.get('timestamp', '')
+        }
+    
     try:
         trade = rest_api.get_latest_trade(symbol)
         quote = rest_api.get_latest_quote(symbol)
@@ -65,20 +90,26 @@ def get_current_price(symbol: str) -> dict:
         }
     except Exception as e:
         print(f"⚠️  Price fetch error: {e}")
-        return {'price': 0, 'bid': 0, 'ask': 0, 'bidSize': 0, 'askSize': 0, 'timestamp': ''}
+        return dict(_EMPTY_PRICE)
+
+
+def get_final_premarket_levels(symbol: str) -> dict:
+    """Premarket levels, computed only once per trading day after the premarket session ended"""
+    # Without premarket bars the levels come from the first 30 minutes of regular trading
+    day = premarket_final_day(after_open=30 * 60)
+    final = _PREMARKET_FINAL.get(symbol)
+    if day is not None and final and final[0] == day:
+        return final[1]
+    levels = get_premarket_levels(symbol)
+    if day is not None and levels:
+        _PREMARKET_FINAL[symbol] = (day, levels)
+    return levels
 
 
 def get_day_range(symbol: str, current_price: float) -> dict:
     """Get today's high and low"""
-    today = datetime.now().strftime("%Y-%m-%d")
     try:
-        today_bars = data_api.get_bars(
-            symbol,
-            TimeFrame.Minute,
-            start=today,
-            end=today,
-            feed='iex'
-        ).df
+        today_bars = get_intraday_bars(symbol)
         
         if not today_bars.empty:
             return {
@@ -94,20 +125,15 @@ def get_day_range(symbol: str, current_price: float) -> dict:
 
 
 def get_52week_range(symbol: str, current_price: float) -> dict:
-    """Get 52-week high and low"""
+    """Get 52-week high and low of the completed days (today's range is folded in by fetch_stock_data)"""
     try:
         end_52w = datetime.now()
         start_52w = end_52w - timedelta(days=365)
         
-        bars_52w = data_api.get_bars(
-            symbol,
-            TimeFrame.Day,
-            start=start_52w.strftime("%Y-%m-%d"),
-            end=end_52w.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        # Completed days from the local history store
+        bars_52w = get_history(symbol, TimeFrame.Day, start_52w.date(), end_52w.date())
         
-        if not bars_52w.empty:
+        if len(bars_52w):
             return {
                 'week52High': float(bars_52w['high'].max()),
                 'week52Low': float(bars_52w['low'].min())
@@ -120,27 +146,174 @@ def get_52week_range(symbol: str, current_price: float) -> dict:
         return {'week52High': current_price, 'week52Low': current_price}
 
 
+def get_sector_analysis(symbol: str) -> dict:
+    """Get P/E ratio and peer analysis for a symbol (cached for 24 hours)"""
+    try:
+        return _SECTOR_CACHE.get_or_load(symbol, lambda: _fetch_sector_analysis(symbol)) or {}
+    except Exception as e:
+        print(f"   ⚠️  Sector analysis: {e}")
+        return {}
+
+
+def _fetch_sector_analysis(symbol: str) -> dict:
+    """Fetch P/E ratio and peers from FMP (None on an API error so nothing is cached)"""
+    print(f"   📊 Fetching sector analysis from FMP API...")
+    # Get P/E ratio and peer analysis (no ETF required)
+    analysis = analyze_sector_position(symbol, None)
+    if analysis.get('error'):
+        return None
+    
+    # Extract relevant data
+    financial_ratios = analysis.get('financial_ratios', {})
+    sector_analysis = {
+        'sector': financial_ratios.get('sector'),
+        'industry': financial_ratios.get('industry'),
+        'pe_ratio': financial_ratios.get('pe_ratio'),
+        'peg_ratio': financial_ratios.get('peg_ratio'),
+        'pb_ratio': financial_ratios.get('pb_ratio'),
+        'market_cap': financial_ratios.get('market_cap'),
+        'lowest_pe_peers': analysis.get('lowest_pe_peers', [])[:5]
+    }
+    
+    if sector_analysis.get('pe_ratio'):
+        print(f"   ✓ Sector analysis cached: P/E={sector_analysis.get('pe_ratio', 'N/A'):.2f}, {len(sector_analysis.get('lowest_pe_peers', []))} peers (API calls saved)")
+    return sector_analysis
+
+
+def get_grok_analysis(symbol: str) -> dict:
+    """Get Grok AI analysis of the symbol's news (news itself is not returned to UI)"""
+    # Get news (cached) - ONLY for Grok analysis
+    news_data = get_cached_news(symbol)
+    
+    # Get Grok AI analysis of news (if news available), with the sector context
+    # /api/grok/stream uses, so both share one analysis of the same news set
+    if news_data.get('top_news') or news_data.get('regular_news'):
+        sector_info = get_sector_info(symbol)
+        return get_cached_grok_analysis(symbol, news_data, sector_info.get('sector', 'Unknown'),
+                                        sector_info.get('weightage', 0.0))
+    return {}
+
+
+def _submit_stage(name: str, fn, *args) -> Future:
+    """Start a pipeline stage on the shared fetch pool
+    
+    Upstream budget waits inside the stage give up at the stage's deadline, so an
+    abandoned stage does not keep a pool thread waiting for a request slot.
+    """
+    deadline = time.monotonic() + FETCH_STAGE_TIMEOUTS.get(name, 10)
+    return _FETCH_EXECUTOR.submit(run_in_context(fn, deadline), *args)
+
+
+def _usable(value) -> bool:
+    """Whether a stage result is worth keeping (error fallbacks are empty or all zeros)"""
+    if isinstance(value, dict):
+        return any(value.values())
+    return value is not None
+
+
+def _component_stage(symbol: str, name: str, fn, *args, inputs=None) -> tuple:
+    """(future, reused) for one snapshot component: its stored value while still fresh, else a pipeline stage
+    
+    `inputs` (hashable) are values the component is computed from that its
+    trigger doesn't cover; the stored value is only reused while they are equal.
+    A recomputed value is stored by the stage itself before its future resolves, so
+    it is kept even if fetch_stock_data stopped waiting for it, and a snapshot
+    assembled from the result lists its new version.
+    """
+    key, value = lookup_component(symbol, name, inputs)
+    if value is not STALE:
+        future = Future()
+        future.set_result(value)
+        return future, True
+    
+    def compute():
+        result = fn(*args)
+        if _usable(result):
+            store_component(symbol, name, key, result)
+        return result
+    
+    return _submit_stage(name, compute), False
+
+
+def _stage_result(symbol: str, name: str, future: Future, started: float, default):
+    """Wait for a stage until its deadline; fall back to a partial result on timeout/error"""
+    remaining = max(0.0, started + FETCH_STAGE_TIMEOUTS.get(name, 10) - time.monotonic())
+    try:
+        return future.result(timeout=remaining)
+    except FuturesTimeoutError:
+        print(f"   ⏱️  {symbol} {name} timed out after {FETCH_STAGE_TIMEOUTS.get(name, 10)}s - partial result")
+    except Exception as e:
+        print(f"   ⚠️  {symbol} {name} stage error: {e}")
+    return default
+
+
+@single_flight('quote')
 def fetch_stock_data(symbol: str):
-    """Main function to fetch all stock data from Alpaca API"""
+    """Main function to fetch all stock data from Alpaca API
+    
+    The snapshot is assembled from components with their own freshness
+    (SNAPSHOT_COMPONENTS): only components whose trigger fired since they were
+    last computed (a new tick, a closed bar, a new day, new news) run
+    again; the rest are reused as they are.
+    
+    Independent stages run concurrently on a bounded pool; dependent stages
+    (day range needs the price, crossovers need price + EMAs) start as soon as
+    their inputs are ready. A stage that misses its deadline is filled with
+    an empty/default value instead of failing the whole snapshot.
+    """
     try:
-        # Get company info
-        company_info = get_company_info(symbol)
+        started = time.monotonic()
+        
+        reused = {}  # component -> whether its stored value was still fresh
+        
+        # Start all independent stages at once
+        company_future, reused['company'] = _component_stage(symbol, 'company', get_company_info, symbol)
+        price_future, reused['price'] = _component_stage(symbol, 'price', get_current_price, symbol)
+        week_range_future, reused['week52'] = _component_stage(symbol, 'week52', get_52week_range, symbol, 0)
+        ema_futures = {}
+        for name, ema_fn in (('emas_daily', get_daily_emas), ('emas_hourly', get_hourly_emas),
+                             ('emas_10min', get_10min_emas)):
+            ema_futures[name], reused[name] = _component_stage(symbol, name, ema_fn, symbol)
+        premarket_future, reused['premarket'] = _component_stage(symbol, 'premarket', get_final_premarket_levels, symbol)
+        grok_future, reused['grok'] = _component_stage(symbol, 'grok', get_grok_analysis, symbol)
+        sector_future, reused['sector'] = _component_stage(symbol, 'sector', get_sector_analysis, symbol)
         
         # Get current price
-        price_data = get_current_price(symbol)
+        price_data = _stage_result(symbol, 'price', price_future, started, _EMPTY_PRICE)
         price = price_data['price']
         
-        # Get day range
-        day_range = get_day_range(symbol, price)
+        # Day range only needs the price (as a fallback when no bars are available)
+        day_range_started = time.monotonic()
+        day_range_future, reused['day_range'] = _component_stage(symbol, 'day_range', get_day_range, symbol, price)
         
-        # Get 52-week range
-        week_range = get_52week_range(symbol, price)
+        # Crossovers need price + EMAs
+        emas = {}
+        for name, future in ema_futures.items():
+            emas.update(_stage_result(symbol, name, future, started, {}))
+        if not emas:
+            print("⚠️  No EMAs available - historical data not accessible")
+        crossovers_started = time.monotonic()
+        crossovers_future, reused['crossovers'] = _component_stage(symbol, 'crossovers', detect_premarket_crossovers,
+                                                                   symbol, price, emas,
+                                                                   inputs=(price, tuple(sorted(emas.items()))))
         
-        # Get all EMAs
-        emas = get_all_emas(symbol)
-        
-        # Get premarket high/low
-        premarket_levels = get_premarket_levels(symbol)
+        company_info = _stage_result(symbol, 'company', company_future, started, _EMPTY_COMPANY)
+        day_range = _stage_result(symbol, 'day_range', day_range_future, day_range_started,
+                                  {'dayHigh': price, 'dayLow': price})
+        if price:
+            # The stored range is from the last closed minute bar; the price may already be past it
+            day_range = {'dayHigh': max(day_range['dayHigh'] or price, price),
+                         'dayLow': min(day_range['dayLow'] or price, price)}
+        week_range = _stage_result(symbol, 'week52', week_range_future, started,
+                                   {'week52High': 0, 'week52Low': 0})
+        # Today's range counts towards the 52-week range; no data at all - fall back to current price
+        highs = [v for v in (week_range['week52High'], day_range['dayHigh']) if v]
+        lows = [v for v in (week_range['week52Low'], day_range['dayLow']) if v]
+        week_range = {'week52High': max(highs, default=price), 'week52Low': min(lows, default=price)}
+        premarket_levels = _stage_result(symbol, 'premarket', premarket_future, started, {})
+        grok_analysis = _stage_result(symbol, 'grok', grok_future, started, {})
+        sector_analysis = _stage_result(symbol, 'sector', sector_future, started, {})
+        crossovers = _stage_result(symbol, 'crossovers', crossovers_future, crossovers_started, [])
         
         # Build result
         result = {
@@ -160,84 +333,34 @@ def fetch_stock_data(symbol: str):
             "week52High": round(week_range['week52High'], 2),
             "week52Low": round(week_range['week52Low'], 2),
             "emas": emas,
+            "provisionalEmas": get_provisional_emas(symbol, price),  # current partial bars closing at the price
             "premarketLevels": premarket_levels,  # PMH and PML
             "pivots": {},  # Pivots commented out for now
             "logoUrl": company_info['logoUrl']
         }
         
-        # Get news (cached) - ONLY for Grok analysis, not returned to UI
-        news_data = get_cached_news(symbol)
-        
-        # Get Grok AI analysis of news (if news available)
-        grok_analysis = {}
-        if news_data.get('top_news') or news_data.get('regular_news'):
-            grok_analysis = get_cached_grok_analysis(symbol, news_data)
+        # DO NOT return news to frontend - only Grok analysis
         result["grokAnalysis"] = grok_analysis
         
         # Sector analysis with P/E ratio (CACHED - 24 hours to save API calls)
-        sector_cache_key = f"{symbol}_sector_analysis"
-        sector_analysis = {}
-        
-        # Check cache first (24 hour cache to save FMP API calls - only 250/day limit)
-        if sector_cache_key in CACHE:
-            cached_sector = CACHE[sector_cache_key]
-            from datetime import datetime
-            cache_age = (datetime.now() - cached_sector.get('timestamp', datetime.min)).total_seconds()
-            
-            # Use cache if less than 24 hours old
-            if cache_age < 86400:  # 24 hours = 86400 seconds
-                sector_analysis = cached_sector.get('data', {})
-                print(f"   💾 Using cached sector analysis (age: {cache_age/3600:.1f}h)")
-        
-        # If not in cache or expired, fetch new data
-        if not sector_analysis:
-            print(f"   📊 Fetching sector analysis from FMP API...")
-            try:
-                # Get P/E ratio and peer analysis (no ETF required)
-                analysis = analyze_sector_position(symbol, None)
-                
-                # Extract relevant data
-                if not analysis.get('error'):
-                    financial_ratios = analysis.get('financial_ratios', {})
-                    sector_analysis = {
-                        'sector': financial_ratios.get('sector'),
-                        'industry': financial_ratios.get('industry'),
-                        'pe_ratio': financial_ratios.get('pe_ratio'),
-                        'peg_ratio': financial_ratios.get('peg_ratio'),
-                        'pb_ratio': financial_ratios.get('pb_ratio'),
-                        'market_cap': financial_ratios.get('market_cap'),
-                        'lowest_pe_peers': analysis.get('lowest_pe_peers', [])[:5]
-                    }
-                    
-                    # Cache for 24 hours
-                    from datetime import datetime
-                    CACHE[sector_cache_key] = {
-                        'data': sector_analysis,
-                        'timestamp': datetime.now()
-                    }
-                    
-                    if sector_analysis.get('pe_ratio'):
-                        print(f"   ✓ Sector analysis cached: P/E={sector_analysis.get('pe_ratio', 'N/A'):.2f}, {len(sector_analysis.get('lowest_pe_peers', []))} peers (API calls saved)")
-            except Exception as e:
-                print(f"   ⚠️  Sector analysis: {e}")
-        
         result["sectorAnalysis"] = sector_analysis
         
-        # DO NOT return news to frontend - only Grok analysis
-        
-        # Detect premarket EMA crossovers
-        crossovers = detect_premarket_crossovers(symbol, price, emas)
+        # Premarket EMA crossovers
         result["crossovers"] = crossovers
         
-        # Cache the result
-        CACHE[symbol] = result
+        # Versions of the stored components this snapshot was assembled from
+        result["componentVersions"] = component_versions(symbol)
+        
+        # Cache the result (and notify push subscribers)
+        save_snapshot(symbol, result)
         
         # Log summary
         logo_status = "🖼️" if company_info['logoUrl'] else "⚡"
         crossover_status = f" | 🚨{len(crossovers)} alerts" if crossovers else ""
         pm_status = f" | PMH/PML: {len(premarket_levels)}" if premarket_levels else ""
         grok_status = f" | 🤖 {grok_analysis.get('sentiment', 'N/A')}" if grok_analysis and grok_analysis.get('sentiment') else ""
-        print(f"✅ {symbol} ${price} {logo_status} | Range: {day_range['dayLow']:.2f}-{day_range['dayHigh']:.2f} | EMAs: {len(emas)}{pm_status}{grok_status}{crossover_status}")
+        elapsed = time.monotonic() - started
+        print(f"✅ {symbol} ${price} {logo_status} | Range: {day_range['dayLow']:.2f}-{day_range['dayHigh']:.2f} | EMAs: {len(emas)}{pm_status}{grok_status}{crossover_status} | ♻️ {sum(reused.values())}/{len(reused)} reused | {elapsed:.1f}s")
         
         return result
     except Exception as e:
@@ -246,47 +369,5 @@ def fetch_stock_data(symbol: str):
 
 
 def search_stocks(query: str) -> list:
-    """Search for stocks by symbol or company name"""
-    try:
-        assets = rest_api.list_assets(status='active', asset_class='us_equity')
-        
-        query_upper = query.upper()
-        query_lower = query.lower()
-        
-        exact_matches = []
-        starts_with = []
-        contains = []
-        
-        for asset in assets:
-            symbol_upper = asset.symbol.upper()
-            name_lower = asset.name.lower()
-            
-            # Priority 1: Exact symbol match
-            if symbol_upper == query_upper:
-                exact_matches.append({
-                    'symbol': asset.symbol,
-                    'name': asset.name,
-                    'exchange': asset.exchange,
-                })
-            # Priority 2: Symbol starts with query
-            elif symbol_upper.startswith(query_upper):
-                starts_with.append({
-                    'symbol': asset.symbol,
-                    'name': asset.name,
-                    'exchange': asset.exchange,
-                })
-            # Priority 3: Company name starts with query or contains it
-            elif name_lower.startswith(query_lower) or query_lower in name_lower:
-                contains.append({
-                    'symbol': asset.symbol,
-                    'name': asset.name,
-                    'exchange': asset.exchange,
-                })
-        
-        # Combine results with priority order
-        matches = exact_matches + starts_with[:5] + contains[:5]
-        return matches[:10]  # Limit to 10 total suggestions
-    except Exception as e:
-        print(f"Search error: {e}")
-        return []
-
+    """Search for stocks by symbol or company name (served from the in-memory index)"""
+    return search_assets(query)
@@ -0,0 +1,145 @@
+"""Static asset metadata store
+
+Name, exchange, asset class and trading flags for every active US equity come
+from one bulk `list_assets` download, are persisted to DATA_DIR/assets.json and
+refreshed once every ASSET_METADATA_REFRESH_INTERVAL seconds. Company info and
+sector lookups read from here instead of calling `get_asset` per symbol.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from alpaca_trade_api.rest import APIError
+from config.settings import rest_api, ASSET_METADATA_PATH, ASSET_METADATA_REFRESH_INTERVAL
+from utils.cache import get_cache
+from utils.singleflight import single_flight
+
+_FIELDS = ('symbol', 'name', 'exchange', 'asset_class', 'status', 'tradable', 'marginable',
+           'shortable', 'easy_to_borrow', 'fractionable', 'logo_url')
+
+# symbol -> metadata dict; replaced as a whole on refresh
+_state = {'assets': None, 'updated_at': 0}
+_LISTENERS = []
+_SAVE_LOCK = threading.Lock()
+_UNKNOWN = get_cache('unknown_assets')  # symbols get_asset answered 404 for
+
+
+def add_listener(callback):
+    """Register `callback(assets)` to be called after the bulk list is refreshed"""
+    _LISTENERS.append(callback)
+
+
+def _to_record(asset) -> dict:
+    """Plain dict of the metadata fields of an Alpaca Asset"""
+    return {field: getattr(asset, field, None) for field in _FIELDS}
+
+
+def _load():
+    """Load the persisted store (once)"""
+    if _state['assets'] is not None:
+        return
+    assets, updated_at = {}, 0
+    try:
+        if os.path.exists(ASSET_METADATA_PATH):
+            with open(ASSET_METADATA_PATH) as f:
+                stored = json.load(f)
+            assets, updated_at = stored['assets'], stored['updated_at']
+    except Exception as e:
+        print(f"⚠️  Asset metadata read error: {e}")
+    _state.update(assets=assets, updated_at=updated_at)
+
+
+def _save():
+    """Atomically persist the store"""
+    with _SAVE_LOCK:
+        os.makedirs(os.path.dirname(ASSET_METADATA_PATH), exist_ok=True)
+        tmp = ASSET_METADATA_PATH + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'updated_at': _state['updated_at'], 'assets': _state['assets']}, f)
+        os.replace(tmp, ASSET_METADATA_PATH)
+
+
+@single_flight('asset_metadata')
+def refresh_metadata() -> dict:
+    """Download the bulk asset list, persist it and notify listeners"""
+    started = time.monotonic()
+    _load()
+    downloaded = rest_api.list_assets(status='active', asset_class='us_equity')
+    assets = {a.symbol.upper(): _to_record(a) for a in downloaded}
+    # Keep symbols looked up individually (e.g. no longer active) that the list doesn't have
+    assets = {**_state['assets'], **assets}
+    _state.update(assets=assets, updated_at=time.time())
+    _save()
+    print(f"🗂️  Asset metadata: {len(downloaded)} assets ({time.monotonic() - started:.1f}s)")
+    _notify()
+    return assets
+
+
+def _notify():
+    """Hand the active asset list to listeners (e.g. the search index)"""
+    assets = active_assets()
+    for callback in _LISTENERS:
+        try:
+            callback(assets)
+        except Exception as e:
+            print(f"⚠️  Asset metadata listener error: {e}")
+
+
+def active_assets() -> list:
+    """Metadata of every active asset in the store"""
+    _load()
+    return [a for a in _state['assets'].values() if a.get('status') == 'active']
+
+
+def get_asset_metadata(symbol: str) -> dict:
+    """Metadata for one symbol from the store, or None if unknown
+    
+    Symbols missing from the bulk list are looked up once with `get_asset`
+    and persisted with the store; symbols Alpaca doesn't know are not looked
+    up again until the 'unknown_assets' cache entry expires.
+    """
+    _load()
+    symbol = symbol.upper()
+    record = _state['assets'].get(symbol)
+    if record is not None:
+        return record
+    if symbol in _UNKNOWN:
+        return None
+    try:
+        record = _to_record(rest_api.get_asset(symbol))
+    except APIError as e:
+        if e.status_code == 404:
+            _UNKNOWN.set(symbol, True)
+        print(f"   ⚠️  Asset info fetch error: {e}")
+        return None
+    except Exception as e:
+        print(f"   ⚠️  Asset info fetch error: {e}")
+        return None
+    _state['assets'] = {**_state['assets'], symbol: record}
+    try:
+        _save()
+    except Exception as e:
+        print(f"⚠️  Asset metadata write error: {e}")
+    return record
+
+
+async def run_metadata_refresh():
+    """Refresh the store when it is older than ASSET_METADATA_REFRESH_INTERVAL, then daily"""
+    _load()
+    notified = False
+    while True:
+        age = time.time() - _state['updated_at']
+        if age >= ASSET_METADATA_REFRESH_INTERVAL:
+            try:
+                await asyncio.to_thread(refresh_metadata)
+                notified = True
+                age = 0
+            except Exception as e:
+                print(f"⚠️  Asset metadata refresh error: {e}")
+                age = ASSET_METADATA_REFRESH_INTERVAL - 300  # retry in 5 minutes
+        if not notified and _state['assets']:
+            # Store loaded from disk: build what depends on it without a download
+            await asyncio.to_thread(_notify)
+            notified = True
+        await asyncio.sleep(ASSET_METADATA_REFRESH_INTERVAL - age)
@@ -0,0 +1,189 @@
+"""Persistent local OHLCV history store
+
+Completed-day bars are kept on disk as one memory-mapped NumPy file per symbol
+and timeframe (plus a small JSON sidecar with the covered date range). Reads are
+served from the memory map; only date ranges outside the covered range are
+downloaded from Alpaca and merged in, so restarts don't re-download history.
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from config.settings import data_api, BAR_HISTORY_DIR
+from services.snapshot_service import add_evict_listener
+
+BAR_DTYPE = np.dtype([
+    ('t', 'i8'),  # bar start, ns since epoch (UTC)
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+])
+
+# (symbol, timeframe) -> {'bars': memmap, 'meta': dict}
+_OPEN = {}
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _lock_for(key: tuple) -> threading.Lock:
+    """One lock per symbol/timeframe file"""
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+def _drop_symbol(symbol: str):
+    """Close an evicted symbol's memory maps and forget its locks (the files stay on disk)"""
+    with _LOCKS_GUARD:
+        keys = [key for key in _LOCKS if key[0] == symbol]
+        locks = [_LOCKS.pop(key) for key in keys]
+    for key, lock in zip(keys, locks):
+        with lock:
+            _OPEN.pop(key, None)
+
+
+add_evict_listener(_drop_symbol)
+
+
+def _paths(symbol: str, timeframe) -> tuple:
+    """Data and metadata file paths for a symbol/timeframe"""
+    base = os.path.join(BAR_HISTORY_DIR, f"{symbol.upper()}_{timeframe}")
+    return f"{base}.npy", f"{base}.json"
+
+
+def _load(symbol: str, timeframe) -> dict:
+    """Open (memory-map) the stored bars for a symbol/timeframe"""
+    key = (symbol, str(timeframe))
+    if key in _OPEN:
+        return _OPEN[key]
+    
+    data_path, meta_path = _paths(symbol, timeframe)
+    entry = {'bars': np.empty(0, dtype=BAR_DTYPE), 'meta': None}
+    try:
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            entry['bars'] = np.load(data_path, mmap_mode='r')
+            with open(meta_path) as f:
+                meta = json.load(f)
+            entry['meta'] = {
+                'covered_from': date.fromisoformat(meta['covered_from']),
+                'covered_to': date.fromisoformat(meta['covered_to']),
+            }
+    except Exception as e:
+        print(f"   ⚠️  Bar history read error {symbol} {timeframe}: {e}")
+        entry = {'bars': np.empty(0, dtype=BAR_DTYPE), 'meta': None}
+    
+    _OPEN[key] = entry
+    return entry
+
+
+def _save(symbol: str, timeframe, bars: np.ndarray, covered_from: date, covered_to: date):
+    """Atomically write bars + metadata and re-open the memory map"""
+    os.makedirs(BAR_HISTORY_DIR, exist_ok=True)
+    data_path, meta_path = _paths(symbol, timeframe)
+    
+    tmp_data = data_path + '.tmp.npy'
+    np.save(tmp_data, bars)
+    os.replace(tmp_data, data_path)
+    
+    tmp_meta = meta_path + '.tmp'
+    with open(tmp_meta, 'w') as f:
+        json.dump({'covered_from': covered_from.isoformat(), 'covered_to': covered_to.isoformat()}, f)
+    os.replace(tmp_meta, meta_path)
+    
+    _OPEN[(symbol, str(timeframe))] = {
+        'bars': np.load(data_path, mmap_mode='r'),
+        'meta': {'covered_from': covered_from, 'covered_to': covered_to},
+    }
+
+
+def _to_ns(day: date) -> int:
+    """UTC midnight of a date as ns since epoch"""
+    return pd.Timestamp(day).tz_localize('UTC').value
+
+
+def _download(symbol: str, timeframe, from_date: date, to_date: date) -> np.ndarray:
+    """Download bars for [from_date, to_date) from Alpaca as a structured array"""
+    bars = data_api.get_bars(
+        symbol,
+        timeframe,
+        start=f"{from_date.isoformat()}T00:00:00Z",
+        end=f"{(to_date - timedelta(days=1)).isoformat()}T23:59:59Z",
+        feed='iex'
+    ).df
+    
+    out = np.empty(len(bars), dtype=BAR_DTYPE)
+    if bars.empty:
+        return out
+    out['t'] = bars.index.tz_convert('UTC').as_unit('ns').asi8
+    for column in ('open', 'high', 'low', 'close', 'volume'):
+        out[column] = bars[column].to_numpy(dtype='f8')
+    return out[(out['t'] >= _to_ns(from_date)) & (out['t'] < _to_ns(to_date))]
+
+
+def _merge(*arrays: np.ndarray) -> np.ndarray:
+    """Merge bar arrays sorted by time, keeping one bar per timestamp"""
+    merged = np.concatenate(arrays)
+    merged = merged[np.argsort(merged['t'], kind='stable')]
+    if len(merged) > 1:
+        # Keep the last copy of any duplicate timestamp
+        keep = np.append(merged['t'][1:] != merged['t'][:-1], True)
+        merged = merged[keep]
+    return merged
+
+
+def get_history(symbol: str, timeframe, start_date: date, end_date: date = None) -> np.ndarray:
+    """Get completed-day bars for [start_date, end_date) as a read-only structured array
+    
+    The result is a view into the memory-mapped file (no copy). Missing ranges
+    before or after what is stored are backfilled from Alpaca first. `end_date`
+    is clamped to today, since today's bars are still changing (see
+    intraday_bar_service for those).
+    """
+    today = datetime.now().date()
+    end_date = min(end_date or today, today)
+    if start_date >= end_date:
+        return np.empty(0, dtype=BAR_DTYPE)
+    
+    key = (symbol, str(timeframe))
+    with _lock_for(key):
+        entry = _load(symbol, timeframe)
+        meta = entry['meta']
+        bars = entry['bars']
+        
+        if meta is None:
+            # Nothing stored yet: one download for the whole range
+            fetched = _download(symbol, timeframe, start_date, end_date)
+            _save(symbol, timeframe, fetched, start_date, end_date)
+            print(f"   💽 Bar history: {symbol} {timeframe} stored {len(fetched)} bars ({start_date} → {end_date})")
+        else:
+            covered_from, covered_to = meta['covered_from'], meta['covered_to']
+            parts = [np.asarray(bars)]
+            if start_date < covered_from:
+                parts.insert(0, _download(symbol, timeframe, start_date, covered_from))
+                covered_from = start_date
+            if end_date > covered_to:
+                parts.append(_download(symbol, timeframe, covered_to, end_date))
+                covered_to = end_date
+            if len(parts) > 1:
+                fetched = sum(len(p) for p in parts) - len(bars)
+                _save(symbol, timeframe, _merge(*parts), covered_from, covered_to)
+                print(f"   💽 Bar history: {symbol} {timeframe} backfilled {fetched} bars")
+        
+        bars = _OPEN[key]['bars']
+    
+    lo, hi = np.searchsorted(bars['t'], [_to_ns(start_date), _to_ns(end_date)])
+    return bars[lo:hi]
+
+
+def get_history_df(symbol: str, timeframe, start_date: date, end_date: date = None) -> pd.DataFrame:
+    """Same as get_history() as a DataFrame indexed by UTC bar time (like `get_bars(...).df`)"""
+    bars = get_history(symbol, timeframe, start_date, end_date)
+    index = pd.DatetimeIndex(pd.to_datetime(bars['t'], unit='ns', utc=True), name='timestamp')
+    return pd.DataFrame(
+        {column: bars[column] for column in ('open', 'high', 'low', 'close', 'volume')},
+        index=index,
+        copy=False,
+    )
@@ -0,0 +1,87 @@
+"""Batched multi-symbol quote refresh
+
+One Alpaca snapshot request returns the latest trade, latest quote, minute bar
+and daily bar for up to SNAPSHOT_BATCH_SIZE symbols, so the whole tracked set
+refreshes in a few requests. Results are fanned out into the per-symbol
+snapshots built by fetch_stock_data.
+"""
+from config.settings import rest_api, SNAPSHOT_BATCH_SIZE
+from services.snapshot_service import get_snapshot, update_snapshot
+from services.stream_service import get_live_quote
+
+
+def _chunks(symbols: list, size: int):
+    """Split symbols into request-sized groups"""
+    for i in range(0, len(symbols), size):
+        yield symbols[i:i + size]
+
+
+def fetch_snapshots(symbols: list) -> dict:
+    """Fetch Alpaca snapshots for many symbols in as few requests as possible"""
+    snapshots = {}
+    for chunk in _chunks(symbols, SNAPSHOT_BATCH_SIZE):
+        try:
+            snapshots.update(rest_api.get_snapshots(chunk, feed='iex'))
+        except Exception as e:
+            print(f"⚠️  Snapshot batch error ({len(chunk)} symbols): {e}")
+    return snapshots
+
+
+def snapshot_to_quote(snapshot, previous: dict = None) -> dict:
+    """Convert an Alpaca snapshot into the price fields of a cached quote"""
+    previous = previous or {}
+    trade = snapshot.latest_trade
+    quote = snapshot.latest_quote
+    daily_bar = snapshot.daily_bar
+
+    price = float(trade.price) if trade and trade.price else previous.get('price', 0)
+    fields = {
+        'price': price,
+        'bid': float(quote.bid_price) if quote and quote.bid_price else 0,
+        'ask': float(quote.ask_price) if quote and quote.ask_price else 0,
+        'bidSize': int(quote.bid_size) if quote and quote.bid_size else 0,
+        'askSize': int(quote.ask_size) if quote and quote.ask_size else 0,
+        'timestamp': str(trade.timestamp) if trade and trade.timestamp else previous.get('timestamp', ''),
+    }
+
+    # Day range from the daily bar, stretched by the latest trade
+    if daily_bar and daily_bar.high and daily_bar.low:
+        fields['dayHigh'] = round(max(float(daily_bar.high), price), 2)
+        fields['dayLow'] = round(min(float(daily_bar.low), price) if price else float(daily_bar.low), 2)
+
+    # 52-week range stretched by today's range, as the stream does
+    if previous.get('week52High'):
+        high = max(fields.get('dayHigh') or price, price)
+        low = min(fields.get('dayLow') or price, price) if price else fields.get('dayLow')
+        if high:
+            fields['week52High'] = round(max(previous['week52High'], high), 2)
+        if low:
+            fields['week52Low'] = round(min(previous['week52Low'], low), 2)
+
+    return fields
+
+
+def refresh_quotes_batch(symbols: list) -> list:
+    """Refresh price fields for all symbols with batched requests
+
+    Symbols covered by a fresh streamed quote are skipped. Returns the
+    symbols that have no cached snapshot yet (they need a full
+    fetch_stock_data run before price-only updates make sense).
+    """
+    cold = [s for s in symbols if get_snapshot(s) is None]
+    # Symbols with a fresh streamed quote are already up to date
+    warm = [s for s in symbols if s not in cold and not get_live_quote(s)]
+    if not warm:
+        return cold
+
+    snapshots = fetch_snapshots(warm)
+    updated = 0
+    for symbol in warm:
+        snapshot = snapshots.get(symbol)
+        if snapshot is None:
+            continue
+        if update_snapshot(symbol, snapshot_to_quote(snapshot, get_snapshot(symbol))):
+            updated += 1
+
+    print(f"🔄 Batch refresh: {updated}/{len(warm)} quotes in {-(-len(warm) // SNAPSHOT_BATCH_SIZE)} request(s)")
+    return cold
@@ -1,7 +1,6 @@
 """Premarket crossover detection service"""
-from datetime import datetime, timedelta
-from alpaca_trade_api.rest import TimeFrame
-from config.settings import data_api
+from datetime import datetime
+from services.intraday_bar_service import get_intraday_bars
 
 
 def detect_premarket_crossovers(symbol: str, current_price: float, emas: dict) -> list:
@@ -15,13 +14,7 @@ def detect_premarket_crossovers(symbol: str, current_price: float, emas: dict) -
         print(f"   🔍 Checking premarket crossovers for: {today.strftime('%Y-%m-%d %A')}")
         
         # Get today's premarket bars (extended hours)
-        premarket_bars = data_api.get_bars(
-            symbol,
-            TimeFrame.Minute,
-            start=today.strftime("%Y-%m-%d"),
-            end=today.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        premarket_bars = get_intraday_bars(symbol)
         
         if premarket_bars.empty:
             print(f"   ❌ No bars available for {today.strftime('%Y-%m-%d')}")
@@ -1,8 +1,34 @@
-"""EMA calculation service"""
+"""EMA calculation service
+
+EMAs are kept in a small stateful engine: the last value per symbol, timeframe
+and period is seeded once from history and then advanced in O(1) per newly
+closed bar. Completed days come from the on-disk history store; hourly and
+10-minute bars that closed today are resampled from the intraday bar store, so
+a refresh only reads bars that closed since the last one. Provisional values
+(as if the current partial bar closed at the live price) are cheap enough to
+recompute on every tick.
+"""
+import threading
 import pandas as pd
 from datetime import datetime, timedelta
 from alpaca_trade_api.rest import TimeFrame
-from config.settings import data_api
+from services.bar_history_service import get_history_df
+from services.intraday_bar_service import get_intraday_bars
+from services.snapshot_service import add_evict_listener
+
+# Periods per timeframe and the prefix used for the output keys (e.g. daily_ema_20)
+EMA_TIMEFRAMES = {
+    '1Day': {'prefix': 'daily', 'periods': (20, 50), 'min_bars': 50},
+    '1Hour': {'prefix': '1h', 'periods': (34, 50), 'min_bars': 50},
+    '10Min': {'prefix': '10m', 'periods': (9, 34, 50), 'min_bars': 50},
+}
+
+# (symbol, timeframe, period) -> {'value': float, 'count': int}
+_EMA_STATE = {}
+# (symbol, timeframe) -> {'through': date, 'last_bar': Timestamp, 'count': int}
+_SERIES_STATE = {}
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
 
 
 def calculate_real_ema(prices: pd.Series, period: int) -> float:
@@ -13,31 +39,178 @@ def calculate_real_ema(prices: pd.Series, period: int) -> float:
     return float(ema.iloc[-1])
 
 
+def _lock_for(key: tuple) -> threading.Lock:
+    """One lock per symbol/timeframe so concurrent refreshes advance the state once"""
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+def _drop_symbol(symbol: str):
+    """Forget an evicted symbol's EMA state (seeded again from history on its next refresh)"""
+    for timeframe, config in EMA_TIMEFRAMES.items():
+        key = (symbol, timeframe)
+        with _LOCKS_GUARD:
+            lock = _LOCKS.pop(key, None)
+        if lock is None:
+            continue
+        with lock:
+            _SERIES_STATE.pop(key, None)
+            for period in config['periods']:
+                _EMA_STATE.pop((symbol, timeframe, period), None)
+
+
+add_evict_listener(_drop_symbol)
+
+
+def _alpha(period: int) -> float:
+    """Smoothing factor matching pandas ewm(span=period, adjust=False)"""
+    return 2.0 / (period + 1)
+
+
+def update_ema(symbol: str, timeframe: str, period: int, close: float) -> float:
+    """Advance one EMA by a newly closed bar (O(1))"""
+    state = _EMA_STATE.setdefault((symbol, timeframe, period), {'value': None, 'count': 0})
+    if state['value'] is None:
+        state['value'] = close
+    else:
+        alpha = _alpha(period)
+        state['value'] = alpha * close + (1 - alpha) * state['value']
+    state['count'] += 1
+    return state['value']
+
+
+def get_ema(symbol: str, timeframe: str, period: int) -> float:
+    """Last closed-bar EMA, or None until at least `period` bars have been seen"""
+    state = _EMA_STATE.get((symbol, timeframe, period))
+    if not state or state['count'] < period:
+        return None
+    return state['value']
+
+
+def get_provisional_ema(symbol: str, timeframe: str, period: int, price: float) -> float:
+    """EMA as if the current partial bar closed at `price` (state is not modified)"""
+    value = get_ema(symbol, timeframe, period)
+    if value is None or not price:
+        return None
+    alpha = _alpha(period)
+    return alpha * price + (1 - alpha) * value
+
+
+def get_provisional_emas(symbol: str, price: float) -> dict:
+    """Provisional EMAs for every configured timeframe/period, keyed like get_all_emas
+    
+    The live price stands in for the close of each timeframe's current partial bar.
+    """
+    emas = {}
+    for timeframe, config in EMA_TIMEFRAMES.items():
+        for period in config['periods']:
+            value = get_provisional_ema(symbol, timeframe, period, price)
+            if value is not None:
+                emas[f"{config['prefix']}_ema_{period}"] = round(value, 2)
+    return emas
+
+
+def _advance(symbol: str, timeframe: str, start_date, end_date, load_closes) -> int:
+    """Feed bars that closed since the last call into the engine
+    
+    `load_closes(from_date, to_date)` returns a close-price Series indexed by bar
+    time for [from_date, to_date). The first call seeds from `start_date`; later
+    calls only load from the last consumed date, and nothing at all until
+    `end_date` moves forward. Bars at or before the last one consumed (e.g. fed
+    by _advance_intraday) are skipped. Returns the number of bars consumed so far.
+    """
+    key = (symbol, timeframe)
+    with _lock_for(key):
+        series = _SERIES_STATE.get(key)
+        if series and series['through'] >= end_date:
+            return series['count']
+        
+        closes = load_closes(series['through'] if series else start_date, end_date)
+        last_bar = series['last_bar'] if series else None
+        if last_bar is not None and not closes.empty:
+            closes = closes[closes.index > last_bar]
+        
+        periods = EMA_TIMEFRAMES[timeframe]['periods']
+        for close in closes.values:
+            for period in periods:
+                update_ema(symbol, timeframe, period, float(close))
+        
+        count = (series['count'] if series else 0) + len(closes)
+        _SERIES_STATE[key] = {
+            'through': end_date,
+            'last_bar': closes.index[-1] if not closes.empty else last_bar,
+            'count': count,
+        }
+        if series is None:
+            print(f"   🧮 EMA engine seeded {symbol} {timeframe} from {count} bars")
+        return count
+
+
+def _advance_intraday(symbol: str, timeframe: str, rule: str) -> int:
+    """Feed today's bars of `rule` length that closed since the last one consumed
+    
+    Resampled from the intraday minute-bar store; the partial bar still forming is
+    left out (see get_provisional_emas). Returns the number of bars consumed so far.
+    """
+    minute_bars = get_intraday_bars(symbol)
+    key = (symbol, timeframe)
+    with _lock_for(key):
+        series = _SERIES_STATE.get(key)
+        if series is None:
+            return 0
+        if minute_bars.empty:
+            return series['count']
+        
+        closes = minute_bars['close'].resample(rule).last().dropna()
+        closes = closes[closes.index + pd.Timedelta(rule) <= pd.Timestamp.now(tz='UTC')]
+        if series['last_bar'] is not None:
+            closes = closes[closes.index > series['last_bar']]
+        
+        periods = EMA_TIMEFRAMES[timeframe]['periods']
+        for close in closes.values:
+            for period in periods:
+                update_ema(symbol, timeframe, period, float(close))
+        if not closes.empty:
+            series['last_bar'] = closes.index[-1]
+            series['count'] += len(closes)
+        return series['count']
+
+
+def _emas_for(symbol: str, timeframe: str) -> dict:
+    """Output dict for one timeframe (empty until enough bars were seen)"""
+    config = EMA_TIMEFRAMES[timeframe]
+    emas = {}
+    for period in config['periods']:
+        value = get_ema(symbol, timeframe, period)
+        if value is not None:
+            emas[f"{config['prefix']}_ema_{period}"] = round(value, 2)
+    return emas
+
+
+def _load_history_closes(symbol: str, timeframe):
+    """Loader for _advance that reads closes from the on-disk history store"""
+    def load(from_date, to_date) -> pd.Series:
+        return get_history_df(symbol, timeframe, from_date, to_date)['close']
+    return load
+
+
 def get_daily_emas(symbol: str) -> dict:
     """Fetch and calculate daily EMAs (20, 50)"""
     emas = {}
     try:
-        end_date = datetime.now() - timedelta(days=1)
+        end_date = datetime.now().date()  # exclusive: completed days through yesterday
         start_date = end_date - timedelta(days=365)
         
-        daily_bars = data_api.get_bars(
-            symbol, 
-            TimeFrame.Day,
-            start=start_date.strftime("%Y-%m-%d"),
-            end=end_date.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        count = _advance(symbol, '1Day', start_date, end_date, _load_history_closes(symbol, TimeFrame.Day))
         
-        if not daily_bars.empty and len(daily_bars) >= 50:
-            ema_20 = calculate_real_ema(daily_bars['close'], 20)
-            ema_50 = calculate_real_ema(daily_bars['close'], 50)
-            if ema_20: emas["daily_ema_20"] = round(ema_20, 2)
-            if ema_50: emas["daily_ema_50"] = round(ema_50, 2)
-            print(f"✅ Daily EMAs: 20=${ema_20:.2f}, 50=${ema_50:.2f} from {len(daily_bars)} bars")
+        if count >= EMA_TIMEFRAMES['1Day']['min_bars']:
+            emas = _emas_for(symbol, '1Day')
+            print(f"✅ Daily EMAs: 20=${emas.get('daily_ema_20', 0):.2f}, 50=${emas.get('daily_ema_50', 0):.2f} from {count} bars")
         else:
-            print(f"⚠️  Not enough daily data: {len(daily_bars) if not daily_bars.empty else 0} bars")
+            print(f"⚠️  Not enough daily data: {count} bars")
     except Exception as e:
         print(f"⚠️  Daily EMAs error: {e}")
+        emas = _emas_for(symbol, '1Day')
     
     return emas
 
@@ -46,70 +219,52 @@ def get_hourly_emas(symbol: str) -> dict:
     """Fetch and calculate hourly EMAs (34, 50)"""
     emas = {}
     try:
-        end_time = datetime.now() - timedelta(days=1)
-        start_time = end_time - timedelta(days=60)
+        end_date = datetime.now().date()  # exclusive: completed days through yesterday
+        start_date = end_date - timedelta(days=60)
         
-        hourly_bars = data_api.get_bars(
-            symbol,
-            TimeFrame.Hour,
-            start=start_time.strftime("%Y-%m-%d"),
-            end=end_time.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        _advance(symbol, '1Hour', start_date, end_date, _load_history_closes(symbol, TimeFrame.Hour))
+        count = _advance_intraday(symbol, '1Hour', '1h')
         
-        if not hourly_bars.empty and len(hourly_bars) >= 50:
-            ema_34 = calculate_real_ema(hourly_bars['close'], 34)
-            ema_50 = calculate_real_ema(hourly_bars['close'], 50)
-            if ema_34: emas["1h_ema_34"] = round(ema_34, 2)
-            if ema_50: emas["1h_ema_50"] = round(ema_50, 2)
-            print(f"✅ 1hr EMAs: 34=${ema_34:.2f}, 50=${ema_50:.2f} from {len(hourly_bars)} bars")
+        if count >= EMA_TIMEFRAMES['1Hour']['min_bars']:
+            emas = _emas_for(symbol, '1Hour')
+            print(f"✅ 1hr EMAs: 34=${emas.get('1h_ema_34', 0):.2f}, 50=${emas.get('1h_ema_50', 0):.2f} from {count} bars")
         else:
-            print(f"⚠️  Not enough hourly data: {len(hourly_bars) if not hourly_bars.empty else 0} bars")
+            print(f"⚠️  Not enough hourly data: {count} bars")
     except Exception as e:
         print(f"⚠️  1hr EMAs error: {e}")
+        emas = _emas_for(symbol, '1Hour')
     
     return emas
 
 
+def _load_10min_closes(symbol: str):
+    """Loader for _advance that resamples stored minute bars to 10-min bars"""
+    def load(from_date, to_date) -> pd.Series:
+        minute_bars = get_history_df(symbol, TimeFrame.Minute, from_date, to_date)
+        if minute_bars.empty:
+            return pd.Series(dtype=float)
+        return minute_bars['close'].resample('10min').last().dropna()
+    return load
+
+
 def get_10min_emas(symbol: str) -> dict:
     """Fetch and calculate 10-minute EMAs (9, 34, 50)"""
     emas = {}
     try:
-        end_time = datetime.now() - timedelta(days=1)
-        start_time = end_time - timedelta(days=14)
+        end_date = datetime.now().date()  # exclusive: completed days through yesterday
+        start_date = end_date - timedelta(days=14)
         
-        minute_bars = data_api.get_bars(
-            symbol,
-            TimeFrame.Minute,
-            start=start_time.strftime("%Y-%m-%d"),
-            end=end_time.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        _advance(symbol, '10Min', start_date, end_date, _load_10min_closes(symbol))
+        count = _advance_intraday(symbol, '10Min', '10min')
         
-        if not minute_bars.empty and len(minute_bars) >= 500:
-            # Resample to 10-min bars
-            bars_10m = minute_bars.resample('10min').agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum'
-            }).dropna()
-            
-            if len(bars_10m) >= 50:
-                ema_9 = calculate_real_ema(bars_10m['close'], 9)
-                ema_34 = calculate_real_ema(bars_10m['close'], 34)
-                ema_50 = calculate_real_ema(bars_10m['close'], 50)
-                if ema_9: emas["10m_ema_9"] = round(ema_9, 2)
-                if ema_34: emas["10m_ema_34"] = round(ema_34, 2)
-                if ema_50: emas["10m_ema_50"] = round(ema_50, 2)
-                print(f"✅ 10min EMAs: 9=${ema_9:.2f}, 34=${ema_34:.2f}, 50=${ema_50:.2f} from {len(bars_10m)} bars")
-            else:
-                print(f"⚠️  Not enough 10min bars after resample: {len(bars_10m)}")
+        if count >= EMA_TIMEFRAMES['10Min']['min_bars']:
+            emas = _emas_for(symbol, '10Min')
+            print(f"✅ 10min EMAs: 9=${emas.get('10m_ema_9', 0):.2f}, 34=${emas.get('10m_ema_34', 0):.2f}, 50=${emas.get('10m_ema_50', 0):.2f} from {count} bars")
         else:
-            print(f"⚠️  Not enough minute data: {len(minute_bars) if not minute_bars.empty else 0} bars")
+            print(f"⚠️  Not enough 10min bars: {count}")
     except Exception as e:
         print(f"⚠️  10min EMAs error: {e}")
+        emas = _emas_for(symbol, '10Min')
     
     return emas
 
@@ -134,4 +289,3 @@ def get_all_emas(symbol: str) -> dict:
         print("⚠️  No EMAs available - historical data not accessible")
     
     return all_emas
-
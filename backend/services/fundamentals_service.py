@@ -0,0 +1,78 @@
+"""Shared per-ticker fundamentals table (Yahoo Finance)
+
+P/E, market cap, sector etc. are fetched once per ticker into the `fundamentals`
+cache namespace and reused by every sector analysis, so symbols in the same
+sector share one download of their peer set. Missing tickers are fetched
+concurrently on a bounded pool. Tickers Yahoo has nothing for (or that fail)
+are remembered in `missing_fundamentals` so they don't use up the 'yahoo' budget
+on every analysis.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import yfinance as yf
+from config.settings import FUNDAMENTALS_MAX_WORKERS
+from utils.cache import get_cache
+from utils.upstream_budget import BudgetTimeout, acquire, run_in_context, throttled
+
+_TABLE = get_cache('fundamentals')
+_MISSING = get_cache('missing_fundamentals')  # tickers with no Yahoo data, not retried until expiry
+_EXECUTOR = ThreadPoolExecutor(max_workers=FUNDAMENTALS_MAX_WORKERS, thread_name_prefix="fundamentals")
+
+
+def _download(symbol: str) -> dict:
+    """Fundamentals for one ticker from Yahoo Finance (None if Yahoo has nothing)"""
+    acquire('yahoo')
+    try:
+        info = yf.Ticker(symbol).info
+    except Exception as e:
+        if 'RateLimit' in type(e).__name__:
+            throttled('yahoo')
+        raise
+    if not info:
+        return None
+    return {
+        'pe_ratio': info.get('trailingPE') or info.get('forwardPE'),
+        'peg_ratio': info.get('pegRatio'),
+        'pb_ratio': info.get('priceToBook'),
+        'price_to_sales': info.get('priceToSalesTrailing12Months'),
+        'market_cap': info.get('marketCap'),
+        'sector': info.get('sector'),
+        'industry': info.get('industry'),
+        'beta': info.get('beta'),
+        'dividend_yield': info.get('dividendYield')
+    }
+
+
+def get_fundamentals(symbol: str) -> dict:
+    """Fundamentals for one ticker from the shared table (fetched on a miss)"""
+    if symbol in _MISSING:
+        return {}
+    try:
+        data = _TABLE.get_or_load(symbol, lambda: _download(symbol))
+    except BudgetTimeout as e:
+        # Nothing was asked of Yahoo, so there is nothing to remember
+        print(f"   ⚠️  Error fetching fundamentals for {symbol}: {e}")
+        return {}
+    except Exception as e:
+        print(f"   ⚠️  Error fetching fundamentals for {symbol}: {e}")
+        data = None
+    if data is None:
+        _MISSING.set(symbol, True)
+        return {}
+    return data
+
+
+def get_fundamentals_many(symbols: list) -> dict:
+    """symbol -> fundamentals for many tickers, fetching the missing ones concurrently"""
+    return dict(zip(symbols, _EXECUTOR.map(run_in_context(get_fundamentals), symbols)))
+
+
+def lowest_pe(symbols: list, min_market_cap: float = 0, count: int = 5) -> list:
+    """Tickers with the lowest positive P/E among those above `min_market_cap`"""
+    table = get_fundamentals_many(symbols)
+    ranked = [
+        {'symbol': symbol, 'pe_ratio': data['pe_ratio'], 'market_cap': data['market_cap']}
+        for symbol, data in table.items()
+        if data.get('pe_ratio') and data['pe_ratio'] > 0 and (data.get('market_cap') or 0) >= min_market_cap
+    ]
+    ranked.sort(key=lambda x: x['pe_ratio'])
+    return ranked[:count]
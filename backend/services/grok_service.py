@@ -1,12 +1,107 @@
-"""Grok AI service for news analysis"""
-import requests
+"""Grok AI service for news analysis
+
+Analyses are cached by a fingerprint of the prompt inputs (symbol, the articles
+in the prompt, sector context), so an unchanged news set is answered from the
+cache without calling the API again.
+"""
+import hashlib
 import os
 import json
-from config.settings import CACHE
+from config.settings import GROK_API_BASE
+from utils import http_client
+from utils.cache import get_cache
+from utils.singleflight import single_flight
+
+_GROK_CACHE = get_cache('grok')
+_PROMPT_VERSION = 1  # bump when the prompts change so cached analyses are not reused
+
+_UNAVAILABLE = {
+    'summary': 'Analysis unavailable',
+    'sentiment': 'neutral',
+    'key_points': [],
+    'trading_signals': [],
+    'confidence': 'low'
+}
+
+
+def _article_key(article: dict) -> str:
+    """Stable identity of an article (Polygon id, else normalized title)"""
+    return article.get('id') or ' '.join(article.get('title', '').lower().split())
+
+
+def news_fingerprint(symbol: str, news_articles: list, top_news: list, sector: str = None, sector_weight: float = None) -> str:
+    """Hash of the normalized prompt inputs; equal fingerprints get the same analysis
+    
+    The sector weightage is left out: it is estimated from prices, and a new LLM
+    call should only follow new headlines.
+    """
+    inputs = {
+        'version': _PROMPT_VERSION,
+        'symbol': symbol.upper(),
+        # Only the articles that make it into the prompt
+        'top': sorted(_article_key(a) for a in top_news[:5]),
+        'news': sorted(_article_key(a) for a in news_articles[:10]),
+        'sector': sector,
+    }
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+def cached_analysis(fingerprint: str) -> dict:
+    """Stored analysis for a news fingerprint, or None"""
+    return _GROK_CACHE.get(fingerprint)
+
+
+def _build_prompt(symbol: str, news_articles: list, top_news: list, sector: str = None, sector_weight: float = None) -> str:
+    """Analysis prompt for a news set (shared by the pipeline and the stream, so they share fingerprints)"""
+    # Prepare news text for Grok
+    news_text = ""
+    
+    if top_news:
+        news_text += "TOP NEWS (Analyst Ratings/Upgrades):\n"
+        for i, article in enumerate(top_news[:5], 1):
+            news_text += f"{i}. {article.get('title', '')}\n"
+            if article.get('description'):
+                news_text += f"   {article.get('description', '')[:100]}...\n"
+        news_text += "\n"
+    
+    if news_articles:
+        news_text += "RECENT NEWS:\n"
+        for i, article in enumerate(news_articles[:10], 1):
+            news_text += f"{i}. {article.get('title', '')}\n"
+    
+    # Build sector context
+    sector_context = ""
+    if sector:
+        sector_context = f"\n\nStock Context:\n- Sector: {sector}"
+        if sector_weight:
+            sector_context += f"\n- Weightage in {sector} sector: {sector_weight:.2f}%"
+    
+    # Create prompt for Grok
+    return f"""Analyze these news articles about {symbol} stock and provide:
+
+1. Overall Sentiment (bullish/bearish/neutral)
+2. Summary (2-3 sentences)
+3. Key Points (3-5 bullet points)
+4. Trading Signals (buy/sell/hold with reasoning)
+{sector_context}
+
+News Articles:
+{news_text}
+
+Consider the stock's sector and market position in your analysis. Respond in JSON format:
+{{
+  "sentiment": "bullish/bearish/neutral",
+  "summary": "brief summary",
+  "key_points": ["point 1", "point 2", "point 3"],
+  "trading_signals": ["signal 1", "signal 2"],
+  "confidence": "high/medium/low"
+}}"""
 
 
-def analyze_news_with_grok(symbol: str, news_articles: list, top_news: list) -> dict:
-    """Use Grok to analyze news and provide trading insights"""
+@single_flight('grok', key=lambda *args, **kwargs: news_fingerprint(*args, **kwargs))
+def analyze_news_with_grok(symbol: str, news_articles: list, top_news: list, sector: str = None,
+                           sector_weight: float = None) -> dict:
+    """Use Grok to analyze news and provide trading insights (None if the API call failed)"""
     
     # Get Grok API key from environment
     grok_api_key = os.getenv("GROK_API_KEY", "")
@@ -29,42 +124,8 @@ def analyze_news_with_grok(symbol: str, news_articles: list, top_news: list) ->
         }
     
     try:
-        # Prepare news text for Grok
-        news_text = ""
-        
-        if top_news:
-            news_text += "TOP NEWS (Analyst Ratings/Upgrades):\n"
-            for i, article in enumerate(top_news[:5], 1):
-                news_text += f"{i}. {article.get('title', '')}\n"
-                if article.get('description'):
-                    news_text += f"   {article.get('description', '')[:100]}...\n"
-            news_text += "\n"
+        prompt = _build_prompt(symbol, news_articles, top_news, sector, sector_weight)
         
-        if news_articles:
-            news_text += "RECENT NEWS:\n"
-            for i, article in enumerate(news_articles[:10], 1):
-                news_text += f"{i}. {article.get('title', '')}\n"
-        
-        # Create prompt for Grok
-        prompt = f"""Analyze these news articles about {symbol} stock and provide:
-
-1. Overall Sentiment (bullish/bearish/neutral)
-2. Summary (2-3 sentences)
-3. Key Points (3-5 bullet points)
-4. Trading Signals (buy/sell/hold with reasoning)
-
-News Articles:
-{news_text}
-
-Respond in JSON format:
-{{
-  "sentiment": "bullish/bearish/neutral",
-  "summary": "brief summary",
-  "key_points": ["point 1", "point 2", "point 3"],
-  "trading_signals": ["signal 1", "signal 2"],
-  "confidence": "high/medium/low"
-}}"""
-
         # Call Grok API (xAI API endpoint)
         headers = {
             "Authorization": f"Bearer {grok_api_key}",
@@ -87,8 +148,10 @@ Respond in JSON format:
             "max_tokens": 500
         }
         
-        response = requests.post(
-            "https://api.x.ai/v1/chat/completions",
+        response = http_client.request_sync(
+            "POST",
+            f"{GROK_API_BASE}/chat/completions",
+            provider='xai',
             headers=headers,
             json=payload,
             timeout=30
@@ -133,17 +196,11 @@ Respond in JSON format:
     except Exception as e:
         print(f"   ⚠️  Grok analysis error: {e}")
     
-    return {
-        'summary': 'Analysis unavailable',
-        'sentiment': 'neutral',
-        'key_points': [],
-        'trading_signals': [],
-        'confidence': 'low'
-    }
+    return None
 
 
-def stream_grok_analysis(symbol: str, news_articles: list, top_news: list, sector: str = None, sector_weight: float = None):
-    """Stream Grok analysis in real-time (generator for SSE)"""
+async def stream_grok_analysis(symbol: str, news_articles: list, top_news: list, sector: str = None, sector_weight: float = None):
+    """Stream Grok analysis in real-time (async generator for SSE, no worker thread)"""
     
     # Get Grok API key from environment
     grok_api_key = os.getenv("GROK_API_KEY", "")
@@ -156,51 +213,16 @@ def stream_grok_analysis(symbol: str, news_articles: list, top_news: list, secto
         yield f"data: {json.dumps({'error': 'No news available for analysis'})}\n\n"
         return
     
+    # Same news set and context as a previous analysis: no API call
+    fingerprint = news_fingerprint(symbol, news_articles, top_news, sector, sector_weight)
+    cached = cached_analysis(fingerprint)
+    if cached is not None:
+        yield f"data: {json.dumps({'type': 'complete', 'analysis': cached, 'cached': True})}\n\n"
+        return
+    
     try:
-        # Prepare news text for Grok
-        news_text = ""
-        
-        if top_news:
-            news_text += "TOP NEWS (Analyst Ratings/Upgrades):\n"
-            for i, article in enumerate(top_news[:5], 1):
-                news_text += f"{i}. {article.get('title', '')}\n"
-                if article.get('description'):
-                    news_text += f"   {article.get('description', '')[:100]}...\n"
-            news_text += "\n"
-        
-        if news_articles:
-            news_text += "RECENT NEWS:\n"
-            for i, article in enumerate(news_articles[:10], 1):
-                news_text += f"{i}. {article.get('title', '')}\n"
+        prompt = _build_prompt(symbol, news_articles, top_news, sector, sector_weight)
         
-        # Build sector context
-        sector_context = ""
-        if sector:
-            sector_context = f"\n\nStock Context:\n- Sector: {sector}"
-            if sector_weight:
-                sector_context += f"\n- Weightage in {sector} sector: {sector_weight:.2f}%"
-        
-        # Create prompt for Grok
-        prompt = f"""Analyze these news articles about {symbol} stock and provide:
-
-1. Overall Sentiment (bullish/bearish/neutral)
-2. Summary (2-3 sentences)
-3. Key Points (3-5 bullet points)
-4. Trading Signals (buy/sell/hold with reasoning)
-{sector_context}
-
-News Articles:
-{news_text}
-
-Consider the stock's sector and market position in your analysis. Respond in JSON format:
-{{
-  "sentiment": "bullish/bearish/neutral",
-  "summary": "brief summary",
-  "key_points": ["point 1", "point 2", "point 3"],
-  "trading_signals": ["signal 1", "signal 2"],
-  "confidence": "high/medium/low"
-}}"""
-
         # Call Grok API with streaming enabled
         headers = {
             "Authorization": f"Bearer {grok_api_key}",
@@ -224,103 +246,81 @@ Consider the stock's sector and market position in your analysis. Respond in JSO
             "stream": True
         }
         
-        response = requests.post(
-            "https://api.x.ai/v1/chat/completions",
+        async with http_client.stream(
+            "POST",
+            f"{GROK_API_BASE}/chat/completions",
+            provider='xai',
             headers=headers,
             json=payload,
-            timeout=60,
-            stream=True
-        )
-        
-        if response.status_code == 200:
+            timeout=60
+        ) as response:
+            if response.status_code != 200:
+                yield f"data: {json.dumps({'error': f'Grok API HTTP {response.status_code}'})}\n\n"
+                return
+            
             full_content = ""
             
             # Stream the response
-            for line in response.iter_lines():
-                if line:
-                    line_text = line.decode('utf-8')
+            async for line_text in response.aiter_lines():
+                if line_text.startswith('data: '):
+                    data_str = line_text[6:]  # Remove 'data: ' prefix
                     
-                    if line_text.startswith('data: '):
-                        data_str = line_text[6:]  # Remove 'data: ' prefix
-                        
-                        if data_str == '[DONE]':
-                            break
+                    if data_str == '[DONE]':
+                        break
+                    
+                    try:
+                        chunk_data = json.loads(data_str)
                         
-                        try:
-                            chunk_data = json.loads(data_str)
+                        if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
+                            delta = chunk_data['choices'][0].get('delta', {})
+                            content = delta.get('content', '')
                             
-                            if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
-                                delta = chunk_data['choices'][0].get('delta', {})
-                                content = delta.get('content', '')
-                                
-                                if content:
-                                    full_content += content
-                                    # Send chunk to frontend
-                                    yield f"data: {json.dumps({'chunk': content, 'type': 'content'})}\n\n"
-                        
-                        except json.JSONDecodeError:
-                            continue
-            
-            # After streaming completes, parse the full JSON response
-            try:
-                # Strip markdown code blocks if present
-                parsed_content = full_content
-                if '```json' in parsed_content:
-                    parsed_content = parsed_content.split('```json')[1].split('```')[0].strip()
-                elif '```' in parsed_content:
-                    parsed_content = parsed_content.split('```')[1].split('```')[0].strip()
-                
-                analysis = json.loads(parsed_content)
-                
-                # Send final parsed analysis
-                yield f"data: {json.dumps({'type': 'complete', 'analysis': analysis})}\n\n"
-                
-                # Cache the analysis
-                from datetime import datetime
-                cache_key = f"{symbol}_grok_analysis"
-                CACHE[cache_key] = {
-                    'analysis': analysis,
-                    'timestamp': datetime.now()
-                }
-                
-            except json.JSONDecodeError as e:
-                # If parsing fails, send the raw content
-                yield f"data: {json.dumps({'type': 'complete', 'analysis': {'summary': full_content[:200], 'sentiment': 'neutral', 'key_points': [], 'trading_signals': [], 'confidence': 'low'}})}\n\n"
+                            if content:
+                                full_content += content
+                                # Send chunk to frontend
+                                yield f"data: {json.dumps({'chunk': content, 'type': 'content'})}\n\n"
+                    
+                    except json.JSONDecodeError:
+                        continue
         
-        else:
-            error_msg = f"Grok API HTTP {response.status_code}"
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
+        # After streaming completes, parse the full JSON response
+        try:
+            # Strip markdown code blocks if present
+            parsed_content = full_content
+            if '```json' in parsed_content:
+                parsed_content = parsed_content.split('```json')[1].split('```')[0].strip()
+            elif '```' in parsed_content:
+                parsed_content = parsed_content.split('```')[1].split('```')[0].strip()
+            
+            analysis = json.loads(parsed_content)
+            
+            # Send final parsed analysis
+            yield f"data: {json.dumps({'type': 'complete', 'analysis': analysis})}\n\n"
+            
+            # Cache the analysis for this news set
+            _GROK_CACHE.set(fingerprint, analysis)
+            
+        except json.JSONDecodeError as e:
+            # If parsing fails, send the raw content
+            yield f"data: {json.dumps({'type': 'complete', 'analysis': {'summary': full_content[:200], 'sentiment': 'neutral', 'key_points': [], 'trading_signals': [], 'confidence': 'low'}})}\n\n"
     
     except Exception as e:
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 
-def get_cached_grok_analysis(symbol: str, news_data: dict) -> dict:
-    """Get Grok analysis from cache or generate new one"""
-    
-    # Check if we have recent Grok analysis in cache
-    cache_key = f"{symbol}_grok_analysis"
-    
-    if cache_key in CACHE:
-        cached = CACHE[cache_key]
-        # Return cached analysis if less than 30 minutes old
-        from datetime import datetime
-        if (datetime.now() - cached.get('timestamp', datetime.min)).total_seconds() < 1800:
-            print(f"   🤖 Using cached Grok analysis")
-            return cached.get('analysis', {})
+def get_cached_grok_analysis(symbol: str, news_data: dict, sector: str = None, sector_weight: float = None) -> dict:
+    """Get Grok analysis for this news set and sector context from cache (any age) or generate a new one
     
-    # Generate new analysis
+    Same inputs as /api/grok/stream, so the pipeline and the stream share one analysis.
+    """
     top_news = news_data.get('top_news', [])
     regular_news = news_data.get('regular_news', [])
     
-    analysis = analyze_news_with_grok(symbol, regular_news, top_news)
+    if not os.getenv("GROK_API_KEY", "") or not (top_news or regular_news):
+        # Placeholder answers are not cached
+        return analyze_news_with_grok(symbol, regular_news, top_news)
     
-    # Cache the analysis
-    from datetime import datetime
-    CACHE[cache_key] = {
-        'analysis': analysis,
-        'timestamp': datetime.now()
-    }
-    
-    return analysis
-
+    fingerprint = news_fingerprint(symbol, regular_news, top_news, sector, sector_weight)
+    analysis = _GROK_CACHE.get_or_load(
+        fingerprint, lambda: analyze_news_with_grok(symbol, regular_news, top_news, sector, sector_weight))
+    return analysis or dict(_UNAVAILABLE)
@@ -0,0 +1,128 @@
+"""Grok analysis stream fan-out (/api/grok/stream)
+
+The first client to open a stream for a symbol and news set starts the one
+upstream completion; every later client joins it, first getting the SSE events
+already buffered replayed and then the live ones. Streams are keyed by news
+fingerprint, so everyone watching the same headlines shares one LLM call. Once
+a stream completes its analysis is in the Grok cache and new clients get it
+from there.
+
+Clients that disconnect leave the stream (checked every GROK_DISCONNECT_POLL
+seconds); when the last one leaves an unfinished stream, the upstream request
+is cancelled so no more tokens are generated for nobody.
+"""
+import asyncio
+from config.settings import GROK_DISCONNECT_POLL
+from services.grok_service import cached_analysis, news_fingerprint, stream_grok_analysis
+
+_BROADCASTS = {}  # news fingerprint -> _Broadcast
+
+
+class _Broadcast:
+    """One upstream stream and the SSE events it has produced so far"""
+
+    def __init__(self, key: str, symbol: str):
+        self.key = key
+        self.symbol = symbol
+        self.events = []
+        self.done = False
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task = None
+    
+    async def _publish(self, event: str = None, done: bool = False):
+        async with self.changed:
+            if event is not None:
+                self.events.append(event)
+            self.done = self.done or done
+            self.changed.notify_all()
+    
+    async def run(self, upstream):
+        """Buffer every event of the upstream generator and wake subscribers"""
+        try:
+            async for event in upstream:
+                await self._publish(event)
+        finally:
+            # Closes the upstream HTTP stream if we were cancelled mid-stream
+            await upstream.aclose()
+            _drop(self)
+            await self._publish(done=True)
+    
+    async def events_from(self, position: int) -> list:
+        """Events after `position`, waiting for new ones (empty once the stream is done)"""
+        async with self.changed:
+            await self.changed.wait_for(lambda: len(self.events) > position or self.done)
+            return self.events[position:]
+
+
+def _drop(broadcast: _Broadcast):
+    """Stop handing out a broadcast to new clients (they are served from the Grok cache)"""
+    if _BROADCASTS.get(broadcast.key) is broadcast:
+        del _BROADCASTS[broadcast.key]
+
+
+def _get_broadcast(key: str, symbol: str, upstream_args: tuple) -> _Broadcast:
+    """Running broadcast for a fingerprint, starting the upstream stream if there is none"""
+    broadcast = _BROADCASTS.get(key)
+    if broadcast is None:
+        broadcast = _Broadcast(key, symbol)
+        _BROADCASTS[key] = broadcast
+        broadcast.task = asyncio.create_task(broadcast.run(stream_grok_analysis(*upstream_args)))
+        print(f"🤖 Grok stream started for {symbol}")
+    return broadcast
+
+
+def _leave(broadcast: _Broadcast):
+    """Remove a subscriber; cancel the upstream stream if it was the last one"""
+    broadcast.subscribers -= 1
+    if broadcast.subscribers == 0 and not broadcast.task.done():
+        _drop(broadcast)
+        broadcast.task.cancel()
+        print(f"🤖 Grok stream for {broadcast.symbol} cancelled (no clients left)")
+
+
+async def subscribe_grok_stream(symbol: str, news_articles: list, top_news: list, sector: str = None,
+                                sector_weight: float = None, is_disconnected=None):
+    """SSE events of the shared Grok stream for this symbol and news set (async generator)
+    
+    `is_disconnected` (e.g. `request.is_disconnected`) is awaited while waiting
+    for events and at most every GROK_DISCONNECT_POLL seconds between them; the
+    generator ends as soon as it returns True.
+    """
+    key = news_fingerprint(symbol, news_articles, top_news, sector, sector_weight)
+    if key not in _BROADCASTS and cached_analysis(key) is not None:
+        # Already analysed: a single 'complete' event from the cache
+        async for event in stream_grok_analysis(symbol, news_articles, top_news, sector, sector_weight):
+            yield event
+        return
+    
+    broadcast = _get_broadcast(key, symbol, (symbol, news_articles, top_news, sector, sector_weight))
+    broadcast.subscribers += 1
+    loop = asyncio.get_running_loop()
+    next_check = loop.time() + GROK_DISCONNECT_POLL
+    position = 0
+    try:
+        while True:
+            try:
+                events = await asyncio.wait_for(broadcast.events_from(position), GROK_DISCONNECT_POLL)
+            except asyncio.TimeoutError:
+                events = None
+            if events == []:
+                return  # stream finished
+            if is_disconnected and (events is None or loop.time() >= next_check):
+                next_check = loop.time() + GROK_DISCONNECT_POLL
+                if await is_disconnected():
+                    return
+            for event in events or ():
+                yield event
+            position += len(events or ())
+    finally:
+        _leave(broadcast)
+
+
+def stream_stats() -> dict:
+    """Running upstream streams with their subscriber and buffered event counts"""
+    return {
+        key: {'symbol': b.symbol, 'subscribers': b.subscribers, 'events': len(b.events)}
+        for key, b in list(_BROADCASTS.items())
+    }
@@ -0,0 +1,47 @@
+"""Per-symbol client interest for the demand-driven refresh scheduler
+
+Quote requests and search clicks add to a symbol's interest score, which halves
+every INTEREST_HALF_LIFE seconds; every live /ws/quotes subscriber adds a
+constant amount for as long as it stays subscribed. Symbols whose interest falls
+below INTEREST_MIN are dropped and no longer refreshed. Only symbols in the asset
+index count, so made-up symbols never turn into refresh work.
+
+Called on the event loop only (no locking).
+"""
+import math
+import time
+from config.settings import INTEREST_HALF_LIFE, INTEREST_WEIGHTS, INTEREST_MIN
+from services.push_service import subscriber_counts
+from services.search_service import is_listed
+
+_SCORES = {}  # symbol -> (score, monotonic time of the score)
+_DECAY = math.log(2) / INTEREST_HALF_LIFE
+
+
+def _decayed(symbol: str, now: float) -> float:
+    score, updated_at = _SCORES.get(symbol, (0.0, now))
+    return score * math.exp(-_DECAY * (now - updated_at))
+
+
+def record_interest(symbol: str, kind: str = 'quote'):
+    """Count one quote request / search click ('quote' or 'search_click') for a symbol"""
+    now = time.monotonic()
+    symbol = symbol.upper()
+    _SCORES[symbol] = (_decayed(symbol, now) + INTEREST_WEIGHTS[kind], now)
+
+
+def interest_scores() -> dict:
+    """symbol -> current interest for every symbol at or above INTEREST_MIN"""
+    now = time.monotonic()
+    scores = {}
+    for symbol in list(_SCORES):
+        score = _decayed(symbol, now)
+        if score < INTEREST_MIN:
+            del _SCORES[symbol]  # forgotten until someone asks for it again
+        else:
+            scores[symbol] = score
+    for symbol, count in subscriber_counts().items():
+        if not is_listed(symbol):
+            continue
+        scores[symbol] = scores.get(symbol, 0.0) + count * INTEREST_WEIGHTS['subscriber']
+    return {s: round(v, 3) for s, v in scores.items() if v >= INTEREST_MIN}
@@ -0,0 +1,162 @@
+"""Shared intraday bar store
+
+Keeps one minute-bar DataFrame per symbol/timeframe and only pulls bars newer
+than its high-water mark from Alpaca. Day range, 52-week range, premarket levels
+and crossovers all read today's bars from here, so a refresh downloads them once.
+Completed days live in the on-disk store (bar_history_service).
+
+Bars from the market data stream are queued without taking the entry lock
+(they arrive on the event loop, and a reader may hold the lock for a whole
+REST download) and merged into the entry by its next read.
+"""
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+import pandas as pd
+from alpaca_trade_api.rest import TimeFrame
+from config.settings import data_api, INTRADAY_MIN_REFRESH, INTRADAY_MAX_DAYS_BACK
+from utils.cache import get_cache
+
+# (symbol, timeframe) -> {'start': date, 'bars': DataFrame, 'rest_hwm': last bar from REST,
+#                         'checked_at': monotonic seconds}
+# Size-bounded: the least recently read symbols are dropped and reloaded on demand
+_STORE = get_cache('intraday_bars')
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+_PENDING = {}  # (symbol, timeframe) -> deque of (timestamp, bar) from the stream, not merged yet
+
+
+def _lock_for(key: tuple) -> threading.Lock:
+    """One lock per store entry so concurrent readers share a single download"""
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+
+def _on_evict(key: tuple):
+    """Forget the queue and lock of an entry dropped from the store (a reader holding the lock keeps it)"""
+    _PENDING.pop(key, None)
+    with _LOCKS_GUARD:
+        lock = _LOCKS.get(key)
+        if lock is not None and not lock.locked():
+            del _LOCKS[key]
+
+
+_STORE.on_evict = _on_evict
+
+
+def _utc_midnight(day: date) -> pd.Timestamp:
+    """Date boundary as Alpaca interprets a plain YYYY-MM-DD start/end"""
+    return pd.Timestamp(day).tz_localize('UTC')
+
+
+def _download(symbol: str, timeframe, start: str, end: str = None) -> pd.DataFrame:
+    """Download bars from Alpaca (end defaults to now)"""
+    kwargs = {'start': start, 'feed': 'iex'}
+    if end:
+        kwargs['end'] = end
+    return data_api.get_bars(symbol, timeframe, **kwargs).df
+
+
+def _merge(*frames: pd.DataFrame) -> pd.DataFrame:
+    """Concatenate bar frames keeping the newest copy of any duplicate timestamp"""
+    frames = [f for f in frames if f is not None and not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    merged = pd.concat(frames)
+    return merged[~merged.index.duplicated(keep='last')].sort_index()
+
+
+def _merge_pending(key: tuple, entry: dict):
+    """Merge queued stream bars into an entry (caller holds the entry lock)"""
+    pending = _PENDING.get(key)
+    rows = []
+    while pending:
+        rows.append(pending.popleft())
+    if entry is None or not rows:
+        return
+    index = pd.DatetimeIndex([timestamp for timestamp, _ in rows], name='timestamp')
+    entry['bars'] = _merge(entry['bars'], pd.DataFrame([bar for _, bar in rows], index=index))
+
+
+def _refresh(symbol: str, timeframe, entry: dict, start_date: date) -> dict:
+    """Bring an entry up to date, downloading only what is missing"""
+    bars = entry['bars'] if entry else pd.DataFrame()
+
+    if entry is None or (entry['rest_hwm'] is None and time.monotonic() - entry['checked_at'] >= INTRADAY_MIN_REFRESH):
+        # Cold entry (or nothing traded yet): download the whole window
+        fetched = _download(symbol, timeframe, start_date.strftime("%Y-%m-%d"))
+        print(f"   📦 Bar store: {symbol} cold load, {len(fetched)} bars since {start_date}")
+        return {
+            'start': start_date,
+            'bars': _merge(bars, fetched),
+            'rest_hwm': fetched.index[-1] if not fetched.empty else None,
+            'checked_at': time.monotonic(),
+        }
+
+    if bars.empty or entry['rest_hwm'] is None:
+        return entry
+
+    if start_date < entry['start']:
+        # Wider window requested: backfill only the missing head
+        head = _download(symbol, timeframe, start_date.strftime("%Y-%m-%d"),
+                         (bars.index[0] - pd.Timedelta(minutes=1)).isoformat())
+        bars = _merge(head, bars)
+        entry['start'] = start_date
+        print(f"   📦 Bar store: {symbol} backfilled {len(head)} bars since {start_date}")
+
+    if time.monotonic() - entry['checked_at'] >= INTRADAY_MIN_REFRESH:
+        # Pull only bars newer than the high-water mark. Streamed bars may already be
+        # past it, but REST re-covers from its own mark so stream gaps get filled.
+        tail = _download(symbol, timeframe, (entry['rest_hwm'] + pd.Timedelta(minutes=1)).isoformat())
+        if not tail.empty:
+            bars = _merge(bars, tail)
+            entry['rest_hwm'] = tail.index[-1]
+        entry['checked_at'] = time.monotonic()
+
+    # Drop days nobody reads anymore
+    oldest = (datetime.now() - timedelta(days=INTRADAY_MAX_DAYS_BACK)).date()
+    if entry['start'] < oldest:
+        bars = bars[bars.index >= _utc_midnight(oldest)]
+        entry['start'] = oldest
+        if bars.empty:
+            entry['rest_hwm'] = None
+
+    entry['bars'] = bars
+    return entry
+
+
+def get_intraday_bars(symbol: str, start_date: date = None, end_date: date = None,
+                      timeframe=TimeFrame.Minute) -> pd.DataFrame:
+    """Get bars for [start_date, end_date) from the shared store (default: today's bars)"""
+    start_date = start_date or datetime.now().date()
+    key = (symbol, str(timeframe))
+
+    with _lock_for(key):
+        entry = _STORE.get(key)
+        # Streamed bars first, so bars re-covered by REST replace them
+        _merge_pending(key, entry)
+        entry = _refresh(symbol, timeframe, entry, start_date)
+        _STORE.set(key, entry)
+        bars = entry['bars']
+
+    if bars.empty:
+        return bars
+
+    bars = bars[bars.index >= _utc_midnight(start_date)]
+    if end_date:
+        bars = bars[bars.index < _utc_midnight(end_date)]
+    return bars
+
+
+def append_stream_bar(symbol: str, timestamp: str, bar: dict, timeframe=TimeFrame.Minute):
+    """Queue a bar received from the market data stream for an existing entry
+
+    Called on the event loop, so it never waits for the entry lock; the bar is
+    merged by the next get_intraday_bars(). Symbols nobody has read yet are
+    ignored; their first read does a REST load.
+    """
+    key = (symbol, str(timeframe))
+    if key not in _STORE:
+        return
+    _PENDING.setdefault(key, deque()).append((pd.Timestamp(timestamp), bar))
@@ -0,0 +1,219 @@
+"""US equity market calendar and trading sessions
+
+Every moment is in one session: 'premarket' (4:00-9:30 ET), 'regular',
+'afterhours' (until 20:00 ET, 17:00 on early-close days) or 'closed'
+(overnight, weekends and holidays). Trading days and their open/close times
+come from Alpaca's calendar (MARKET_CALENDAR_DAYS ahead, reloaded every
+MARKET_CALENDAR_REFRESH seconds); Alpaca's clock is checked every
+MARKET_CLOCK_REFRESH seconds and wins over the calendar while it is current, so
+an unscheduled closure is picked up too. Until the calendar loads, or when
+Alpaca is unreachable, a local table of NYSE holidays and early closes is used.
+
+The schedulers use this to change cadence by session and to skip work whose
+inputs cannot change (nothing trades while the market is closed).
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from config.settings import rest_api, MARKET_CALENDAR_DAYS, MARKET_CALENDAR_REFRESH, MARKET_CLOCK_REFRESH
+
+ET = ZoneInfo('America/New_York')
+
+# Fallback when Alpaca's calendar is not available (NYSE published schedule)
+_HOLIDAYS = {
+    date(2025, 1, 1), date(2025, 1, 9), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18),
+    date(2025, 5, 26), date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27),
+    date(2025, 12, 25),
+    date(2026, 1, 1), date(2026, 1, 19), date(2026, 2, 16), date(2026, 4, 3), date(2026, 5, 25),
+    date(2026, 6, 19), date(2026, 7, 3), date(2026, 9, 7), date(2026, 11, 26), date(2026, 12, 25),
+    date(2027, 1, 1), date(2027, 1, 18), date(2027, 2, 15), date(2027, 3, 26), date(2027, 5, 31),
+    date(2027, 6, 18), date(2027, 7, 5), date(2027, 9, 6), date(2027, 11, 25), date(2027, 12, 24),
+}
+_EARLY_CLOSES = {  # 13:00 close, after-hours until 17:00
+    date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24),
+    date(2026, 11, 27), date(2026, 12, 24),
+    date(2027, 11, 26),
+}
+_FALLBACK_LAST_YEAR = 2027
+
+# 'days': trading date -> {'session_open', 'open', 'close', 'session_close'} (ET datetimes)
+# for the dates in 'first'..'last' (dates in that range without an entry are closed)
+_state = {'days': {}, 'first': None, 'last': None, 'loaded_at': 0, 'clock': None, 'session': None}
+
+
+def _at(day: date, hhmm: str) -> datetime:
+    """ET datetime of 'HH:MM' / 'HHMM' on `day`"""
+    hhmm = hhmm.replace(':', '')
+    return datetime(day.year, day.month, day.day, int(hhmm[:2]), int(hhmm[2:4]), tzinfo=ET)
+
+
+def _fallback_day(day: date) -> dict:
+    """Trading hours for `day` from the local holiday table (None if closed)"""
+    if day.weekday() >= 5 or day in _HOLIDAYS:
+        return None
+    early = day in _EARLY_CLOSES
+    return {
+        'session_open': _at(day, '04:00'),
+        'open': _at(day, '09:30'),
+        'close': _at(day, '13:00' if early else '16:00'),
+        'session_close': _at(day, '17:00' if early else '20:00'),
+    }
+
+
+def _trading_day(day: date) -> dict:
+    """Trading hours for `day` (None if the market is closed all day)"""
+    if _state['first'] and _state['first'] <= day <= _state['last']:
+        return _state['days'].get(day)
+    return _fallback_day(day)
+
+
+def load_calendar():
+    """Load Alpaca's trading calendar from a week back to MARKET_CALENDAR_DAYS ahead"""
+    today = datetime.now(ET).date()
+    first, last = today - timedelta(days=7), today + timedelta(days=MARKET_CALENDAR_DAYS)
+    days = {}
+    for entry in rest_api.get_calendar(start=first.isoformat(), end=last.isoformat()):
+        raw = entry._raw
+        day = date.fromisoformat(raw['date'])
+        days[day] = {
+            'session_open': _at(day, raw.get('session_open') or '0400'),
+            'open': _at(day, raw['open']),
+            'close': _at(day, raw['close']),
+            'session_close': _at(day, raw.get('session_close') or '2000'),
+        }
+    _state.update(days=days, first=first, last=last, loaded_at=time.time())
+    print(f"📅 Market calendar: {len(days)} trading days through {last}")
+
+
+def load_clock():
+    """Current open/closed state from Alpaca's clock (valid until its next open/close)"""
+    clock = rest_api.get_clock()
+    next_change = clock.next_close if clock.is_open else clock.next_open
+    _state['clock'] = {
+        'is_open': bool(clock.is_open),
+        'valid_until': min(next_change.to_pydatetime().astimezone(ET),
+                           datetime.now(ET) + timedelta(seconds=2 * MARKET_CLOCK_REFRESH)),
+    }
+
+
+def _boundaries(day: date, hours: dict) -> list:
+    """(moment, session starting then) for one trading day"""
+    return [(hours['session_open'], 'premarket'), (hours['open'], 'regular'),
+            (hours['close'], 'afterhours'), (hours['session_close'], 'closed')]
+
+
+def _previous_boundary(now: datetime):
+    """Latest session boundary at or before `now`"""
+    for back in range(0, 15):
+        day = now.date() - timedelta(days=back)
+        hours = _trading_day(day)
+        if hours:
+            passed = [b for b in _boundaries(day, hours) if b[0] <= now]
+            if passed:
+                return passed[-1]
+    return None
+
+
+def _next_boundary(now: datetime):
+    """First session boundary after `now`"""
+    for ahead in range(0, 15):
+        day = now.date() + timedelta(days=ahead)
+        hours = _trading_day(day)
+        if hours:
+            upcoming = [b for b in _boundaries(day, hours) if b[0] > now]
+            if upcoming:
+                return upcoming[0]
+    return None
+
+
+def current_session(now: datetime = None) -> dict:
+    """Session at `now` (default: now) with when it started and when the next one starts
+    
+    Returns {'session', 'since', 'next_change', 'next_session', 'trading_day', 'open',
+    'close', 'last_open', 'source'}; times are ET datetimes ('open'/'close' are None on
+    days the market is closed, 'last_open' is the most recent regular open).
+    """
+    now = now or datetime.now(ET)
+    previous, upcoming = _previous_boundary(now), _next_boundary(now)
+    session = previous[1] if previous else 'closed'
+    since = previous[0] if previous else None
+    hours = _trading_day(now.date())
+    
+    clock = _state['clock']
+    if clock and now < clock['valid_until'] and clock['is_open'] != (session == 'regular'):
+        # The clock knows about unscheduled closures (and late opens) the calendar doesn't
+        session = 'regular' if clock['is_open'] else 'closed'
+    
+    last_open = None
+    for back in range(0, 15):
+        day_hours = _trading_day(now.date() - timedelta(days=back))
+        if day_hours and day_hours['open'] <= now:
+            last_open = day_hours['open']
+            break
+    
+    return {
+        'session': session,
+        'since': since,
+        'next_change': upcoming[0] if upcoming else None,
+        'next_session': upcoming[1] if upcoming else None,
+        'trading_day': hours is not None,
+        'open': hours['open'] if hours else None,
+        'close': hours['close'] if hours else None,
+        'last_open': last_open,
+        'source': 'alpaca' if _state['first'] and _state['first'] <= now.date() <= _state['last'] else 'fallback',
+    }
+
+
+def session_name() -> str:
+    """'premarket', 'regular', 'afterhours' or 'closed' right now"""
+    return current_session()['session']
+
+
+def seconds_in_session(status: dict = None) -> float:
+    """How long the current session has been running"""
+    status = status or current_session()
+    if status['since'] is None:
+        return float('inf')
+    return (datetime.now(ET) - status['since']).total_seconds()
+
+
+def premarket_final_day(after_open: float = 0) -> date:
+    """Trading day whose premarket is over (its levels can no longer change)
+    
+    None during premarket and until `after_open` seconds into the regular session.
+    """
+    status = current_session()
+    if status['session'] == 'premarket' or status['last_open'] is None:
+        return None
+    if datetime.now(ET) < status['last_open'] + timedelta(seconds=after_open):
+        return None
+    return status['last_open'].date()
+
+
+def market_status() -> dict:
+    """JSON-friendly current session (for /api/market/session)"""
+    status = current_session()
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in status.items()}
+
+
+async def run_market_calendar():
+    """Keep the calendar (daily) and clock (every MARKET_CLOCK_REFRESH seconds) current"""
+    if datetime.now(ET).year > _FALLBACK_LAST_YEAR:
+        print(f"⚠️  Market calendar fallback table ends in {_FALLBACK_LAST_YEAR} - weekends only without Alpaca")
+    while True:
+        if time.time() - _state['loaded_at'] >= MARKET_CALENDAR_REFRESH:
+            try:
+                await asyncio.to_thread(load_calendar)
+            except Exception as e:
+                print(f"⚠️  Market calendar error (using local holiday table): {e}")
+        try:
+            await asyncio.to_thread(load_clock)
+        except Exception as e:
+            print(f"⚠️  Market clock error: {e}")
+        
+        session = session_name()
+        if session != _state['session']:
+            print(f"🕘 Market session: {_state['session'] or 'startup'} → {session}")
+            _state['session'] = session
+        await asyncio.sleep(MARKET_CLOCK_REFRESH)
@@ -1,7 +1,36 @@
-"""News fetching service"""
-import requests
-from datetime import datetime, timedelta
-from config.settings import POLYGON_API_KEY, NEWS_CACHE, NEWS_CACHE_DURATION
+"""News ingestion and per-symbol news views (Polygon.io)
+
+Articles are kept in one shared store, deduplicated by Polygon article id and
+indexed by every ticker they mention, so an article covering several of our
+symbols is downloaded once. Two sources feed the store:
+- `run_news_ingestion()` polls the all-tickers feed every NEWS_POLL_INTERVAL
+  seconds (NEWS_POLL_INTERVAL_CLOSED while the market is closed), only for
+  articles published since the last one seen
+- the first view of a symbol backfills its last NEWS_RETENTION_DAYS of news
+  with one ticker request; after that the feed keeps it current
+
+Per-symbol news is served from the ticker index. A ticker request is only made
+when the feed has not succeeded within NEWS_CACHE_DURATION, which keeps us
+inside Polygon's free tier (5 requests/minute) for a large watchlist.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from config.settings import (
+    POLYGON_API_KEY, POLYGON_API_BASE, NEWS_CACHE_DURATION, NEWS_POLL_INTERVAL,
+    NEWS_POLL_OVERLAP, NEWS_POLL_MAX_PAGES, NEWS_RETENTION_DAYS, NEWS_VIEW_LIMIT, NEWS_POLL_INTERVAL_CLOSED,
+)
+from services.market_calendar_service import session_name
+from utils import http_client
+from utils.singleflight import single_flight
+
+_ARTICLES = {}  # article id -> news item (with 'tickers')
+_BY_TICKER = {}  # ticker -> set of article ids
+_TICKERS = {}  # ticker -> {'cursor': newest published_utc fetched for it, 'synced_at': monotonic time}
+# Feed cursor starts at import, so a ticker backfilled any time later has no gap
+_state = {'cursor': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), 'polled_at': 0}
+_LOCK = threading.Lock()
 
 
 def is_top_news(title: str, description: str) -> bool:
@@ -27,94 +56,179 @@ def is_top_news(title: str, description: str) -> bool:
     return any(keyword in text for keyword in top_keywords)
 
 
+def _to_item(article: dict) -> dict:
+    """News item from a Polygon article"""
+    return {
+        'id': article.get('id', ''),
+        'title': article.get('title', ''),
+        'description': article.get('description', '')[:150] if article.get('description') else '',
+        'url': article.get('article_url', ''),
+        'published_at': article.get('published_utc', ''),
+        'source': article.get('publisher', {}).get('name', 'Unknown'),
+        'tickers': [t.upper() for t in article.get('tickers', [])],
+    }
+
+
+def _since(days: float) -> str:
+    """UTC timestamp `days` ago in Polygon's published_utc format"""
+    moment = datetime.now(timezone.utc) - timedelta(days=days)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _overlap(cursor: str) -> str:
+    """Cursor moved back by NEWS_POLL_OVERLAP (articles can be indexed after their publish time)"""
+    moment = datetime.strptime(cursor[:19], "%Y-%m-%dT%H:%M:%S") - timedelta(seconds=NEWS_POLL_OVERLAP)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def ingest(articles: list, ticker: str = None) -> int:
+    """Add Polygon articles to the shared store; returns how many were new"""
+    added = 0
+    with _LOCK:
+        for article in articles:
+            item = _to_item(article)
+            if not item['id'] or item['id'] in _ARTICLES:
+                continue
+            if ticker and ticker not in item['tickers']:
+                item['tickers'].append(ticker)
+            _ARTICLES[item['id']] = item
+            for symbol in item['tickers']:
+                _BY_TICKER.setdefault(symbol, set()).add(item['id'])
+            added += 1
+    return added
+
+
+def _prune():
+    """Drop articles older than NEWS_RETENTION_DAYS"""
+    oldest = _since(days=NEWS_RETENTION_DAYS)
+    with _LOCK:
+        expired = [i for i, item in _ARTICLES.items() if item['published_at'] < oldest]
+        for article_id in expired:
+            for symbol in _ARTICLES.pop(article_id)['tickers']:
+                ids = _BY_TICKER.get(symbol)
+                if ids is not None:
+                    ids.discard(article_id)
+                    if not ids:
+                        del _BY_TICKER[symbol]
+
+
+def news_view(symbol: str) -> dict:
+    """Newest NEWS_VIEW_LIMIT articles for a symbol from the store, split into top and regular news"""
+    with _LOCK:
+        items = [_ARTICLES[i] for i in _BY_TICKER.get(symbol, ())]
+    items.sort(key=lambda item: item['published_at'], reverse=True)
+    top_news, regular_news = [], []
+    for item in items[:NEWS_VIEW_LIMIT]:
+        # Categorize as top news or regular news
+        if is_top_news(item['title'], item['description']):
+            top_news.append(item)
+        else:
+            regular_news.append(item)
+    return {'top_news': top_news, 'regular_news': regular_news}
+
+
+def news_version(symbol: str) -> tuple:
+    """Changes whenever a symbol's stored news changes (None while the symbol needs a ticker request)"""
+    ticker = _TICKERS.get(symbol)
+    if not ticker or time.monotonic() - ticker['synced_at'] >= NEWS_CACHE_DURATION:
+        return None
+    with _LOCK:
+        ids = _BY_TICKER.get(symbol, ())
+        return len(ids), max((_ARTICLES[i]['published_at'] for i in ids), default='')
+
+
+def _check_response(response) -> list:
+    """Articles of a Polygon news response (None, with a log line, on errors)"""
+    if response.status_code == 200:
+        news_data = response.json()
+        
+        # Polygon response format: {"status": "OK", "results": [...]}
+        if news_data.get('status') == 'OK' and 'results' in news_data:
+            return news_data['results']
+        elif news_data.get('status') == 'ERROR':
+            print(f"   ⚠️  Polygon API error: {news_data.get('error', 'Unknown error')}")
+    elif response.status_code == 403:
+        print(f"   ⚠️  Polygon API: Invalid or missing API key")
+    elif response.status_code == 429:
+        print(f"   ⚠️  Polygon API: Rate limit exceeded (5 req/min free tier)")
+    else:
+        print(f"   ⚠️  Polygon API HTTP {response.status_code}")
+    return None
+
+
+@single_flight('news')
 def fetch_news_for_symbol(symbol: str) -> dict:
-    """Fetch news for a symbol from Polygon.io API and categorize into top news and regular news"""
-    top_news = []
-    regular_news = []
-    
-    # NEWS API ENABLED FOR GROK INTEGRATION
-    
+    """Bring a symbol's news up to date with one ticker request (incremental after the first)"""
+    ticker = _TICKERS.get(symbol)
     if not POLYGON_API_KEY:
+        # Count the symbol as synced so get_cached_news serves the store until NEWS_CACHE_DURATION
         print(f"   ⚠️  Polygon API key not configured")
-        return {'top_news': top_news, 'regular_news': regular_news}
+        _TICKERS[symbol] = {'cursor': ticker['cursor'] if ticker else _since(days=NEWS_RETENTION_DAYS),
+                            'synced_at': time.monotonic()}
+        return news_view(symbol)
     
+    since = _overlap(ticker['cursor']) if ticker else _since(days=NEWS_RETENTION_DAYS)
     try:
-        # Calculate date for last 7 days
-        seven_days_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
-        
-        # Polygon.io ticker news endpoint with date filter
-        # Free tier: 5 requests/minute, 100 results max
-        news_url = f"https://api.polygon.io/v2/reference/news?ticker={symbol}&published_utc.gte={seven_days_ago}&limit=50&order=desc&apiKey={POLYGON_API_KEY}"
-        news_response = requests.get(news_url, timeout=10)
-        
-        if news_response.status_code == 200:
-            news_data = news_response.json()
-            
-            # Polygon response format: {"status": "OK", "results": [...]}
-            if news_data.get('status') == 'OK' and 'results' in news_data:
-                articles = news_data['results']
-                
-                for article in articles:
-                    news_item = {
-                        'title': article.get('title', ''),
-                        'description': article.get('description', '')[:150] if article.get('description') else '',
-                        'url': article.get('article_url', ''),
-                        'published_at': article.get('published_utc', ''),
-                        'source': article.get('publisher', {}).get('name', 'Unknown'),
-                    }
-                    
-                    # Categorize as top news or regular news
-                    if is_top_news(news_item['title'], news_item['description']):
-                        top_news.append(news_item)
-                    else:
-                        regular_news.append(news_item)
-                
-                print(f"   📰 Fetched {len(articles)} articles (last 7 days): {len(top_news)} top news, {len(regular_news)} regular")
-            elif news_data.get('status') == 'ERROR':
-                error_msg = news_data.get('error', 'Unknown error')
-                print(f"   ⚠️  Polygon API error: {error_msg}")
-            else:
-                print(f"   ℹ️  No news articles available")
-        elif news_response.status_code == 403:
-            print(f"   ⚠️  Polygon API: Invalid or missing API key")
-        elif news_response.status_code == 429:
-            print(f"   ⚠️  Polygon API: Rate limit exceeded (5 req/min free tier)")
-        else:
-            print(f"   ⚠️  Polygon API HTTP {news_response.status_code}")
+        news_url = f"{POLYGON_API_BASE}/v2/reference/news"
+        params = {'ticker': symbol, 'published_utc.gte': since, 'limit': 50, 'order': 'desc', 'sort': 'published_utc', 'apiKey': POLYGON_API_KEY}
+        articles = _check_response(http_client.request_sync("GET", news_url, provider='polygon', params=params, timeout=10))
+        if articles is not None:
+            added = ingest(articles, symbol)
+            cursor = max([a.get('published_utc', '') for a in articles] + [ticker['cursor'] if ticker else since])
+            _TICKERS[symbol] = {'cursor': cursor, 'synced_at': time.monotonic()}
+            print(f"   📰 {symbol}: {len(articles)} articles since {since[:16]}, {added} new")
     except Exception as e:
         print(f"   ⚠️  News fetch error: {e}")
     
-    return {'top_news': top_news, 'regular_news': regular_news}
+    return news_view(symbol)
 
 
 def get_cached_news(symbol: str) -> dict:
-    """Get news from cache or fetch if needed (only refresh every 10 minutes)"""
-    news_data = {'top_news': [], 'regular_news': []}
-    current_time = datetime.now()
-    
-    # Check if we have cached news that's still fresh
-    if symbol in NEWS_CACHE:
-        cache_entry = NEWS_CACHE[symbol]
-        cache_age = (current_time - cache_entry['timestamp']).total_seconds()
-        
-        if cache_age < NEWS_CACHE_DURATION:
-            # Use cached news
-            news_data = cache_entry['news']
-            print(f"   News: Using cache ({int(NEWS_CACHE_DURATION - cache_age)}s remaining)")
-        else:
-            # Cache expired, fetch new news
-            news_data = fetch_news_for_symbol(symbol)
-            NEWS_CACHE[symbol] = {
-                'news': news_data,
-                'timestamp': current_time
-            }
-    else:
-        # No cache, fetch news
-        news_data = fetch_news_for_symbol(symbol)
-        NEWS_CACHE[symbol] = {
-            'news': news_data,
-            'timestamp': current_time
-        }
+    """News for a symbol from the store (a ticker request only if it has not been synced recently)"""
+    ticker = _TICKERS.get(symbol)
+    if ticker and time.monotonic() - ticker['synced_at'] < NEWS_CACHE_DURATION:
+        return news_view(symbol)
+    return fetch_news_for_symbol(symbol)
+
+
+async def poll_news() -> int:
+    """Fetch articles for all tickers published since the feed cursor; returns how many were new"""
+    params = {'published_utc.gte': _overlap(_state['cursor']), 'limit': 1000, 'order': 'asc',
+              'sort': 'published_utc', 'apiKey': POLYGON_API_KEY}
+    url = f"{POLYGON_API_BASE}/v2/reference/news"
+    added, cursor, caught_up = 0, _state['cursor'], False
+    for _ in range(NEWS_POLL_MAX_PAGES):
+        response = await http_client.request("GET", url, provider='polygon', params=params, timeout=10)
+        articles = _check_response(response)
+        if articles is None:
+            raise RuntimeError(f"news feed HTTP {response.status_code}")
+        added += ingest(articles)
+        cursor = max([a.get('published_utc', '') for a in articles] + [cursor])
+        next_url = response.json().get('next_url')
+        if not next_url:
+            caught_up = True
+            break
+        url, params = next_url, {'apiKey': POLYGON_API_KEY}
     
-    return news_data
+    _state['cursor'] = cursor
+    if caught_up:
+        # Every synced ticker is now current without its own request
+        now = time.monotonic()
+        _state['polled_at'] = now
+        for ticker in _TICKERS.values():
+            ticker['synced_at'] = now
+    return added
+
 
+async def run_news_ingestion():
+    """Poll the all-tickers news feed every NEWS_POLL_INTERVAL seconds (less often while the market is closed)"""
+    while True:
+        try:
+            added = await poll_news()
+            if added:
+                print(f"📰 News feed: {added} new articles ({len(_ARTICLES)} stored, {len(_BY_TICKER)} tickers)")
+            await asyncio.to_thread(_prune)
+        except Exception as e:
+            print(f"⚠️  News feed error: {e}")
+        # Overnight and weekend news is slower and nobody can trade on it until the next session
+        await asyncio.sleep(NEWS_POLL_INTERVAL_CLOSED if session_name() == 'closed' else NEWS_POLL_INTERVAL)
@@ -1,7 +1,6 @@
 """Premarket high/low service"""
-from datetime import datetime, timedelta
-from alpaca_trade_api.rest import TimeFrame
-from config.settings import data_api
+from datetime import datetime
+from services.intraday_bar_service import get_intraday_bars
 
 
 def get_premarket_levels(symbol: str) -> dict:
@@ -14,13 +13,7 @@ def get_premarket_levels(symbol: str) -> dict:
         print(f"   🔍 Fetching premarket levels for: {today.strftime('%Y-%m-%d')}")
         
         # Get today's minute bars
-        bars = data_api.get_bars(
-            symbol,
-            TimeFrame.Minute,
-            start=today.strftime("%Y-%m-%d"),
-            end=today.strftime("%Y-%m-%d"),
-            feed='iex'
-        ).df
+        bars = get_intraday_bars(symbol)
         
         if bars.empty:
             print(f"   ℹ️  No bars available for today")
@@ -0,0 +1,147 @@
+"""Server-push quote channel (/ws/quotes)
+
+Clients subscribe to symbols over a WebSocket and receive a message only when
+a symbol's snapshot changes. Changes are coalesced per PUSH_INTERVAL, each
+update is serialized once and the same text is sent to every subscriber.
+
+Updates are field-level deltas against the version every subscriber already
+has; a full snapshot is sent on subscribe/resync, when the base version is no
+longer kept, and every FULL_SNAPSHOT_EVERY updates so clients can resync.
+"""
+import asyncio
+import json
+from config.settings import PUSH_INTERVAL, PUSH_SEND_TIMEOUT, FULL_SNAPSHOT_EVERY
+from services.snapshot_service import add_listener, get_delta, get_versioned_snapshot
+
+_SUBSCRIBERS = {}  # symbol -> set of WebSocket
+_SENT = {}  # symbol -> {'seq': version all subscribers have, 'updates': deltas since last full}
+_DIRTY = set()  # symbols changed since the last flush
+_state = {'loop': None}
+
+
+def _on_snapshot_changed(symbol: str):
+    """Snapshot listener: mark a symbol dirty (called from any thread)"""
+    loop = _state['loop']
+    if loop and symbol in _SUBSCRIBERS:
+        loop.call_soon_threadsafe(_DIRTY.add, symbol)
+
+
+def snapshot_message(symbol: str, seq: int, data: dict) -> str:
+    """Full snapshot message"""
+    return json.dumps({'type': 'snapshot', 'symbol': symbol, 'seq': seq, 'data': data}, default=str)
+
+
+def delta_message(symbol: str, delta: dict) -> str:
+    """Field-level delta message (`base` is the version it applies to)"""
+    return json.dumps({'type': 'delta', 'symbol': symbol, **delta}, default=str)
+
+
+async def _send(websocket, message: str) -> bool:
+    """Send to one client; False if it is gone or too slow"""
+    try:
+        await asyncio.wait_for(websocket.send_text(message), timeout=PUSH_SEND_TIMEOUT)
+        return True
+    except Exception:
+        return False
+
+
+async def _broadcast(symbol: str, message: str):
+    """Send the same serialized message to every subscriber of a symbol"""
+    subscribers = list(_SUBSCRIBERS.get(symbol, ()))
+    results = await asyncio.gather(*(_send(ws, message) for ws in subscribers))
+    for websocket, ok in zip(subscribers, results):
+        if not ok:
+            remove_client(websocket)
+
+
+def _next_message(symbol: str) -> str:
+    """Message that brings subscribers from the last sent version to the current one"""
+    sent = _SENT.get(symbol)
+    seq, data = get_versioned_snapshot(symbol)
+    if data is None or (sent and sent['seq'] == seq):
+        return None
+    
+    delta = get_delta(symbol, sent['seq']) if sent else None
+    if delta is None or sent['updates'] + 1 >= FULL_SNAPSHOT_EVERY:
+        # Base version no longer kept, or periodic resync
+        _SENT[symbol] = {'seq': seq, 'updates': 0}
+        return snapshot_message(symbol, seq, data)
+    
+    _SENT[symbol] = {'seq': seq, 'updates': sent['updates'] + 1}
+    return delta_message(symbol, delta)
+
+
+async def run_push_hub():
+    """Flush changed snapshots to subscribers every PUSH_INTERVAL seconds"""
+    _state['loop'] = asyncio.get_running_loop()
+    add_listener(_on_snapshot_changed)
+    while True:
+        await asyncio.sleep(PUSH_INTERVAL)
+        if not _DIRTY:
+            continue
+        dirty = list(_DIRTY)
+        _DIRTY.clear()
+        for symbol in dirty:
+            if symbol not in _SUBSCRIBERS:
+                continue
+            message = _next_message(symbol)
+            if message:
+                await _broadcast(symbol, message)
+
+
+async def send_current(websocket, symbol: str) -> bool:
+    """Send a client the full snapshot at the version the other subscribers have
+    
+    Returns False if the symbol has no snapshot yet.
+    """
+    sent = _SENT.get(symbol)
+    seq, data = get_versioned_snapshot(symbol, sent['seq']) if sent else (None, None)
+    if data is None:
+        seq, data = get_versioned_snapshot(symbol)
+        if data is None:
+            return False
+        if sent:
+            # Others are on a version we no longer keep: resync everyone on the next flush
+            _SENT[symbol] = {'seq': 0, 'updates': FULL_SNAPSHOT_EVERY}
+            _DIRTY.add(symbol)
+        else:
+            _SENT[symbol] = {'seq': seq, 'updates': 0}
+    await _send(websocket, snapshot_message(symbol, seq, data))
+    return True
+
+
+async def subscribe(websocket, symbols: list) -> list:
+    """Subscribe a client; it immediately gets the current snapshot of each symbol
+    
+    Returns the symbols that have no snapshot yet (the caller should start a fetch).
+    """
+    missing = []
+    for symbol in symbols:
+        _SUBSCRIBERS.setdefault(symbol, set()).add(websocket)
+        if not await send_current(websocket, symbol):
+            missing.append(symbol)
+            # First version will go out as a full snapshot once it is fetched
+            _DIRTY.add(symbol)
+    return missing
+
+
+def unsubscribe(websocket, symbols: list):
+    """Remove a client from some symbols"""
+    for symbol in symbols:
+        subscribers = _SUBSCRIBERS.get(symbol)
+        if subscribers is None:
+            continue
+        subscribers.discard(websocket)
+        if not subscribers:
+            del _SUBSCRIBERS[symbol]
+            _SENT.pop(symbol, None)
+
+
+def remove_client(websocket):
+    """Remove a client from every symbol (on disconnect)"""
+    unsubscribe(websocket, [s for s, subs in list(_SUBSCRIBERS.items()) if websocket in subs])
+
+
+def subscriber_counts() -> dict:
+    """Number of push subscribers per symbol"""
+    return {symbol: len(subs) for symbol, subs in _SUBSCRIBERS.items()}
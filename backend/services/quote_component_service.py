@@ -0,0 +1,108 @@
+"""Per-component freshness for quote snapshots
+
+A snapshot is assembled from components (price, day range, 52-week range,
+EMAs per timeframe, premarket levels, crossovers, company info, sector
+analysis, Grok analysis) and each one has its own trigger (SNAPSHOT_COMPONENTS):
+- 'tick': recomputed on every fetch (the stream and the batch refresh keep
+  prices current in between)
+- 'minute' / '10min' / 'hour': once a bar of that timeframe has closed
+- 'day': once the date has changed (the bar history store only serves days
+  before today, so that is when a completed day is added)
+- 'news': when the symbol's stored news changes (a symbol without synced news,
+  e.g. no Polygon key, keeps one stable key)
+
+Components computed from other values (crossovers from the price and the EMAs)
+also pass those inputs, and are recomputed when either the trigger or an input
+changed.
+
+A component's trigger key is taken before it is computed and stored with the
+result; fetch_stock_data only recomputes components whose key has moved on, so
+a refresh costs in proportion to what actually changed. Every stored value
+carries a version that bumps only when the value itself changed, and the
+snapshot lists the versions it was assembled from. A symbol's components are
+dropped when its snapshot is evicted from the 'quotes' cache.
+"""
+import threading
+import time
+from datetime import datetime
+from config.settings import SNAPSHOT_COMPONENTS
+from services.news_service import news_version
+from services.snapshot_service import add_evict_listener
+
+STALE = object()  # lookup result for a component that needs recomputing
+
+_BUCKETS = {'minute': 60, '10min': 600, 'hour': 3600}
+
+# (symbol, component) -> {'key', 'value', 'version'}
+_COMPONENTS = {}
+_STATS = {name: {'computed': 0, 'reused': 0, 'changed': 0} for name in SNAPSHOT_COMPONENTS}
+_LOCK = threading.Lock()
+
+
+def trigger_key(symbol: str, name: str):
+    """Current key of a component's trigger; a stored value is fresh while its key matches (None = always stale)"""
+    trigger = SNAPSHOT_COMPONENTS[name]
+    if trigger in _BUCKETS:
+        return int(time.time() // _BUCKETS[trigger])
+    if trigger == 'day':
+        # The local date get_history clamps its end to: the last day covered is the one before it
+        return datetime.now().date()
+    if trigger == 'news':
+        version = news_version(symbol)
+        return version if version is not None else 0
+    return None  # 'tick'
+
+
+def lookup_component(symbol: str, name: str, inputs=None) -> tuple:
+    """(trigger key, stored value) - the value is STALE if the component must be recomputed
+    
+    `inputs` (hashable) become part of the key, so a change in them also makes it stale.
+    """
+    key = trigger_key(symbol, name)
+    if key is not None and inputs is not None:
+        key = (key, inputs)
+    with _LOCK:
+        entry = _COMPONENTS.get((symbol, name))
+        if key is not None and entry is not None and entry['key'] == key:
+            _STATS[name]['reused'] += 1
+            return key, entry['value']
+        _STATS[name]['computed'] += 1
+    return key, STALE
+
+
+def store_component(symbol: str, name: str, key, value):
+    """Keep a freshly computed component under the trigger key taken before computing it"""
+    with _LOCK:
+        entry = _COMPONENTS.get((symbol, name))
+        if entry is not None and entry['value'] == value:
+            entry['key'] = key
+            return
+        _COMPONENTS[(symbol, name)] = {
+            'key': key,
+            'value': value,
+            'version': entry['version'] + 1 if entry else 1,
+        }
+        _STATS[name]['changed'] += 1
+
+
+def component_versions(symbol: str) -> dict:
+    """component -> version for a symbol's stored components (assembled into its snapshot)"""
+    with _LOCK:
+        return {name: _COMPONENTS[(symbol, name)]['version']
+                for name in SNAPSHOT_COMPONENTS if (symbol, name) in _COMPONENTS}
+
+
+def _drop_components(symbol: str):
+    """Forget an evicted symbol's components"""
+    with _LOCK:
+        for name in SNAPSHOT_COMPONENTS:
+            _COMPONENTS.pop((symbol, name), None)
+
+
+add_evict_listener(_drop_components)
+
+
+def component_stats() -> dict:
+    """Per component: trigger, how often it was recomputed vs. reused, and how often its value changed"""
+    with _LOCK:
+        return {name: {'trigger': SNAPSHOT_COMPONENTS[name], **counts} for name, counts in _STATS.items()}
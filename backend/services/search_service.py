@@ -0,0 +1,330 @@
+"""In-memory asset search index for /api/search
+
+The active US equity list is downloaded once and indexed:
+- a sorted symbol array (exact and prefix matches via bisect)
+- a sorted index of company-name words (prefix matches per query word)
+- a trigram index over symbols and name words for typo-tolerant matches,
+  verified with a bounded edit distance ("nvida" -> NVDA)
+
+Every candidate is scored by match quality, with a small boost for liquid names,
+and the top-k are returned. The index is built from the asset metadata store
+and updated whenever that store is refreshed; only assets that were added,
+removed or renamed are re-indexed, and the new index is swapped in atomically.
+"""
+import heapq
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from services.asset_metadata_service import active_assets, add_listener, refresh_metadata
+from utils.singleflight import single_flight
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_PREFIX_SCAN_LIMIT = 500  # max index words scanned for one query word
+_PREFIX_MATCH_LIMIT = 1000  # stop scanning once a query word matched this many symbols
+_NAME_CANDIDATES = 50  # name matches scored per query
+_FUZZY_CANDIDATES = 50  # trigram candidates verified with edit distance per query
+_COMMON_GRAM_LIMIT = 300  # trigrams in more symbols than this don't pick candidates
+
+# Swapped atomically on rebuild; readers just take a reference
+_state = {'index': None}
+
+
+def tokenize(text: str) -> list:
+    """Lowercase words of a company name or query"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(word: str) -> set:
+    """Padded character trigrams of a word ("nvda" -> {"$nv", "nvd", "vda", "da$"})"""
+    padded = f"${word}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Edit distance counting a swap of adjacent letters as one edit ("appel" -> "apple"),
+    or max_distance + 1 once it is known to be larger"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _allowed_typos(word: str) -> int:
+    """Edits tolerated for a query word of this length"""
+    if len(word) < 5:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def _liquidity(asset: dict) -> float:
+    """0-1 liquidity proxy from the broker flags (set for liquid, widely held names)"""
+    flags = ('tradable', 'marginable', 'shortable', 'easy_to_borrow', 'fractionable')
+    return sum(bool(asset.get(flag)) for flag in flags) / len(flags)
+
+
+def _index_keys(symbol: str, name: str) -> tuple:
+    """Name words and trigrams indexed for an asset"""
+    words = set(tokenize(name))
+    grams = trigrams(symbol.lower()).union(*(trigrams(w) for w in words))
+    return words, grams
+
+
+class AssetIndex:
+    """Search index over a list of assets (not modified once published)"""
+
+    def __init__(self, assets: list = ()):
+        # symbol -> {'symbol', 'name', 'exchange', 'liquidity'}
+        self.assets = {}
+        self.symbols = []
+        self.name_tokens = {}  # symbol -> name words in order
+        self.postings = {}  # name word -> set of symbols
+        self.words = []  # sorted name words
+        self.grams = {}  # trigram -> set of symbols (from the symbol and name words)
+        self.changes = 0
+        for asset in assets:
+            self._add(asset)
+        self.symbols.sort()
+        self.words.sort()
+        self.built_at = time.time()
+
+    def _add(self, asset: dict, keep_sorted: bool = False):
+        symbol = asset['symbol'].upper()
+        self.assets[symbol] = asset
+        self.name_tokens[symbol] = tokenize(asset['name'])
+        (insort if keep_sorted else list.append)(self.symbols, symbol)
+        words, grams = _index_keys(symbol, asset['name'])
+        for word in words:
+            if word not in self.postings:
+                self.postings[word] = set()
+                (insort if keep_sorted else list.append)(self.words, word)
+            self.postings[word].add(symbol)
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(symbol)
+
+    def _remove(self, symbol: str):
+        words, grams = _index_keys(symbol, self.assets[symbol]['name'])
+        for word in words:
+            self.postings[word].discard(symbol)
+            if not self.postings[word]:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+        for gram in grams:
+            self.grams[gram].discard(symbol)
+            if not self.grams[gram]:
+                del self.grams[gram]
+        del self.symbols[bisect_left(self.symbols, symbol)]
+        del self.name_tokens[symbol]
+        del self.assets[symbol]
+
+    def updated(self, assets: list) -> 'AssetIndex':
+        """New index for a changed asset list, re-indexing only the assets that changed
+        
+        Posting sets touched by the change are copied, so readers of this index
+        are never affected.
+        """
+        new = {a['symbol'].upper(): a for a in assets}
+        removed = [s for s, a in self.assets.items() if new.get(s) != a]
+        added = [a for s, a in new.items() if self.assets.get(s) != a]
+        
+        touched_words, touched_grams = set(), set()
+        for symbol in removed:
+            words, grams = _index_keys(symbol, self.assets[symbol]['name'])
+            touched_words |= words
+            touched_grams |= grams
+        for asset in added:
+            words, grams = _index_keys(asset['symbol'].upper(), asset['name'])
+            touched_words |= words
+            touched_grams |= grams
+        
+        index = AssetIndex()
+        index.assets = dict(self.assets)
+        index.symbols = list(self.symbols)
+        index.name_tokens = dict(self.name_tokens)
+        index.words = list(self.words)
+        index.postings = {w: (set(s) if w in touched_words else s) for w, s in self.postings.items()}
+        index.grams = {g: (set(s) if g in touched_grams else s) for g, s in self.grams.items()}
+        for symbol in removed:
+            index._remove(symbol)
+        for asset in added:
+            index._add(asset, keep_sorted=True)
+        index.changes = len(removed) + len(added)
+        return index
+
+    def symbol_prefix(self, prefix: str, limit: int) -> list:
+        """Symbols starting with `prefix`, alphabetically"""
+        start = bisect_left(self.symbols, prefix)
+        return [s for s in self.symbols[start:start + limit] if s.startswith(prefix)]
+
+    def _word_prefix(self, prefix: str) -> set:
+        """Symbols with a name word starting with `prefix`"""
+        matches = set()
+        start = bisect_left(self.words, prefix)
+        for word in self.words[start:start + _PREFIX_SCAN_LIMIT]:
+            if not word.startswith(prefix) or len(matches) >= _PREFIX_MATCH_LIMIT:
+                break
+            matches.update(self.postings[word])
+        return matches
+
+    def name_matches(self, words: list) -> set:
+        """Symbols whose name has a word starting with every query word"""
+        candidates = None
+        for word in sorted(words, key=len, reverse=True):  # longest word narrows most
+            found = self._word_prefix(word)
+            candidates = found if candidates is None else candidates & found
+            if not candidates:
+                return set()
+        return candidates
+
+    def fuzzy_candidates(self, words: list) -> list:
+        """Symbols sharing the most trigrams with the query words
+        
+        One edit changes at most 3 trigrams, so symbols sharing fewer than
+        len(grams) - 3 * allowed_typos can't be within the edit budget.
+        """
+        counts = Counter()
+        needed = 0
+        for word in words:
+            grams = trigrams(word)
+            needed += max(1, len(grams) - 3 * _allowed_typos(word))
+            for gram in grams:
+                symbols = self.grams.get(gram, ())
+                if len(symbols) <= _COMMON_GRAM_LIMIT:
+                    counts.update(symbols)
+        return [symbol for symbol, count in counts.most_common(_FUZZY_CANDIDATES) if count >= needed]
+
+    def _typos(self, symbol: str, words: list) -> int:
+        """Total edits for every query word to match the symbol or a name word (None if too many)"""
+        targets = [symbol.lower()] + self.name_tokens[symbol]
+        total = 0
+        for word in words:
+            allowed = _allowed_typos(word)
+            # Compare against whole words and against word prefixes of the query's length
+            best = allowed + 1
+            for target in targets:
+                best = min(best, edit_distance(word, target, allowed))
+                if len(target) > len(word):
+                    best = min(best, edit_distance(word, target[:len(word)], allowed))
+                if best == 0:
+                    break
+            if best > allowed:
+                return None
+            total += best
+        return total
+
+    def _score(self, symbol: str, query_upper: str, words: list, name_match: bool, typos: int) -> float:
+        """Higher is better: exact > symbol prefix > name > fuzzy, then liquid names first"""
+        if symbol == query_upper:
+            score = 1000
+        elif symbol.startswith(query_upper):
+            score = 800 - (len(symbol) - len(query_upper))
+        elif name_match:
+            score = 600 + (50 if self.name_tokens[symbol][0].startswith(words[0]) else 0)
+        else:
+            score = 400 - 100 * typos
+        return score + 20 * self.assets[symbol].get('liquidity', 0)
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Top `limit` assets for a query, best match first"""
+        query_upper = query.strip().upper()
+        words = tokenize(query)
+        if not words:
+            return []
+        
+        scored = {}
+        exact = [query_upper] if query_upper in self.assets else []
+        for symbol in exact + self.symbol_prefix(query_upper, limit * 2):
+            scored[symbol] = self._score(symbol, query_upper, words, False, 0)
+        
+        name_matches = heapq.nsmallest(_NAME_CANDIDATES, self.name_matches(words),
+                                       key=lambda s: (not self.name_tokens[s][0].startswith(words[0]), s))
+        for symbol in name_matches:
+            scored.setdefault(symbol, self._score(symbol, query_upper, words, True, 0))
+        
+        # Typo-tolerant matches only when the exact kinds don't fill the list
+        if len(scored) < limit:
+            for symbol in self.fuzzy_candidates(words):
+                if symbol in scored:
+                    continue
+                typos = self._typos(symbol, words)
+                if typos is not None:
+                    scored[symbol] = self._score(symbol, query_upper, words, False, typos)
+        
+        ranked = sorted(scored, key=lambda s: (-scored[s], s))[:limit]
+        return [{k: self.assets[s][k] for k in ('symbol', 'name', 'exchange')} for s in ranked]
+
+
+def _search_record(asset: dict) -> dict:
+    """Fields the index keeps for an asset from the metadata store"""
+    return {
+        'symbol': asset['symbol'],
+        'name': asset.get('name') or '',
+        'exchange': asset.get('exchange'),
+        'liquidity': _liquidity(asset),
+    }
+
+
+@single_flight('asset_index', key=lambda assets: 'index')
+def update_index(assets: list) -> AssetIndex:
+    """Swap in an index for a new asset list (incremental after the first build)
+    
+    An empty list is not published, so get_index() keeps trying to build a real one.
+    """
+    started = time.monotonic()
+    records = [_search_record(a) for a in assets]
+    current = _state['index']
+    if not records:
+        return current or AssetIndex()
+    if current is None or not current.assets:
+        index = AssetIndex(records)
+        print(f"🔎 Search index: {len(index.symbols)} assets, {len(index.words)} name words ({time.monotonic() - started:.1f}s)")
+    else:
+        index = current.updated(records)
+        print(f"🔎 Search index: {index.changes} assets changed ({time.monotonic() - started:.1f}s)")
+    _state['index'] = index
+    return index
+
+
+add_listener(update_index)
+
+
+def get_index() -> AssetIndex:
+    """Current index, building it from the metadata store on first use
+    
+    If the store is still empty (first start, before the bulk download finished)
+    the download runs now, shared with the background refresh; its listener
+    call publishes the index.
+    """
+    index = _state['index']
+    if index is not None and index.assets:
+        return index
+    assets = active_assets()
+    if not assets:
+        refresh_metadata()
+        return _state['index'] or AssetIndex()
+    return update_index(assets)
+
+
+def is_listed(symbol: str) -> bool:
+    """Whether the published index has the symbol (never builds or downloads)"""
+    index = _state['index']
+    return index is not None and symbol.upper() in index.assets
+
+
+def search_assets(query: str, limit: int = 10) -> list:
+    """Search by symbol or company name with typo tolerance (no network call once built)"""
+    try:
+        return get_index().search(query, limit)
+    except Exception as e:
+        print(f"Search error: {e}")
+        return []
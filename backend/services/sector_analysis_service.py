@@ -1,33 +1,15 @@
 """Advanced sector analysis using Yahoo Finance (yfinance)
 NO API KEY NEEDED - Completely FREE!
 """
-import yfinance as yf
+from services.fundamentals_service import get_fundamentals, lowest_pe
+from utils.singleflight import single_flight
 
 
 def get_financial_ratios(symbol: str) -> dict:
-    """Get financial ratios including P/E from Yahoo Finance"""
+    """Get financial ratios including P/E from Yahoo Finance (shared fundamentals table)"""
     
     print(f"   📈 Fetching financial ratios for {symbol} from Yahoo Finance...")
-    
-    try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        
-        return {
-            'pe_ratio': info.get('trailingPE') or info.get('forwardPE'),
-            'peg_ratio': info.get('pegRatio'),
-            'pb_ratio': info.get('priceToBook'),
-            'price_to_sales': info.get('priceToSalesTrailing12Months'),
-            'market_cap': info.get('marketCap'),
-            'sector': info.get('sector'),
-            'industry': info.get('industry'),
-            'beta': info.get('beta'),
-            'dividend_yield': info.get('dividendYield')
-        }
-    
-    except Exception as e:
-        print(f"   ⚠️  Error fetching ratios for {symbol}: {e}")
-        return {}
+    return get_fundamentals(symbol)
 
 
 def find_sector_peers(symbol: str, sector: str, limit: int = 50) -> list:
@@ -77,41 +59,18 @@ def get_lowest_pe_in_sector(symbol: str, sector: str, peer_count: int = 20, retu
     if not peers:
         return []
     
-    # Get P/E for each peer
-    peer_pe_data = []
+    # P/E for every peer from the shared table (missing peers are fetched concurrently)
     min_market_cap = 100_000_000_000  # $100B minimum
-    
-    for peer in peers:
-        try:
-            ticker = yf.Ticker(peer)
-            info = ticker.info
-            
-            pe = info.get('trailingPE') or info.get('forwardPE')
-            market_cap = info.get('marketCap', 0)
-            
-            # Only include if:
-            # 1. Has valid P/E (positive)
-            # 2. Market cap > $100B
-            if pe and pe > 0 and market_cap >= min_market_cap:
-                peer_pe_data.append({
-                    'symbol': peer,
-                    'pe_ratio': pe,
-                    'market_cap': market_cap,
-                })
-                print(f"      ✓ {peer}: P/E={pe:.2f}, Cap=${market_cap/1e9:.1f}B")
-        except Exception as e:
-            continue
-    
-    # Sort by P/E (lowest first)
-    peer_pe_data.sort(key=lambda x: x['pe_ratio'])
-    
-    lowest = peer_pe_data[:return_count]
+    lowest = lowest_pe(peers, min_market_cap, return_count)
+    for peer in lowest:
+        print(f"      ✓ {peer['symbol']}: P/E={peer['pe_ratio']:.2f}, Cap=${peer['market_cap']/1e9:.1f}B")
     
     print(f"   ✓ Found {len(lowest)} large-cap stocks with lowest P/E (filtered to >$100B)")
     
     return lowest
 
 
+@single_flight('sector_analysis')
 def analyze_sector_position(symbol: str, etf_symbol: str = None) -> dict:
     """
     Comprehensive sector analysis using Yahoo Finance
@@ -151,12 +110,12 @@ def analyze_sector_position(symbol: str, etf_symbol: str = None) -> dict:
             
             # Find lowest P/E peers in sector
             print(f"\n   📉 Finding lowest P/E peers...")
-            lowest_pe = get_lowest_pe_in_sector(symbol, sector, peer_count=20, return_count=5)
-            result['lowest_pe_peers'] = lowest_pe
+            lowest_peers = get_lowest_pe_in_sector(symbol, sector, peer_count=20, return_count=5)
+            result['lowest_pe_peers'] = lowest_peers
             
-            if lowest_pe:
+            if lowest_peers:
                 print(f"   ✓ Lowest 5 P/E ratios in {sector}:")
-                for i, peer in enumerate(lowest_pe, 1):
+                for i, peer in enumerate(lowest_peers, 1):
                     print(f"      {i}. {peer['symbol']}: P/E = {peer['pe_ratio']:.2f}")
         
         print(f"\n   ✅ Sector analysis complete for {symbol}")
@@ -1,51 +1,71 @@
 """Service for sector analysis and weightage calculation"""
 from config.settings import rest_api
+from services.asset_metadata_service import get_asset_metadata
+from services.snapshot_service import get_snapshot
+from utils.cache import get_cache
+
+_SECTOR_INFO = get_cache('sector_info')
 
 
 def get_sector_info(symbol: str) -> dict:
-    """Get sector and estimated weightage for a stock dynamically from Alpaca API"""
+    """Get sector and estimated weightage for a stock from the asset metadata store
+    
+    Cached per symbol for a day (CACHE_NAMESPACES['sector_info']), so repeated
+    pipeline runs and Grok streams don't re-estimate the weightage with live quotes.
+    """
     
     try:
-        # Get asset info from Alpaca
-        asset = rest_api.get_asset(symbol)
-        
-        # Extract sector from asset attributes
-        sector = None
-        industry = None
-        
-        # Debug: print all asset attributes to see what's available
-        print(f"   📊 Asset attributes for {symbol}: {dir(asset)}")
-        
-        # Try multiple attribute names that Alpaca might use
-        for attr in ['sector', 'Sector', 'classification', 'industry_group']:
-            if hasattr(asset, attr):
-                val = getattr(asset, attr)
-                if val:
-                    sector = val
-                    print(f"   ✓ Found sector from {attr}: {sector}")
-                    break
-        
-        # Try to get industry
-        for attr in ['industry', 'Industry', 'sub_industry', 'industry_classification']:
-            if hasattr(asset, attr):
-                val = getattr(asset, attr)
-                if val:
-                    industry = val
-                    print(f"   ✓ Found industry from {attr}: {industry}")
-                    break
-        
-        # Fallback: Use exchange-based category if nothing else available
-        if not sector:
-            exchange = getattr(asset, 'exchange', 'UNKNOWN')
-            if exchange != 'UNKNOWN':
-                sector = f"{exchange} Listed"
-                print(f"   ⚠️  Using exchange-based fallback: {sector}")
-            else:
-                sector = "General"
-                print(f"   ⚠️  No sector data available, using: {sector}")
-        
-        # Get market cap estimate from latest quote
-        market_cap_estimate = None
+        return _SECTOR_INFO.get_or_load(symbol.upper(), lambda: _load_sector_info(symbol))
+    except Exception as e:
+        print(f"   ⚠️  Error getting sector info for {symbol}: {e}")
+        return {
+            "sector": "Unknown",
+            "industry": "Not specified",
+            "weightage": 0.0
+        }
+
+
+def _load_sector_info(symbol: str) -> dict:
+    """Sector, industry and weightage for a symbol (raises for unknown symbols; nothing is cached)"""
+    # Asset info from the local metadata store
+    asset = get_asset_metadata(symbol)
+    if asset is None:
+        raise ValueError(f"unknown symbol {symbol}")
+    
+    # Extract sector from asset attributes
+    sector = None
+    industry = None
+    
+    # Try multiple attribute names that Alpaca might use
+    for attr in ['sector', 'Sector', 'classification', 'industry_group']:
+        if asset.get(attr):
+            sector = asset[attr]
+            print(f"   ✓ Found sector from {attr}: {sector}")
+            break
+    
+    # Try to get industry
+    for attr in ['industry', 'Industry', 'sub_industry', 'industry_classification']:
+        if asset.get(attr):
+            industry = asset[attr]
+            print(f"   ✓ Found industry from {attr}: {industry}")
+            break
+    
+    # Fallback: Use exchange-based category if nothing else available
+    if not sector:
+        exchange = asset.get('exchange') or 'UNKNOWN'
+        if exchange != 'UNKNOWN':
+            sector = f"{exchange} Listed"
+            print(f"   ⚠️  Using exchange-based fallback: {sector}")
+        else:
+            sector = "General"
+            print(f"   ⚠️  No sector data available, using: {sector}")
+    
+    # Get market cap estimate from the cached snapshot price (latest quote if not cached)
+    market_cap_estimate = None
+    cached = get_snapshot(symbol)
+    if cached and cached.get('price'):
+        market_cap_estimate = float(cached['price'])
+    else:
         try:
             quote = rest_api.get_latest_quote(symbol)
             if quote and hasattr(quote, 'ask_price') and quote.ask_price:
@@ -53,24 +73,16 @@ def get_sector_info(symbol: str) -> dict:
                 market_cap_estimate = float(quote.ask_price)
         except Exception:
             pass
-        
-        # Calculate relative weightage based on market cap comparison
-        # Compare with other major stocks to estimate relative importance
-        weightage = estimate_relative_weightage(symbol, market_cap_estimate)
-        
-        return {
-            "sector": sector or "General",
-            "industry": industry or "Not specified",
-            "weightage": weightage
-        }
     
-    except Exception as e:
-        print(f"   ⚠️  Error getting sector info for {symbol}: {e}")
-        return {
-            "sector": "Unknown",
-            "industry": "Not specified",
-            "weightage": 0.0
-        }
+    # Calculate relative weightage based on market cap comparison
+    # Compare with other major stocks to estimate relative importance
+    weightage = estimate_relative_weightage(symbol, market_cap_estimate)
+    
+    return {
+        "sector": sector or "General",
+        "industry": industry or "Not specified",
+        "weightage": weightage
+    }
 
 
 def estimate_relative_weightage(symbol: str, price_estimate: float = None) -> float:
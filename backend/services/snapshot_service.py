@@ -0,0 +1,267 @@
+"""Quote snapshot store
+
+Single place where per-symbol quote snapshots are written, so listeners (such
+as the /ws/quotes push hub) hear about every change no matter which service
+produced it: the full fetch pipeline, the batch refresh or the live stream.
+
+Every change bumps a per-symbol sequence number and the last few versions are
+kept, so callers can ask for the field-level delta between any recent version
+and the current one instead of re-sending the whole snapshot.
+
+Each version is serialized to JSON at most once, on its first HTTP read,
+together with a content hash used as its ETag, so /api/quotes can return the
+bytes as-is. Versions nobody reads over HTTP (most streamed ticks) are never
+encoded.
+"""
+import gzip
+import hashlib
+import json
+import math
+import threading
+from collections import deque
+from config.settings import SNAPSHOT_HISTORY
+from utils.cache import get_cache
+
+_LISTENERS = []
+_EVICT_LISTENERS = []
+_SEQ = {}  # symbol -> current version number
+_HISTORY = {}  # symbol -> deque of (seq, snapshot), oldest first
+_ENCODED = {}  # symbol -> {'seq', 'body', 'etag', 'gzip'} for the latest version read over HTTP
+_LOCK = threading.RLock()  # re-entered by _on_evict when a write under it evicts a symbol
+
+# Size-bounded; an evicted symbol is simply fetched again on its next request
+_QUOTES = get_cache('quotes')
+
+
+def _on_evict(symbol: str):
+    """Drop the version history of an evicted snapshot (the seq counter is kept)"""
+    with _LOCK:
+        if symbol in _QUOTES:  # stored again since it was evicted
+            return
+        _HISTORY.pop(symbol, None)
+        _ENCODED.pop(symbol, None)
+    for callback in _EVICT_LISTENERS:
+        try:
+            callback(symbol)
+        except Exception as e:
+            print(f"⚠️  Snapshot evict listener error: {e}")
+
+
+_QUOTES.on_evict = _on_evict
+
+
+def add_listener(callback):
+    """Register `callback(symbol)` to be called after a snapshot changes (any thread)"""
+    _LISTENERS.append(callback)
+
+
+def add_evict_listener(callback):
+    """Register `callback(symbol)` to drop per-symbol state when its snapshot is evicted (any thread)"""
+    _EVICT_LISTENERS.append(callback)
+
+
+def get_snapshot(symbol: str) -> dict:
+    """Latest snapshot for a symbol, or None if it was never fetched"""
+    return _QUOTES.get(symbol)
+
+
+def get_seq(symbol: str) -> int:
+    """Current version number of a symbol's snapshot (0 if never fetched)"""
+    return _SEQ.get(symbol, 0)
+
+
+def get_encoded_snapshot(symbol: str) -> dict:
+    """Current snapshot as pre-serialized JSON: {'seq', 'body', 'etag', 'gzip'}, or None
+    
+    Encoded on the first call for a version (outside the lock) and reused by
+    later calls. `gzip` starts as None; use gzip_body() to compress a version once.
+    """
+    with _LOCK:
+        history = _HISTORY.get(symbol)
+        if not history:
+            return None
+        seq, data = history[-1]
+        encoded = _ENCODED.get(symbol)
+        if encoded is not None and encoded['seq'] == seq:
+            return encoded
+    
+    encoded = _encode(seq, data)
+    with _LOCK:
+        current = _ENCODED.get(symbol)
+        if current is not None and current['seq'] >= seq:
+            return current if current['seq'] == seq else encoded
+        if symbol in _HISTORY:
+            _ENCODED[symbol] = encoded
+    return encoded
+
+
+def gzip_body(encoded: dict) -> bytes:
+    """Gzipped body of an encoded snapshot, compressed once per version"""
+    body = encoded['gzip']
+    if body is None:
+        body = gzip.compress(encoded['body'], compresslevel=5)
+        with _LOCK:
+            if encoded['gzip'] is None:
+                encoded['gzip'] = body
+            body = encoded['gzip']
+    return body
+
+
+def _json_safe(value):
+    """Copy of a snapshot with NaN/Infinity replaced by None (not valid JSON)"""
+    if isinstance(value, dict):
+        return {k: _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _encode(seq: int, data: dict) -> dict:
+    """Serialize a snapshot version (same JSON settings as FastAPI's JSONResponse)"""
+    try:
+        text = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=str)
+    except ValueError:
+        # e.g. an EMA that came out NaN: send null rather than invalid JSON
+        text = json.dumps(_json_safe(data), ensure_ascii=False, allow_nan=False, separators=(',', ':'), default=str)
+    body = text.encode('utf-8')
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    return {'seq': seq, 'body': body, 'etag': etag, 'gzip': None}
+
+
+def get_versioned_snapshot(symbol: str, seq: int = None) -> tuple:
+    """(seq, snapshot) for a specific recent version, or the current one if seq is None
+    
+    Returns (None, None) if that version is no longer kept.
+    """
+    with _LOCK:
+        history = _HISTORY.get(symbol)
+        if not history:
+            return None, None
+        if seq is None:
+            return history[-1]
+        for version, data in history:
+            if version == seq:
+                return version, data
+    return None, None
+
+
+def compute_delta(old: dict, new: dict) -> dict:
+    """Field-level diff between two snapshots
+    
+    `changes` holds only the changed leaves, nested like the snapshot itself
+    (lists are treated as single values); `removed` lists the key paths that
+    no longer exist. Applying it with apply_delta() turns `old` into `new`.
+    """
+    changes = {}
+    removed = []
+    _diff(old, new, [], changes, removed)
+    return {'changes': changes, 'removed': removed}
+
+
+def _diff(old: dict, new: dict, path: list, changes: dict, removed: list):
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = {}
+            _diff(old[key], value, path + [key], nested, removed)
+            if nested:
+                changes[key] = nested
+        elif old[key] != value:
+            changes[key] = value
+    for key in old:
+        if key not in new:
+            removed.append(path + [key])
+
+
+def apply_delta(snapshot: dict, delta: dict) -> dict:
+    """Apply a compute_delta() result to a snapshot (returns a new dict)"""
+    result = _merge(snapshot, delta['changes'])
+    for path in delta['removed']:
+        result = _remove(result, path)
+    return result
+
+
+def _remove(data: dict, path: list) -> dict:
+    """Copy of `data` without the key at `path` (nested dicts are copied, not mutated)"""
+    if not isinstance(data, dict) or path[0] not in data:
+        return data
+    copy = dict(data)
+    if len(path) == 1:
+        del copy[path[0]]
+    else:
+        copy[path[0]] = _remove(copy[path[0]], path[1:])
+    return copy
+
+
+def _merge(base: dict, changes: dict) -> dict:
+    merged = dict(base)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def get_delta(symbol: str, since: int) -> dict:
+    """Delta from version `since` to the current version
+    
+    Returns None when `since` is too old (or unknown) and the caller should
+    send a full snapshot instead.
+    """
+    base_seq, base = get_versioned_snapshot(symbol, since)
+    if base is None:
+        return None
+    seq, current = get_versioned_snapshot(symbol)
+    delta = compute_delta(base, current) if seq != base_seq else {'changes': {}, 'removed': []}
+    return {'seq': seq, 'base': base_seq, **delta}
+
+
+def save_snapshot(symbol: str, data: dict):
+    """Store a full snapshot and notify listeners (no-op if nothing changed)"""
+    with _LOCK:
+        if not _store(symbol, data):
+            return
+    _notify(symbol)
+
+
+def update_snapshot(symbol: str, fields: dict) -> bool:
+    """Merge fields into an existing snapshot; returns False if there is none
+    
+    The entry is replaced rather than mutated, since a request may be
+    serializing the previous version at the same time. Listeners are only
+    notified when a value actually changed.
+    """
+    with _LOCK:
+        cached = _QUOTES.get(symbol)
+        if not cached:
+            return False
+        if all(cached.get(k) == v for k, v in fields.items()):
+            return True
+        _store(symbol, {**cached, **fields})
+    _notify(symbol)
+    return True
+
+
+def _store(symbol: str, data: dict) -> bool:
+    """Record a new version if it differs from the current one (caller holds _LOCK)"""
+    current = _QUOTES.get(symbol)
+    if current is not None and current == data:
+        return False
+    seq = _SEQ.get(symbol, 0) + 1
+    _SEQ[symbol] = seq
+    _HISTORY.setdefault(symbol, deque(maxlen=SNAPSHOT_HISTORY)).append((seq, data))
+    _QUOTES.set(symbol, data)
+    return True
+
+
+def _notify(symbol: str):
+    """Tell listeners a snapshot changed"""
+    for callback in _LISTENERS:
+        try:
+            callback(symbol)
+        except Exception as e:
+            print(f"⚠️  Snapshot listener error: {e}")
@@ -0,0 +1,188 @@
+"""Real-time market data ingestion from the Alpaca WebSocket stream
+
+Subscribes to trades, quotes and minute bars for the tracked symbols and keeps
+an in-memory live quote per symbol, updating cached snapshots and the intraday
+bar store as messages arrive. Reconnects with backoff and resubscribes.
+ALPACA_STREAM_URL can point at utils/fake_alpaca_stream.py for local testing.
+"""
+import asyncio
+import json
+import time
+import websockets
+from config.settings import (
+    API_KEY, SECRET_KEY, ALPACA_STREAM_URL,
+    STREAM_RECONNECT_MAX_DELAY, STREAM_QUOTE_MAX_AGE,
+)
+from services.ema_service import get_provisional_emas
+from services.intraday_bar_service import append_stream_bar
+from services.snapshot_service import get_snapshot, update_snapshot
+
+# symbol -> {'price', 'bid', 'ask', 'bidSize', 'askSize', 'timestamp', 'updated_at'}
+LIVE_QUOTES = {}
+
+_WANTED = set()  # symbols that should be subscribed
+_SUBSCRIBED = set()  # symbols confirmed by the server on the current connection
+_state = {'loop': None, 'changed': None, 'connected': False}
+
+
+def subscribe_symbols(symbols: list):
+    """Add symbols to the stream (safe to call from any thread)"""
+    new = {s.upper() for s in symbols} - _WANTED
+    if not new:
+        return
+    _WANTED.update(new)
+    _notify_changed()
+
+
+def unsubscribe_symbols(symbols: list):
+    """Remove symbols from the stream (safe to call from any thread)"""
+    removed = {s.upper() for s in symbols} & _WANTED
+    if not removed:
+        return
+    _WANTED.difference_update(removed)
+    for symbol in removed:
+        LIVE_QUOTES.pop(symbol, None)
+    _notify_changed()
+
+
+def _notify_changed():
+    """Wake the connection task so it syncs its subscriptions"""
+    loop, changed = _state['loop'], _state['changed']
+    if loop and changed:
+        loop.call_soon_threadsafe(changed.set)
+
+
+def get_live_quote(symbol: str, max_age: float = STREAM_QUOTE_MAX_AGE) -> dict:
+    """Latest streamed quote if it is fresh enough, else None"""
+    live = LIVE_QUOTES.get(symbol)
+    if not live or not _state['connected'] or time.monotonic() - live['updated_at'] > max_age:
+        return None
+    if not live.get('price'):
+        return None
+    return live
+
+
+def _apply_to_cache(symbol: str, live: dict):
+    """Fan a streamed price update into the cached snapshot"""
+    cached = get_snapshot(symbol)
+    if not cached:
+        return
+    fields = {k: live[k] for k in ('price', 'bid', 'ask', 'bidSize', 'askSize', 'timestamp') if k in live}
+    price = fields.get('price')
+    if price and cached.get('dayHigh'):
+        fields['dayHigh'] = round(max(cached['dayHigh'], price), 2)
+        fields['dayLow'] = round(min(cached['dayLow'], price), 2)
+    if price and cached.get('week52High'):
+        fields['week52High'] = round(max(cached['week52High'], price), 2)
+        fields['week52Low'] = round(min(cached['week52Low'], price), 2)
+    if price and cached.get('provisionalEmas'):
+        fields['provisionalEmas'] = get_provisional_emas(symbol, price)
+    update_snapshot(symbol, fields)
+
+
+def handle_message(msg: dict):
+    """Apply one stream message (trade, quote or bar) to the in-memory state"""
+    kind = msg.get('T')
+    symbol = msg.get('S')
+    
+    if kind == 't':
+        live = LIVE_QUOTES.setdefault(symbol, {})
+        live['price'] = float(msg.get('p') or 0)
+        live['timestamp'] = msg.get('t', '')
+        live['updated_at'] = time.monotonic()
+        _apply_to_cache(symbol, live)
+    elif kind == 'q':
+        live = LIVE_QUOTES.setdefault(symbol, {})
+        live['bid'] = float(msg.get('bp') or 0)
+        live['ask'] = float(msg.get('ap') or 0)
+        live['bidSize'] = int(msg.get('bs') or 0)
+        live['askSize'] = int(msg.get('as') or 0)
+        live['updated_at'] = time.monotonic()
+        _apply_to_cache(symbol, live)
+    elif kind == 'b':
+        append_stream_bar(symbol, msg['t'], {
+            'open': msg.get('o'),
+            'high': msg.get('h'),
+            'low': msg.get('l'),
+            'close': msg.get('c'),
+            'volume': msg.get('v'),
+        })
+    elif kind == 'subscription':
+        _SUBSCRIBED.clear()
+        _SUBSCRIBED.update(msg.get('trades', []))
+    elif kind == 'error':
+        print(f"⚠️  Stream error {msg.get('code')}: {msg.get('msg')}")
+
+
+async def _expect(ws, expected_msg: str):
+    """Wait for a control message such as 'connected' or 'authenticated'"""
+    for msg in json.loads(await ws.recv()):
+        if msg.get('T') == 'error':
+            raise ConnectionError(f"{msg.get('code')} {msg.get('msg')}")
+        if msg.get('T') == 'success' and msg.get('msg') == expected_msg:
+            return
+    raise ConnectionError(f"Expected '{expected_msg}' from stream")
+
+
+async def _sync_subscriptions(ws):
+    """Send subscribe/unsubscribe messages whenever the wanted set changes"""
+    while True:
+        wanted = set(_WANTED)
+        to_add = sorted(wanted - _SUBSCRIBED)
+        to_remove = sorted(_SUBSCRIBED - wanted)
+        if to_add:
+            await ws.send(json.dumps({'action': 'subscribe', 'trades': to_add, 'quotes': to_add, 'bars': to_add}))
+            _SUBSCRIBED.update(to_add)
+        if to_remove:
+            await ws.send(json.dumps({'action': 'unsubscribe', 'trades': to_remove, 'quotes': to_remove, 'bars': to_remove}))
+            _SUBSCRIBED.difference_update(to_remove)
+        _state['changed'].clear()
+        await _state['changed'].wait()
+
+
+async def _run_connection(url: str):
+    """One connection lifetime: connect, authenticate, subscribe, read until closed"""
+    async with websockets.connect(url, ping_interval=20, max_queue=1024) as ws:
+        await _expect(ws, 'connected')
+        await ws.send(json.dumps({'action': 'auth', 'key': API_KEY, 'secret': SECRET_KEY}))
+        await _expect(ws, 'authenticated')
+        
+        _SUBSCRIBED.clear()
+        _state['connected'] = True
+        print(f"📡 Stream connected ({url}), {len(_WANTED)} symbols")
+        
+        syncer = asyncio.create_task(_sync_subscriptions(ws))
+        try:
+            async for raw in ws:
+                for msg in json.loads(raw):
+                    try:
+                        handle_message(msg)
+                    except Exception as e:
+                        print(f"⚠️  Stream message error: {e}")
+        finally:
+            _state['connected'] = False
+            syncer.cancel()
+
+
+async def run_stream(symbols: list = None, url: str = ALPACA_STREAM_URL):
+    """Keep the stream connected forever, reconnecting with exponential backoff"""
+    _state['loop'] = asyncio.get_running_loop()
+    _state['changed'] = asyncio.Event()
+    subscribe_symbols(symbols or [])
+    
+    delay = 1
+    while True:
+        started = time.monotonic()
+        try:
+            await _run_connection(url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  Stream disconnected: {e}")
+        
+        # Reset the backoff after a connection that stayed up for a while
+        if time.monotonic() - started > 60:
+            delay = 1
+        print(f"📡 Stream reconnecting in {delay}s...")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STREAM_RECONNECT_MAX_DELAY)
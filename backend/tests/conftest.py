@@ -0,0 +1,10 @@
+"""Test setup: import the backend packages with dummy credentials and a throwaway data directory"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("ALPACA_API_KEY", "test")
+os.environ.setdefault("ALPACA_SECRET_KEY", "test")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="tbot-tests-")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,119 @@
+import time
+import pytest
+from utils import cache, persistent_cache
+from utils.cache import CacheNamespace
+
+
+class FakeClock:
+    """Stands in for the time module in utils.cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache, 'time', fake)
+    return fake
+
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_fresh_stale_expired(clock):
+    ns = CacheNamespace('test_ttl', ttl=10, stale_ttl=20)
+    ns.set('a', 1)
+    assert ns.get('a') == 1
+    clock.now += 15
+    assert ns.get('a') is None
+    assert ns.get('a', allow_stale=True) == 1
+    clock.now += 20
+    assert ns.get('a', allow_stale=True) is None
+    assert 'a' not in ns
+    assert ns.stats['expirations'] == 1
+
+
+def test_get_or_load_serves_stale_and_revalidates(clock):
+    ns = CacheNamespace('test_revalidate', ttl=10, stale_ttl=100)
+    assert ns.get_or_load('a', lambda: 'v1') == 'v1'
+    clock.now += 15
+    assert ns.get_or_load('a', lambda: 'v2') == 'v1'
+    _wait_until(lambda: ns.get('a') == 'v2')
+    assert ns.stats['loads'] == 2
+
+
+def test_get_or_load_skips_none():
+    ns = CacheNamespace('test_none', ttl=10)
+    assert ns.get_or_load('a', lambda: None) is None
+    assert len(ns) == 0
+
+
+def test_lru_eviction_calls_on_evict_outside_the_lock():
+    ns = CacheNamespace('test_evict', ttl=None, max_entries=2)
+    evicted = []
+
+    def on_evict(key):
+        assert not ns._lock.locked()
+        evicted.append(key)
+
+    ns.on_evict = on_evict
+    ns.set('a', 1)
+    ns.set('b', 2)
+    ns.get('a')  # 'b' is now least recently used
+    ns.set('c', 3)
+    assert evicted == ['b']
+    assert 'a' in ns and 'c' in ns and len(ns) == 2
+
+    ns.delete('a')
+    ns.clear()
+    assert evicted == ['b', 'a', 'c']
+    assert ns.stats['evictions'] == 1
+
+
+def test_persisted_entries_survive_a_new_namespace():
+    ns = CacheNamespace('test_persist', ttl=3600, persist=True)
+    ns.set('AAPL', {'pe': 30.5})
+
+    restarted = CacheNamespace('test_persist', ttl=3600, persist=True)
+    assert restarted.get('AAPL') == {'pe': 30.5}
+    assert restarted.stats['disk_hits'] == 1
+
+
+def test_persisted_restore_respects_max_entries():
+    writer = CacheNamespace('test_persist_max', ttl=3600, persist=True)
+    for key in ('a', 'b', 'c'):
+        writer.set(key, key)
+
+    reader = CacheNamespace('test_persist_max', ttl=3600, max_entries=2, persist=True)
+    for key in ('a', 'b', 'c'):
+        assert reader.get(key) == key
+    assert len(reader) == 2
+    assert reader.stats['evictions'] == 1
+
+
+def test_missing_persisted_keys_are_remembered(monkeypatch):
+    reads = []
+    load = persistent_cache.load
+    monkeypatch.setattr(persistent_cache, 'load', lambda kind, key: reads.append(key) or load(kind, key))
+
+    ns = CacheNamespace('test_persist_missing', ttl=3600, persist=True)
+    assert ns.get('nope') is None
+    assert ns.get('nope') is None
+    assert reads == ['nope']
+    assert ns.stats['misses'] == 2
+
+    ns.set('nope', 1)
+    ns.delete('nope')
+    assert ns.get('nope') is None
+    assert reads == ['nope', 'nope']
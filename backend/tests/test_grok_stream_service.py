@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from services import grok_stream_service
+
+
+class FakeUpstream:
+    """Stands in for stream_grok_analysis: yields 'a', then 'b' once released"""
+
+    def __init__(self):
+        self.started = 0
+        self.closed = 0
+        self.release = None
+
+    async def __call__(self, symbol, *args):
+        self.started += 1
+        try:
+            yield f"{symbol}:a"
+            await self.release.wait()
+            yield f"{symbol}:b"
+        finally:
+            self.closed += 1
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeUpstream()
+    monkeypatch.setattr(grok_stream_service, '_BROADCASTS', {})
+    monkeypatch.setattr(grok_stream_service, 'stream_grok_analysis', fake)
+    monkeypatch.setattr(grok_stream_service, 'cached_analysis', lambda key: None)
+    monkeypatch.setattr(grok_stream_service, 'news_fingerprint', lambda symbol, *args: f"fp-{symbol}")
+    return fake
+
+
+async def _collect(symbol: str) -> list:
+    return [event async for event in grok_stream_service.subscribe_grok_stream(symbol, [], [])]
+
+
+def test_subscribers_share_one_upstream_stream(upstream):
+    async def scenario():
+        upstream.release = asyncio.Event()
+        first = asyncio.create_task(_collect('AAPL'))
+        await asyncio.sleep(0.01)
+        # Joins after 'a' was published: gets it replayed
+        second = asyncio.create_task(_collect('AAPL'))
+        await asyncio.sleep(0.01)
+        assert grok_stream_service.stream_stats() == {
+            'fp-AAPL': {'symbol': 'AAPL', 'subscribers': 2, 'events': 1}}
+        upstream.release.set()
+        return await asyncio.wait_for(asyncio.gather(first, second), 2)
+
+    results = asyncio.run(scenario())
+    assert results == [['AAPL:a', 'AAPL:b'], ['AAPL:a', 'AAPL:b']]
+    assert upstream.started == 1 and upstream.closed == 1
+    assert grok_stream_service._BROADCASTS == {}
+
+
+def test_last_subscriber_leaving_cancels_the_upstream(upstream):
+    async def scenario():
+        upstream.release = asyncio.Event()
+        stream = grok_stream_service.subscribe_grok_stream('AAPL', [], [])
+        assert await stream.__anext__() == 'AAPL:a'
+        broadcast = grok_stream_service._BROADCASTS['fp-AAPL']
+        await stream.aclose()  # client went away
+        await asyncio.wait([broadcast.task], timeout=2)
+        return broadcast
+
+    broadcast = asyncio.run(scenario())
+    assert broadcast.task.cancelled()
+    assert upstream.closed == 1
+    assert grok_stream_service._BROADCASTS == {}
+
+
+def test_one_subscriber_leaving_keeps_the_stream_for_the_others(upstream):
+    async def scenario():
+        upstream.release = asyncio.Event()
+        staying = asyncio.create_task(_collect('AAPL'))
+        leaving = grok_stream_service.subscribe_grok_stream('AAPL', [], [])
+        assert await leaving.__anext__() == 'AAPL:a'
+        await leaving.aclose()
+        upstream.release.set()
+        return await asyncio.wait_for(staying, 2)
+
+    assert asyncio.run(scenario()) == ['AAPL:a', 'AAPL:b']
+    assert upstream.started == 1
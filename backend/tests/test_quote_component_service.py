@@ -0,0 +1,101 @@
+from datetime import date, datetime
+import pytest
+from services import quote_component_service as components
+from services.quote_component_service import STALE, lookup_component, store_component, trigger_key
+from services.snapshot_service import _QUOTES, save_snapshot
+
+
+class FakeTime:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeDatetime:
+    today = date(2026, 3, 2)
+
+    @classmethod
+    def now(cls):
+        return datetime(cls.today.year, cls.today.month, cls.today.day, 12, 0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_store(monkeypatch):
+    monkeypatch.setattr(components, '_COMPONENTS', {})
+
+
+def test_tick_components_are_always_recomputed():
+    assert trigger_key('AAPL', 'price') is None
+    store_component('AAPL', 'price', None, {'price': 1})
+    assert lookup_component('AAPL', 'price') == (None, STALE)
+
+
+def test_bar_components_move_with_their_bucket(monkeypatch):
+    clock = FakeTime(3600 * 1000 + 30)
+    monkeypatch.setattr(components, 'time', clock)
+    key, value = lookup_component('AAPL', 'day_range')
+    assert value is STALE
+    store_component('AAPL', 'day_range', key, {'dayHigh': 2, 'dayLow': 1})
+
+    clock.now += 20  # same minute
+    assert lookup_component('AAPL', 'day_range')[1] == {'dayHigh': 2, 'dayLow': 1}
+    assert lookup_component('AAPL', 'emas_hourly')[1] is STALE
+
+    clock.now += 20  # next minute
+    assert lookup_component('AAPL', 'day_range')[1] is STALE
+    assert trigger_key('AAPL', 'emas_hourly') == trigger_key('AAPL', 'emas_10min') // 6
+
+
+def test_day_components_move_with_the_local_date(monkeypatch):
+    monkeypatch.setattr(components, 'datetime', FakeDatetime)
+    key, _ = lookup_component('AAPL', 'week52')
+    assert key == date(2026, 3, 2)
+    store_component('AAPL', 'week52', key, {'week52High': 3})
+    assert lookup_component('AAPL', 'emas_daily')[1] is STALE
+    assert lookup_component('AAPL', 'week52')[1] == {'week52High': 3}
+
+    monkeypatch.setattr(FakeDatetime, 'today', date(2026, 3, 3))
+    assert lookup_component('AAPL', 'week52')[1] is STALE
+
+
+def test_news_components_move_with_the_news_version(monkeypatch):
+    version = {'AAPL': (3, '2026-03-02T10:00:00Z')}
+    monkeypatch.setattr(components, 'news_version', lambda symbol: version.get(symbol))
+    key, _ = lookup_component('AAPL', 'grok')
+    store_component('AAPL', 'grok', key, {'sentiment': 'bullish'})
+    assert lookup_component('AAPL', 'grok')[1] == {'sentiment': 'bullish'}
+
+    version['AAPL'] = (4, '2026-03-02T11:00:00Z')
+    assert lookup_component('AAPL', 'grok')[1] is STALE
+
+    version.pop('AAPL')  # no synced news (e.g. no Polygon key): one stable key
+    key, value = lookup_component('AAPL', 'grok')
+    assert value is STALE and key == 0
+    store_component('AAPL', 'grok', key, {'sentiment': 'neutral'})
+    assert lookup_component('AAPL', 'grok')[1] == {'sentiment': 'neutral'}
+
+
+def test_inputs_are_part_of_the_key(monkeypatch):
+    monkeypatch.setattr(components, 'time', FakeTime(3600 * 1000))
+    key, _ = lookup_component('AAPL', 'crossovers', (101.0, (('daily_ema_20', 100.0),)))
+    store_component('AAPL', 'crossovers', key, [{'ema': 'daily_ema_20'}])
+    assert lookup_component('AAPL', 'crossovers', (101.0, (('daily_ema_20', 100.0),)))[1] == [{'ema': 'daily_ema_20'}]
+    assert lookup_component('AAPL', 'crossovers', (99.0, (('daily_ema_20', 100.0),)))[1] is STALE
+    assert lookup_component('AAPL', 'crossovers', (101.0, (('daily_ema_20', 100.5),)))[1] is STALE
+
+
+def test_version_bumps_only_when_the_value_changes():
+    store_component('AAPL', 'company', 1, {'companyName': 'Apple'})
+    store_component('AAPL', 'company', 2, {'companyName': 'Apple'})
+    assert components.component_versions('AAPL') == {'company': 1}
+    store_component('AAPL', 'company', 3, {'companyName': 'Apple Inc.'})
+    assert components.component_versions('AAPL') == {'company': 2}
+
+
+def test_components_are_dropped_with_the_quote_snapshot():
+    store_component('ZZTEST', 'company', 1, {'companyName': 'Test'})
+    save_snapshot('ZZTEST', {'symbol': 'ZZTEST', 'price': 1})
+    _QUOTES.delete('ZZTEST')
+    assert components.component_versions('ZZTEST') == {}
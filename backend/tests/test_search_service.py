@@ -0,0 +1,51 @@
+from services.search_service import AssetIndex
+
+
+def _record(symbol: str, name: str) -> dict:
+    return {'symbol': symbol, 'name': name, 'exchange': 'NASDAQ', 'liquidity': 1.0}
+
+
+def _symbols(index: AssetIndex, query: str) -> list:
+    return [result['symbol'] for result in index.search(query)]
+
+
+def test_search_matches_symbol_and_name():
+    index = AssetIndex([_record('AAPL', 'Apple Inc'), _record('NVDA', 'NVIDIA Corp'),
+                        _record('META', 'Meta Platforms Inc')])
+    assert _symbols(index, 'aapl') == ['AAPL']
+    assert _symbols(index, 'meta plat') == ['META']
+    assert _symbols(index, 'nvidia') == ['NVDA']
+
+
+def test_search_tolerates_typos():
+    index = AssetIndex([_record('AAPL', 'Apple Inc'), _record('NVDA', 'NVIDIA Corp')])
+    assert _symbols(index, 'nvida') == ['NVDA']
+    assert _symbols(index, 'appel') == ['AAPL']
+    assert _symbols(index, 'xqzw') == []
+
+
+
+def test_updated_reindexes_only_changes_and_leaves_the_old_index_alone():
+    old = AssetIndex([_record('AAPL', 'Apple Inc'), _record('NVDA', 'NVIDIA Corp'),
+                      _record('MSFT', 'Microsoft Corp')])
+    new = old.updated([_record('AAPL', 'Apple Computer Inc'), _record('MSFT', 'Microsoft Corp'),
+                       _record('AMD', 'Advanced Micro Devices')])
+
+    # AAPL renamed (removed + added), NVDA removed, AMD added
+    assert new.changes == 4
+    assert new.symbols == ['AAPL', 'AMD', 'MSFT']
+    assert _symbols(new, 'computer') == ['AAPL']
+    assert _symbols(new, 'advanced') == ['AMD']
+    assert _symbols(new, 'nvidia') == []
+    assert new.words == sorted(new.postings)
+
+    assert _symbols(old, 'nvidia') == ['NVDA']
+    assert _symbols(old, 'computer') == []
+    assert old.symbols == ['AAPL', 'MSFT', 'NVDA']
+
+
+def test_updated_without_changes():
+    records = [_record('AAPL', 'Apple Inc'), _record('NVDA', 'NVIDIA Corp')]
+    new = AssetIndex(records).updated(records)
+    assert new.changes == 0
+    assert _symbols(new, 'apple') == ['AAPL']
@@ -0,0 +1,102 @@
+import threading
+import time
+import pytest
+from utils.singleflight import get_group, single_flight
+
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def _run(fn, *args, **kwargs) -> tuple:
+    """Start fn in a thread; returns (thread, results list)"""
+    results = []
+
+    def target():
+        try:
+            results.append(fn(*args, **kwargs))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, results
+
+
+def test_concurrent_calls_share_one_run():
+    release = threading.Event()
+    runs = []
+
+    @single_flight('test_share')
+    def fetch(symbol):
+        runs.append(symbol)
+        release.wait(5)
+        return f"{symbol}-data"
+
+    group = get_group('test_share')
+    started = [_run(fetch, 'AAPL') for _ in range(5)]
+    _wait_until(lambda: group.stats['coalesced'] == 4)
+    release.set()
+    for thread, _ in started:
+        thread.join(5)
+
+    assert runs == ['AAPL']
+    assert [results for _, results in started] == [['AAPL-data']] * 5
+    assert not group.in_flight((('AAPL',), ()))
+
+
+def test_default_key_includes_kwargs():
+    release = threading.Event()
+    runs = []
+
+    @single_flight('test_kwargs')
+    def fetch(symbol, mode='full'):
+        runs.append(mode)
+        release.wait(5)
+        return mode
+
+    group = get_group('test_kwargs')
+    first = _run(fetch, 'AAPL', mode='full')
+    _wait_until(lambda: group.stats['calls'] == 1)
+    second = _run(fetch, 'AAPL', mode='quote')
+    _wait_until(lambda: group.stats['calls'] == 2)
+    release.set()
+    for thread, _ in (first, second):
+        thread.join(5)
+
+    assert sorted(runs) == ['full', 'quote']
+    assert first[1] == ['full'] and second[1] == ['quote']
+    assert group.stats['coalesced'] == 0
+
+
+def test_custom_key_accepts_kwargs():
+    @single_flight('test_custom_key', key=lambda *args, **kwargs: kwargs.get('symbol') or args[0])
+    def fetch(symbol):
+        return symbol
+
+    assert fetch(symbol='MSFT') == 'MSFT'
+    assert fetch('NVDA') == 'NVDA'
+
+
+def test_error_reaches_every_waiter():
+    release = threading.Event()
+
+    @single_flight('test_error')
+    def fetch(symbol):
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    group = get_group('test_error')
+    started = [_run(fetch, 'AAPL') for _ in range(3)]
+    _wait_until(lambda: group.stats['coalesced'] == 2)
+    release.set()
+    for thread, _ in started:
+        thread.join(5)
+
+    for _, results in started:
+        assert isinstance(results[0], ValueError)
+    with pytest.raises(ValueError):
+        fetch('AAPL')  # not stuck in flight after the failure
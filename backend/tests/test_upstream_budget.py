@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import pytest
+from utils.upstream_budget import BACKGROUND, INTERACTIVE, BudgetTimeout, ProviderBudget
+
+
+def _drained(per_minute: float) -> ProviderBudget:
+    """Budget with an empty bucket"""
+    budget = ProviderBudget('test', per_minute=per_minute, burst=1)
+    assert budget.try_acquire(BACKGROUND)
+    return budget
+
+
+def _wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_burst_then_empty():
+    budget = ProviderBudget('test', per_minute=60, burst=2)
+    assert budget.try_acquire(BACKGROUND)
+    assert budget.try_acquire(INTERACTIVE)
+    assert not budget.try_acquire(INTERACTIVE)
+    assert budget.stats['requests'] == 2
+
+
+def test_interactive_waiters_go_before_background():
+    budget = _drained(per_minute=600)  # a token every 0.1s
+    order = []
+
+    def worker(name, level):
+        budget.acquire(level)
+        order.append(name)
+
+    threads = [threading.Thread(target=worker, args=('bg1', BACKGROUND))]
+    threads[0].start()
+    _wait_until(lambda: len(budget._waiting) == 1)
+    threads.append(threading.Thread(target=worker, args=('bg2', BACKGROUND)))
+    threads[1].start()
+    _wait_until(lambda: len(budget._waiting) == 2)
+    threads.append(threading.Thread(target=worker, args=('int', INTERACTIVE)))
+    threads[2].start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ['int', 'bg1', 'bg2']
+    assert budget.get_stats()['queue_depth'] == {'interactive': 0, 'background': 0}
+
+
+def test_deadline_leaves_the_queue():
+    budget = _drained(per_minute=1)
+    with pytest.raises(BudgetTimeout):
+        budget.acquire(BACKGROUND, deadline=time.monotonic() + 0.05)
+    assert budget._waiting == []
+    assert budget.stats['timed_out'] == 1
+
+
+def test_throttled_blocks_until_retry_after():
+    budget = ProviderBudget('test', per_minute=6000, burst=5)
+    budget.throttled(retry_after=60)
+    assert not budget.try_acquire(INTERACTIVE)
+    assert budget.stats['throttled'] == 1
+
+
+def test_async_waiter_is_woken_in_priority_order():
+    async def scenario():
+        budget = _drained(per_minute=600)
+        order = []
+
+        async def waiter(name, level):
+            await budget.acquire_async(level)
+            order.append(name)
+
+        background = asyncio.create_task(waiter('bg', BACKGROUND))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(waiter('int', INTERACTIVE))
+        await asyncio.wait_for(asyncio.gather(background, interactive), 2)
+        return order, budget
+
+    order, budget = asyncio.run(scenario())
+    assert order == ['int', 'bg']
+    assert budget._waiting == [] and budget._async_waiters == {}
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    async def scenario():
+        budget = _drained(per_minute=1)
+        task = asyncio.create_task(budget.acquire_async(BACKGROUND))
+        await asyncio.sleep(0.01)
+        assert len(budget._waiting) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return budget
+
+    budget = asyncio.run(scenario())
+    assert budget._waiting == [] and budget._async_waiters == {}
+    assert budget.stats['requests'] == 1
@@ -0,0 +1,252 @@
+"""Namespaced in-memory cache with TTLs, LRU eviction and stale-while-revalidate
+
+Each namespace (quotes, sector, grok, news, ...) has its own TTL and size limit
+from CACHE_NAMESPACES. Entries past their TTL but within `stale_ttl` are still
+served by get_or_load() while a single background refresh replaces them, so a
+slow upstream never blocks a request that already has a usable value.
+
+Namespaces with `persist` enabled also write through to the SQLite store in
+utils/persistent_cache.py and read from it on a memory miss, so their entries
+survive restarts. SQLite is read outside the namespace lock, and keys it does
+not have are remembered (up to max_entries) so repeated misses stay in memory.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import CACHE_NAMESPACES
+from utils import persistent_cache
+from utils.singleflight import get_group
+
+# Background revalidation of stale entries
+_REVALIDATE_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-revalidate")
+
+_NAMESPACES = {}
+_NAMESPACES_LOCK = threading.Lock()
+
+
+class CacheNamespace:
+    """One bounded cache namespace (thread-safe)"""
+
+    def __init__(self, name: str, ttl: float = None, stale_ttl: float = 0, max_entries: int = 1000,
+                 persist: bool = False):
+        self.name = name
+        self.ttl = ttl  # None = entries never expire by age (size-bounded only)
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.persist = persist  # write through to SQLite (string keys, JSON values)
+        self.on_evict = None  # optional callback(key) when an entry is evicted, expires or is deleted
+        self._evicted = []  # keys dropped under the lock whose on_evict has not run yet
+        self._entries = OrderedDict()  # key -> (value, stored_at), least recently used first
+        self._absent = OrderedDict()  # keys known not to be in SQLite (persist only), oldest first
+        self._writes = 0  # bumped by every set/delete, so a slow SQLite read can tell it raced one
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0, 'expirations': 0,
+                      'loads': 0, 'errors': 0}
+
+    def _age_state(self, stored_at: float) -> str:
+        """'fresh', 'stale' or 'expired' for an entry's age"""
+        if self.ttl is None:
+            return 'fresh'
+        age = time.monotonic() - stored_at
+        if age < self.ttl:
+            return 'fresh'
+        if age < self.ttl + self.stale_ttl:
+            return 'stale'
+        return 'expired'
+
+    def _lookup(self, key) -> tuple:
+        """(value, state) from memory with state 'fresh', 'stale' or None (caller holds _lock)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        state = self._age_state(entry[1])
+        if state == 'expired':
+            self._drop(key)
+            self.stats['expirations'] += 1
+            return None, None
+        self._entries.move_to_end(key)
+        self.stats['hits' if state == 'fresh' else 'stale_hits'] += 1
+        return entry[0], state
+
+    def _read(self, key) -> tuple:
+        """(value, state) from memory, else (persist namespaces) from SQLite; counts misses"""
+        with self._lock:
+            value, state = self._lookup(key)
+            if state is not None:
+                return value, state
+            check_disk = self.persist and key not in self._absent
+            writes = self._writes
+        if check_disk:
+            entry = self._load_persisted(key)  # disk I/O without holding the lock
+            with self._lock:
+                if entry is not None:
+                    if key not in self._entries:
+                        self._entries[key] = entry
+                        self._evict_over_limit()
+                        self.stats['disk_hits'] += 1
+                    value, state = self._lookup(key)
+                elif writes == self._writes:
+                    self._absent[key] = True
+                    while len(self._absent) > self.max_entries:
+                        self._absent.popitem(last=False)
+        self._run_evicted()
+        if state is not None:
+            return value, state
+        with self._lock:
+            self.stats['misses'] += 1
+        return None, None
+
+    def _load_persisted(self, key) -> tuple:
+        """Entry for `key` from SQLite with its original age, or None"""
+        try:
+            value, stored_at = persistent_cache.load(self.name, key)
+        except Exception as e:
+            print(f"⚠️  Persistent cache read error ({self.name}:{key}): {e}")
+            return None
+        if stored_at is None:
+            return None
+        return value, time.monotonic() - (time.time() - stored_at)
+
+    def _evict_over_limit(self):
+        """Drop the least recently used entries over max_entries (caller holds _lock)"""
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.stats['evictions'] += 1
+
+    def _drop(self, key):
+        """Remove an entry and queue its on_evict (caller holds _lock)"""
+        del self._entries[key]
+        self._evicted.append(key)
+
+    def _run_evicted(self):
+        """Call on_evict for the queued keys, outside the lock (the owner takes its own locks)"""
+        if not self._evicted:
+            return
+        with self._lock:
+            keys, self._evicted = self._evicted, []
+        if self.on_evict:
+            for key in keys:
+                try:
+                    self.on_evict(key)
+                except Exception as e:
+                    print(f"⚠️  Cache evict callback error ({self.name}:{key}): {e}")
+
+    def get(self, key, default=None, allow_stale: bool = False):
+        """Cached value if fresh (or stale, with allow_stale), else `default`"""
+        value, state = self._read(key)
+        if state == 'fresh' or (state == 'stale' and allow_stale):
+            return value
+        return default
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries over max_entries"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            self._absent.pop(key, None)
+            self._writes += 1
+            self._evict_over_limit()
+        self._run_evicted()
+        if self.persist:
+            lifetime = self.ttl + self.stale_ttl if self.ttl is not None else None
+            try:
+                persistent_cache.store(self.name, key, value, time.time(), lifetime)
+            except Exception as e:
+                print(f"⚠️  Persistent cache write error ({self.name}:{key}): {e}")
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._writes += 1
+        self._run_evicted()
+        if self.persist:
+            persistent_cache.delete(self.name, key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._absent.clear()
+            self._writes += 1
+        self._run_evicted()
+        if self.persist:
+            persistent_cache.delete(self.name)
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and self._age_state(entry[1]) != 'expired'
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_or_load(self, key, loader):
+        """Cached value, or `loader()` on a miss (stored unless it returns None)
+        
+        A stale value is returned immediately and refreshed in the background
+        (one refresh per key at a time) and concurrent misses share one loader
+        call. Loader errors are counted and re-raised on a miss; a failed
+        background refresh keeps the stale value.
+        """
+        value, state = self._read(key)
+        with self._lock:
+            revalidate = state == 'stale' and key not in self._refreshing
+            if revalidate:
+                self._refreshing.add(key)
+        
+        if state == 'fresh':
+            return value
+        if state == 'stale':
+            if revalidate:
+                _REVALIDATE_EXECUTOR.submit(self._revalidate, key, loader)
+            return value
+        return self._load(key, loader)
+
+    def _load(self, key, loader):
+        # Concurrent misses for the same key share one load
+        return get_group(f"cache:{self.name}").do(key, self._load_now, key, loader)
+
+    def _load_now(self, key, loader):
+        self.stats['loads'] += 1
+        try:
+            value = loader()
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _revalidate(self, key, loader):
+        try:
+            self._load(key, loader)
+        except Exception as e:
+            print(f"   ⚠️  Cache refresh error ({self.name}:{key}): {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_stats(self) -> dict:
+        """Counters plus current size"""
+        with self._lock:
+            return {**self.stats, 'size': len(self._entries), 'max_entries': self.max_entries, 'ttl': self.ttl}
+
+
+def get_cache(name: str) -> CacheNamespace:
+    """Get (creating on first use) the namespace configured in CACHE_NAMESPACES"""
+    with _NAMESPACES_LOCK:
+        if name not in _NAMESPACES:
+            _NAMESPACES[name] = CacheNamespace(name, **CACHE_NAMESPACES.get(name, {}))
+        return _NAMESPACES[name]
+
+
+def cache_stats() -> dict:
+    """Stats for every namespace in use"""
+    with _NAMESPACES_LOCK:
+        namespaces = list(_NAMESPACES.values())
+    return {ns.name: ns.get_stats() for ns in namespaces}
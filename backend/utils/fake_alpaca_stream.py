@@ -0,0 +1,106 @@
+"""Local fake of the Alpaca market data WebSocket stream
+
+Speaks the same protocol as wss://stream.data.alpaca.markets/v2/iex (connected,
+auth, subscribe/unsubscribe, trade/quote/bar messages) and emits random-walk
+data for subscribed symbols. Point the backend at it with:
+
+    python -m utils.fake_alpaca_stream --port 8765
+    ALPACA_STREAM_URL=ws://localhost:8765 python server.py
+"""
+import argparse
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+import websockets
+
+
+def _now() -> str:
+    """RFC-3339 timestamp like the real stream"""
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class FakeStream:
+    """Fake stream server; `start()`/`stop()` for use from tests"""
+
+    def __init__(self, host: str = 'localhost', port: int = 8765, tick_interval: float = 0.2):
+        self.host = host
+        self.port = port
+        self.tick_interval = tick_interval
+        self.prices = {}
+        self.server = None
+
+    def _price(self, symbol: str) -> float:
+        """Random-walk price per symbol"""
+        price = self.prices.get(symbol, random.uniform(20, 500))
+        price = max(1.0, price * (1 + random.gauss(0, 0.0005)))
+        self.prices[symbol] = price
+        return round(price, 2)
+    
+    async def _handler(self, ws, path=None):
+        """One client: connected -> auth -> subscribe -> periodic messages"""
+        await ws.send(json.dumps([{'T': 'success', 'msg': 'connected'}]))
+        auth = json.loads(await ws.recv())
+        if auth.get('action') != 'auth':
+            await ws.send(json.dumps([{'T': 'error', 'code': 401, 'msg': 'not authenticated'}]))
+            return
+        await ws.send(json.dumps([{'T': 'success', 'msg': 'authenticated'}]))
+        
+        symbols = set()
+        sender = asyncio.create_task(self._send_ticks(ws, symbols))
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                requested = set(msg.get('trades', []))
+                if msg.get('action') == 'subscribe':
+                    symbols.update(requested)
+                elif msg.get('action') == 'unsubscribe':
+                    symbols.difference_update(requested)
+                listed = sorted(symbols)
+                await ws.send(json.dumps([{'T': 'subscription', 'trades': listed, 'quotes': listed, 'bars': listed}]))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            sender.cancel()
+    
+    async def _send_ticks(self, ws, symbols: set):
+        """Emit a trade and quote per symbol every tick, and a bar every minute"""
+        last_minute = None
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            batch = []
+            minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+            for symbol in list(symbols):
+                price = self._price(symbol)
+                batch.append({'T': 't', 'S': symbol, 'p': price, 's': random.randint(1, 500), 't': _now()})
+                batch.append({'T': 'q', 'S': symbol, 'bp': round(price - 0.01, 2), 'bs': random.randint(1, 10),
+                              'ap': round(price + 0.01, 2), 'as': random.randint(1, 10), 't': _now()})
+                if last_minute is not None and minute != last_minute:
+                    batch.append({'T': 'b', 'S': symbol, 'o': price, 'h': price, 'l': price, 'c': price,
+                                  'v': random.randint(100, 10000),
+                                  't': last_minute.isoformat().replace('+00:00', 'Z')})
+            last_minute = minute
+            if batch:
+                await ws.send(json.dumps(batch))
+    
+    async def start(self):
+        self.server = await websockets.serve(self._handler, self.host, self.port)
+        return self
+    
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def _main(host: str, port: int):
+    await FakeStream(host, port).start()
+    print(f"🧪 Fake Alpaca stream on ws://{host}:{port}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Alpaca market data stream")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(_main(args.host, args.port))
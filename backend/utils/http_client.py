@@ -0,0 +1,121 @@
+"""Shared outbound HTTP client for non-Alpaca upstreams (Grok, Polygon)
+
+One httpx.AsyncClient with keep-alive connection pooling, timeouts, HTTP/2 when
+the `h2` package is installed, and a per-host concurrency limit (HTTP_HOST_LIMITS).
+Async code uses `request()`/`stream()` directly; service functions running in
+worker threads use `request_sync()`, which runs the request on the server's
+event loop so everything shares the same pool. Without a running server (scripts)
+`request_sync()` falls back to a pooled synchronous client.
+
+Passing `provider` takes a slot from that provider's request budget first
+(utils/upstream_budget.py) and reports 429 responses to it.
+"""
+import asyncio
+import importlib.util
+import threading
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+from utils import upstream_budget
+from config.settings import (
+    HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE,
+    HTTP_HOST_LIMITS, HTTP_DEFAULT_HOST_LIMIT,
+)
+
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+_state = {'loop': None, 'client': None, 'sync_client': None}
+_HOST_SEMAPHORES = {}
+_SYNC_LOCK = threading.Lock()
+
+
+def _client_options() -> dict:
+    return {
+        'timeout': httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        'limits': httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        'http2': HTTP2_AVAILABLE,
+        'follow_redirects': True,
+    }
+
+
+def start():
+    """Create the shared async client on the running loop (call on server startup)"""
+    _state['loop'] = asyncio.get_running_loop()
+    _state['client'] = httpx.AsyncClient(**_client_options())
+    print(f"🌐 HTTP client ready (HTTP/2 {'on' if HTTP2_AVAILABLE else 'off'})")
+
+
+async def close():
+    """Close pooled connections (call on server shutdown)"""
+    client = _state['client']
+    _state.update(loop=None, client=None)
+    if client:
+        await client.aclose()
+
+
+def _client() -> httpx.AsyncClient:
+    if _state['client'] is None:
+        start()
+    return _state['client']
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    """Per-host concurrency limit (created lazily on the event loop)"""
+    host = urlsplit(url).hostname or ''
+    if host not in _HOST_SEMAPHORES:
+        _HOST_SEMAPHORES[host] = asyncio.Semaphore(HTTP_HOST_LIMITS.get(host, HTTP_DEFAULT_HOST_LIMIT))
+    return _HOST_SEMAPHORES[host]
+
+
+def _check_throttled(provider: str, response: httpx.Response):
+    """Report a 429 (with its Retry-After) to the provider's budget"""
+    if provider and response.status_code == 429:
+        retry_after = response.headers.get('retry-after', '')
+        upstream_budget.throttled(provider, float(retry_after) if retry_after.isdigit() else None)
+
+
+async def request(method: str, url: str, provider: str = None, **kwargs) -> httpx.Response:
+    """Send a request through the shared pool (response body fully read)"""
+    if provider:
+        await upstream_budget.acquire_async(provider)
+    async with _host_semaphore(url):
+        response = await _client().request(method, url, **kwargs)
+    _check_throttled(provider, response)
+    return response
+
+
+@asynccontextmanager
+async def stream(method: str, url: str, provider: str = None, **kwargs):
+    """Streaming request through the shared pool; holds a host slot until closed"""
+    if provider:
+        await upstream_budget.acquire_async(provider)
+    async with _host_semaphore(url):
+        async with _client().stream(method, url, **kwargs) as response:
+            _check_throttled(provider, response)
+            yield response
+
+
+def request_sync(method: str, url: str, provider: str = None, **kwargs) -> httpx.Response:
+    """Blocking request for code running in worker threads"""
+    if provider:
+        # Waits here, at this thread's priority, not on the event loop
+        upstream_budget.acquire(provider)
+        response = request_sync(method, url, **kwargs)
+        _check_throttled(provider, response)
+        return response
+    
+    loop = _state['loop']
+    if loop is not None and loop.is_running():
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not loop:
+            return asyncio.run_coroutine_threadsafe(request(method, url, **kwargs), loop).result()
+    
+    with _SYNC_LOCK:
+        if _state['sync_client'] is None:
+            options = _client_options()
+            options['http2'] = False
+            _state['sync_client'] = httpx.Client(**options)
+    return _state['sync_client'].request(method, url, **kwargs)
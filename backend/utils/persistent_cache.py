@@ -0,0 +1,98 @@
+"""SQLite backing store for persistent cache namespaces
+
+Entries are stored as JSON by (kind, key) with their write time and expiry, so
+fundamentals, sector and Grok analyses survive restarts. Cache namespaces with
+`persist` enabled write through to it and read from it on a memory miss;
+`run_cache_expiry()` deletes expired rows in the background.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from config.settings import CACHE_DB_PATH, CACHE_EXPIRY_INTERVAL
+
+_state = {'conn': None}
+_LOCK = threading.Lock()
+
+
+def _connection() -> sqlite3.Connection:
+    """Shared connection (opened and migrated on first use; caller holds _LOCK)"""
+    if _state['conn'] is None:
+        os.makedirs(os.path.dirname(CACHE_DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (kind, key)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at)")
+        conn.commit()
+        _state['conn'] = conn
+    return _state['conn']
+
+
+def load(kind: str, key: str) -> tuple:
+    """(value, stored_at wall time) of an unexpired entry, or (None, None)"""
+    with _LOCK:
+        row = _connection().execute(
+            "SELECT value, stored_at FROM cache_entries WHERE kind = ? AND key = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (kind, key, time.time()),
+        ).fetchone()
+    if row is None:
+        return None, None
+    return json.loads(row[0]), row[1]
+
+
+def store(kind: str, key: str, value, stored_at: float, lifetime: float = None):
+    """Insert or replace an entry that expires `lifetime` seconds after stored_at (None = never)"""
+    expires_at = stored_at + lifetime if lifetime is not None else None
+    data = json.dumps(value, default=str)
+    with _LOCK:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (kind, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, key, data, stored_at, expires_at),
+        )
+        conn.commit()
+
+
+def delete(kind: str, key: str = None):
+    """Delete one entry, or every entry of a kind"""
+    with _LOCK:
+        conn = _connection()
+        if key is None:
+            conn.execute("DELETE FROM cache_entries WHERE kind = ?", (kind,))
+        else:
+            conn.execute("DELETE FROM cache_entries WHERE kind = ? AND key = ?", (kind, key))
+        conn.commit()
+
+
+def expire() -> int:
+    """Delete expired entries; returns how many were removed"""
+    with _LOCK:
+        conn = _connection()
+        removed = conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+        conn.commit()
+    return removed
+
+
+async def run_cache_expiry():
+    """Delete expired persistent cache entries every CACHE_EXPIRY_INTERVAL seconds"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(expire)
+            if removed:
+                print(f"🧹 Persistent cache: expired {removed} entries")
+        except Exception as e:
+            print(f"⚠️  Persistent cache expiry error: {e}")
+        await asyncio.sleep(CACHE_EXPIRY_INTERVAL)
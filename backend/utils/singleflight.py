@@ -0,0 +1,83 @@
+"""Single-flight coalescing of concurrent calls
+
+While a call for a key is in flight, other callers with the same key wait for
+its result instead of starting the same work again (for example ten requests
+for a symbol that isn't cached yet run one fetch pipeline, not ten).
+"""
+import functools
+import threading
+from concurrent.futures import Future
+
+_GROUPS = {}
+_GROUPS_LOCK = threading.Lock()
+
+
+class SingleFlight:
+    """Group of in-flight calls keyed by e.g. symbol (thread-safe)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` unless a call for `key` is already running,
+        in which case wait for and return that call's result (or exception)"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats['calls'] += 1
+            else:
+                self.stats['coalesced'] += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result
+
+    def _finish(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+
+def get_group(name: str) -> SingleFlight:
+    """Get (creating on first use) a named single-flight group"""
+    with _GROUPS_LOCK:
+        if name not in _GROUPS:
+            _GROUPS[name] = SingleFlight(name)
+        return _GROUPS[name]
+
+
+def single_flight(name: str, key=None):
+    """Decorator: coalesce concurrent calls with the same key (default: the args and sorted kwargs)"""
+    group = get_group(name)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return group.do(call_key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def flight_stats() -> dict:
+    """Calls started vs. coalesced per group"""
+    with _GROUPS_LOCK:
+        groups = list(_GROUPS.values())
+    return {group.name: dict(group.stats) for group in groups}
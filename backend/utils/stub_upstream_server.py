@@ -0,0 +1,120 @@
+"""Local stand-in for the Grok (xAI) and Polygon APIs
+
+Serves canned chat completions (plain and streamed) and ticker news so the
+backend can run and be load-tested without API keys or rate limits:
+
+    python -m utils.stub_upstream_server --port 9000
+    GROK_API_BASE=http://127.0.0.1:9000/v1 POLYGON_API_BASE=http://127.0.0.1:9000 \\
+    GROK_API_KEY=stub POLYGON_API_KEY=stub python server.py
+
+--latency adds a delay before each response and --chunk-delay between streamed
+chunks, to simulate slow upstreams.
+"""
+import argparse
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+import uvicorn
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Stub upstreams")
+_options = {'latency': 0.0, 'chunk_delay': 0.02}
+
+_ANALYSIS = {
+    'sentiment': 'neutral',
+    'summary': 'Stub analysis generated by the local upstream server.',
+    'key_points': ['Stub point one', 'Stub point two', 'Stub point three'],
+    'trading_signals': ['hold - stub signal'],
+    'confidence': 'low',
+}
+
+
+def _chunks(text: str, size: int = 16) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """xAI/OpenAI-style chat completion; streamed as SSE when "stream" is true"""
+    payload = await request.json()
+    await asyncio.sleep(_options['latency'])
+    content = f"```json\n{json.dumps(_ANALYSIS)}\n```"
+    
+    if not payload.get('stream'):
+        return {
+            'id': 'stub-completion',
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        }
+    
+    async def events():
+        for piece in _chunks(content):
+            chunk = {'id': 'stub-completion', 'choices': [{'index': 0, 'delta': {'content': piece}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(_options['chunk_delay'])
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+_NEWS_TICKERS = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', 'GOOGL', 'META', 'AMD']
+_NEWS_SPACING = 1200  # seconds between feed articles
+
+
+def _stub_article(article_id: str, title: str, published: datetime, tickers: list) -> dict:
+    return {
+        'id': article_id,
+        'title': title,
+        'description': f"Stub article about {', '.join(tickers)}.",
+        'article_url': f"https://example.com/news/{article_id}",
+        'published_utc': published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        'publisher': {'name': 'Stub Wire'},
+        'tickers': tickers,
+    }
+
+
+def _feed(days: int = 7) -> list:
+    """One article every _NEWS_SPACING seconds, each mentioning two of _NEWS_TICKERS (newest first)"""
+    latest = int(datetime.now(timezone.utc).timestamp()) // _NEWS_SPACING
+    articles = []
+    for slot in range(latest, latest - days * 86400 // _NEWS_SPACING, -1):
+        tickers = [_NEWS_TICKERS[slot % 8], _NEWS_TICKERS[(slot + 3) % 8]]
+        title = (f"Analyst upgrades {tickers[0]} with raised price target" if slot % 3 == 0
+                 else f"{tickers[0]} and {tickers[1]} shares move as sector rotates")
+        articles.append(_stub_article(f"stub-{slot}", title, datetime.fromtimestamp(slot * _NEWS_SPACING, timezone.utc), tickers))
+    return articles
+
+
+@app.get("/v2/reference/news")
+async def ticker_news(ticker: str = Query(None), limit: int = Query(10), order: str = Query('desc'),
+                      published_since: str = Query(None, alias='published_utc.gte')):
+    """Polygon-style news, for one ticker or for all (stub tickers share articles)"""
+    await asyncio.sleep(_options['latency'])
+    articles = _feed()
+    if ticker:
+        ticker = ticker.upper()
+        articles = [a for a in articles if ticker in a['tickers']]
+        if not articles:
+            # Any other symbol gets a few articles of its own
+            hour = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+            articles = [_stub_article(f"stub-{ticker}-{i}", f"What to watch for {ticker} this week",
+                                      hour - timedelta(hours=i), [ticker]) for i in range(3)]
+    if published_since:
+        articles = [a for a in articles if a['published_utc'] >= published_since]
+    if order == 'asc':
+        articles.reverse()
+    results = articles[:limit]
+    return {'status': 'OK', 'count': len(results), 'results': results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    args = parser.parse_args()
+    _options.update(latency=args.latency, chunk_delay=args.chunk_delay)
+    print(f"🧪 Stub upstreams on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", ws="none")
@@ -0,0 +1,251 @@
+"""Per-provider request budgets for upstream APIs (Alpaca, Polygon, xAI, Yahoo)
+
+Every upstream call takes a token from its provider's bucket first
+(UPSTREAM_BUDGETS: requests per minute and burst). When the bucket is empty,
+callers queue by priority: interactive work (a user opening a symbol) is
+served before background refreshes, FIFO within a priority. So we spend up to
+the budget instead of running into 429s, and a 429 that still happens empties
+the bucket for its Retry-After.
+
+Priority is a context variable: HTTP requests run as interactive (set by the
+server middleware), everything else defaults to background. It follows
+`asyncio.to_thread` and pools that submit with `run_in_context()`.
+
+Async callers wait on the event loop (no thread per waiter), and cancelling
+one takes it out of the queue. Blocking waits can have a deadline (also a context variable, set per pipeline
+stage by `run_in_context(fn, deadline)`): a caller whose result nobody will
+read any more leaves the queue with BudgetTimeout instead of holding a worker
+thread and spending a token later.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from config.settings import UPSTREAM_BUDGETS
+
+INTERACTIVE = 0
+BACKGROUND = 1
+_PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+_WAIT_SAMPLES = 200  # recent wait times kept per provider and priority
+
+_priority = contextvars.ContextVar('upstream_priority', default=BACKGROUND)
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)  # time.monotonic() value
+
+
+class BudgetTimeout(Exception):
+    """No request slot was free before the caller's deadline"""
+
+
+def set_priority(level: int):
+    """Set the priority for the rest of the current task/context"""
+    _priority.set(level)
+
+
+def run_in_context(fn, deadline: float = None):
+    """Wrap `fn` so it runs with the caller's context (priority) on pool threads
+    
+    With `deadline` (a time.monotonic() value), budget waits inside `fn` give up
+    at that time with BudgetTimeout.
+    """
+    context = contextvars.copy_context()
+    
+    def run(*args, **kwargs):
+        if deadline is not None:
+            _deadline.set(deadline)
+        return fn(*args, **kwargs)
+    
+    # A context can only be entered by one thread at a time: each call gets its own copy
+    return lambda *args, **kwargs: context.copy().run(run, *args, **kwargs)
+
+
+class ProviderBudget:
+    """Token bucket with a priority queue of waiting callers"""
+
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.rate = per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0  # after a 429
+        self._waiting = []  # heap of (priority, ticket)
+        self._async_waiters = {}  # (priority, ticket) -> (loop, asyncio.Event) for acquire_async callers
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+        self._waits = {p: deque(maxlen=_WAIT_SAMPLES) for p in _PRIORITY_NAMES}
+        self.stats = {'requests': 0, 'queued': 0, 'throttled': 0, 'timed_out': 0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _ready_in(self, now: float) -> float:
+        """Seconds until a token can be taken (0 = now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def try_acquire(self, level: int) -> bool:
+        """Take a token without waiting if nobody is queued"""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiting or self._ready_in(now) > 0:
+                return False
+            self._take(level, 0)
+            return True
+
+    def acquire(self, level: int, deadline: float = None):
+        """Block until this caller is first in line and a token is available
+        
+        Raises BudgetTimeout (and leaves the queue) if that is not the case by
+        `deadline` (a time.monotonic() value).
+        """
+        with self._cond:
+            entry = (level, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            started = time.monotonic()
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._ready_in(now)
+                if self._waiting[0] == entry and wait == 0:
+                    heapq.heappop(self._waiting)
+                    self._take(level, now - started)
+                    self._wake_next()
+                    return
+                if deadline is not None and now >= deadline:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self.stats['timed_out'] += 1
+                    self._wake_next()
+                    raise BudgetTimeout(f"no {self.name} request slot within {now - started:.1f}s")
+                timeout = wait if self._waiting[0] == entry else None
+                if deadline is not None:
+                    timeout = min(timeout, deadline - now) if timeout is not None else deadline - now
+                self._cond.wait(timeout)
+    
+    async def acquire_async(self, level: int):
+        """Like acquire(), but waits on the event loop; cancelling the caller leaves the queue"""
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        with self._cond:
+            entry = (level, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            self._async_waiters[entry] = (loop, wake)
+            started = time.monotonic()
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._ready_in(now)
+                    first = self._waiting[0] == entry
+                    if first and wait == 0:
+                        heapq.heappop(self._waiting)
+                        self._take(level, now - started)
+                        self._wake_next()
+                        return
+                    wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), wait if first else None)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._cond:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._wake_next()
+            raise
+        finally:
+            with self._cond:
+                self._async_waiters.pop(entry, None)
+    
+    def _wake_next(self):
+        """Let the next in line re-check; it may be able to go right away (caller holds _cond)"""
+        self._cond.notify_all()
+        if self._waiting and self._waiting[0] in self._async_waiters:
+            loop, wake = self._async_waiters[self._waiting[0]]
+            loop.call_soon_threadsafe(wake.set)
+    
+    def _take(self, level: int, waited: float):
+        self.tokens -= 1
+        self.stats['requests'] += 1
+        if waited > 0.001:
+            self.stats['queued'] += 1
+        self._waits[level].append(waited)
+
+    def throttled(self, retry_after: float = None):
+        """Upstream answered 429: stop sending for `retry_after` seconds (default: one token's time)"""
+        with self._cond:
+            pause = retry_after if retry_after else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+            self.tokens = 0
+            self.stats['throttled'] += 1
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            depth = {name: 0 for name in _PRIORITY_NAMES.values()}
+            for level, _ in self._waiting:
+                depth[_PRIORITY_NAMES[level]] += 1
+            waits = {}
+            for level, samples in self._waits.items():
+                ordered = sorted(samples)
+                waits[_PRIORITY_NAMES[level]] = {
+                    'avg': round(sum(ordered) / len(ordered), 3) if ordered else 0,
+                    'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3) if ordered else 0,
+                    'max': round(ordered[-1], 3) if ordered else 0,
+                }
+            return {
+                **self.stats,
+                'per_minute': self.rate * 60,
+                'tokens': round(self.tokens, 2),
+                'queue_depth': depth,
+                'wait_seconds': waits,
+            }
+
+
+_BUDGETS = {name: ProviderBudget(name, **config) for name, config in UPSTREAM_BUDGETS.items()}
+
+
+def acquire(provider: str):
+    """Wait for a request slot of `provider` at the current priority (blocking; for worker threads)
+    
+    Raises BudgetTimeout if the current context's deadline passes first.
+    """
+    _BUDGETS[provider].acquire(_priority.get(), _deadline.get())
+
+
+async def acquire_async(provider: str):
+    """Wait for a request slot of `provider` on the event loop (cancelling the caller leaves the queue)"""
+    budget = _BUDGETS[provider]
+    level = _priority.get()
+    if not budget.try_acquire(level):
+        await budget.acquire_async(level)
+
+
+def throttled(provider: str, retry_after: float = None):
+    """Report a 429 from `provider`"""
+    _BUDGETS[provider].throttled(retry_after)
+
+
+def limit_rest_client(client, provider: str = 'alpaca'):
+    """Route every HTTP attempt of an alpaca-trade-api REST client (retries included) through `provider`'s budget"""
+    send = client._one_request
+
+    def _one_request(*args, **kwargs):
+        acquire(provider)
+        return send(*args, **kwargs)
+    
+    client._one_request = _one_request
+    return client
+
+
+def budget_stats() -> dict:
+    """Per-provider request counts, tokens, queue depth and wait times"""
+    return {name: budget.get_stats() for name, budget in _BUDGETS.items()}
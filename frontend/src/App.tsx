@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState } from 'react'
 import './App.css'
 import StockCard from './components/StockCard'
 import StockSearch from './components/StockSearch'
@@ -7,47 +7,18 @@ import SectorInfo from './components/SectorInfo'
 import { StockData } from './types'
 import { StockInfoSkeleton, EMAListSkeleton } from './components/Skeleton'
 import { useGrokStream } from './hooks/useGrokStream'
+import { useQuoteStream } from './hooks/useQuoteStream'
 
 function App() {
   const [currentSymbol, setCurrentSymbol] = useState('TSLA')
-  const [stockData, setStockData] = useState<Record<string, StockData>>({})
+  const quote = useQuoteStream(currentSymbol)
+  const stockData: Record<string, StockData> = quote ? { [currentSymbol]: quote } : {}
   
   // Use streaming hook for Grok analysis
   const { analysis: grokAnalysis, streamingText, isStreaming } = useGrokStream(currentSymbol)
 
-  // Fetch data for current symbol every 2 seconds
-  useEffect(() => {
-    const fetchQuotes = () => {
-      fetch(`http://localhost:8000/api/quotes/${currentSymbol}`)
-        .then((res) => {
-          if (!res.ok) throw new Error('Failed to fetch')
-          return res.json()
-        })
-        .then((quote) => {
-          setStockData({
-            [currentSymbol]: {
-              ...quote,
-              lastUpdate: Date.now(),
-            }
-          })
-        })
-        .catch((err) => {
-          console.error('Failed to fetch quotes:', err)
-        })
-    }
-    
-    // Fetch immediately when symbol changes
-    fetchQuotes()
-    
-    // Then fetch every 2 seconds
-    const interval = setInterval(fetchQuotes, 2000)
-    
-    return () => clearInterval(interval)
-  }, [currentSymbol])
-
   const handleSymbolChange = (newSymbol: string) => {
     setCurrentSymbol(newSymbol)
-    setStockData({}) // Clear old data
   }
 
   return (
@@ -70,6 +70,8 @@ const StockSearch = ({ onSymbolChange, currentSymbol }: StockSearchProps) => {
   }
 
   const handleSuggestionClick = (result: SearchResult) => {
+    // Let the backend know this symbol is being watched (refresh priority)
+    fetch(`http://localhost:8000/api/search/click/${result.symbol}`, { method: 'POST' }).catch(() => {})
     setInputValue(result.symbol)
     onSymbolChange(result.symbol)
     setShowSuggestions(false)
@@ -0,0 +1,142 @@
+import { useState, useEffect } from 'react';
+import { StockData } from '../types';
+
+const QUOTES_WS_URL = 'ws://localhost:8000/ws/quotes';
+const QUOTES_API_URL = 'http://localhost:8000/api/quotes';
+const POLL_INTERVAL_MS = 2000;
+const RECONNECT_DELAY_MS = 5000;
+
+type Delta = { seq: number; base: number; changes: Record<string, any>; removed: string[][] };
+
+const mergeChanges = (base: any, changes: Record<string, any>): any => {
+  const merged = { ...base };
+  for (const [key, value] of Object.entries(changes)) {
+    const isObject = value && typeof value === 'object' && !Array.isArray(value);
+    merged[key] = isObject && merged[key] && typeof merged[key] === 'object'
+      ? mergeChanges(merged[key], value)
+      : value;
+  }
+  return merged;
+};
+
+const removePath = (data: any, path: string[]): any => {
+  if (!data || typeof data !== 'object' || !(path[0] in data)) return data;
+  const copy = { ...data };
+  if (path.length === 1) delete copy[path[0]];
+  else copy[path[0]] = removePath(copy[path[0]], path.slice(1));
+  return copy;
+};
+
+/**
+ * Live quote for a symbol pushed over /ws/quotes.
+ * The server sends a full snapshot first and then field-level deltas; a delta
+ * whose base doesn't match the version we hold triggers a resync.
+ * Falls back to polling /api/quotes?since= while the socket is unavailable.
+ */
+export function useQuoteStream(symbol: string): StockData | null {
+  const [quote, setQuote] = useState<StockData | null>(null);
+
+  useEffect(() => {
+    setQuote(null);
+
+    let closed = false;
+    let socket: WebSocket | null = null;
+    let pollTimer: ReturnType<typeof setInterval> | null = null;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+
+    // Snapshot version we hold (null until the first full snapshot)
+    let current: StockData | null = null;
+    let seq: number | null = null;
+
+    const applyQuote = (data: StockData) => {
+      current = data;
+      setQuote({ ...data, lastUpdate: Date.now() });
+    };
+
+    const applySnapshot = (version: number, data: StockData) => {
+      seq = version;
+      applyQuote(data);
+    };
+
+    // Returns false if the delta doesn't apply to the version we hold
+    const applyDelta = (delta: Delta): boolean => {
+      if (current === null || seq !== delta.base) return false;
+      let data = mergeChanges(current, delta.changes);
+      for (const path of delta.removed) data = removePath(data, path);
+      seq = delta.seq;
+      if (Object.keys(delta.changes).length || delta.removed.length) applyQuote(data);
+      return true;
+    };
+
+    const poll = () => {
+      // since=0 on the first poll gets a versioned snapshot envelope, so later polls can ask for deltas
+      fetch(`${QUOTES_API_URL}/${symbol}?since=${seq ?? 0}`)
+        .then((res) => {
+          if (!res.ok) throw new Error('Failed to fetch');
+          return res.json();
+        })
+        .then((msg) => {
+          if (msg.type === 'snapshot') applySnapshot(msg.seq, msg.data);
+          else if (msg.type === 'delta') applyDelta(msg);
+          // Placeholder while the symbol is still loading (no version yet)
+          else applyQuote(msg);
+        })
+        .catch((err) => {
+          console.error('Failed to fetch quotes:', err);
+        });
+    };
+
+    const startPolling = () => {
+      if (pollTimer) return;
+      poll();
+      pollTimer = setInterval(poll, POLL_INTERVAL_MS);
+    };
+
+    const stopPolling = () => {
+      if (pollTimer) clearInterval(pollTimer);
+      pollTimer = null;
+    };
+
+    const connect = () => {
+      socket = new WebSocket(QUOTES_WS_URL);
+
+      socket.onopen = () => {
+        stopPolling();
+        socket?.send(JSON.stringify({ type: 'subscribe', symbols: [symbol] }));
+      };
+
+      socket.onmessage = (event) => {
+        try {
+          const msg = JSON.parse(event.data);
+          if (msg.symbol !== symbol) return;
+          if (msg.type === 'snapshot') {
+            applySnapshot(msg.seq, msg.data);
+          } else if (msg.type === 'delta' && !applyDelta(msg)) {
+            socket?.send(JSON.stringify({ type: 'resync', symbols: [symbol] }));
+          }
+        } catch (err) {
+          console.error('Error parsing quote message:', err);
+        }
+      };
+
+      socket.onclose = () => {
+        if (closed) return;
+        // Keep data flowing by polling until the socket is back
+        startPolling();
+        reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+      };
+    };
+
+    connect();
+
+    // Cleanup on unmount or symbol change
+    return () => {
+      closed = true;
+      stopPolling();
+      if (reconnectTimer) clearTimeout(reconnectTimer);
+      socket?.close();
+    };
+  }, [symbol]);
+
+  return quote;
+}